@@ -68,6 +68,7 @@ DJANGO_APPS = [
     "django.contrib.staticfiles",
     # "django.contrib.humanize", # Handy template tags
     "django.contrib.admin",
+    "django.contrib.postgres",
     "django.forms",
 ]
 THIRD_PARTY_APPS = [
@@ -324,6 +325,10 @@ REST_FRAMEWORK = {
         "rest_framework.authentication.TokenAuthentication",
     ),
     "DEFAULT_PERMISSION_CLASSES": ("rest_framework.permissions.IsAuthenticated",),
+    "DEFAULT_RENDERER_CLASSES": (
+        "rss_reader.feed.api.renderers.ORJSONRenderer",
+        "rest_framework.renderers.BrowsableAPIRenderer",
+    ),
     "DEFAULT_SCHEMA_CLASS": "drf_spectacular.openapi.AutoSchema",
     "DEFAULT_FILTER_BACKENDS": ("django_filters.rest_framework.DjangoFilterBackend",),
     "DEFAULT_PAGINATION_CLASS": "rest_framework.pagination.LimitOffsetPagination",
@@ -347,3 +352,38 @@ SPECTACULAR_SETTINGS = {
 MAX_RETRY_FEED_UPDATES = env.int("MAX_RETRY_FEED_UPDATES", 3)
 RETRY_BACKOFF_IN_SECONDS = env.int("RETRY_BACKOFF_IN_SECONDS", 120)  # 120 seconds = 2 minutes
 RETRY_BACKOFF_MAX = env.int("RETRY_BACKOFF_MAX", 480)  # 480 seconds = 8 minutes
+# Number of feeds handed to one `refresh_feeds_batch` task by the periodic refresh, 0 means one task per feed.
+FEED_REFRESH_BATCH_SIZE = env.int("FEED_REFRESH_BATCH_SIZE", 100)
+FEED_FETCH_CONCURRENCY = env.int("FEED_FETCH_CONCURRENCY", 50)  # concurrent downloads per batch
+FEED_FETCH_TIMEOUT = env.int("FEED_FETCH_TIMEOUT", 30)  # seconds
+# Adaptive refresh scheduling, intervals are in seconds.
+FEED_REFRESH_MIN_INTERVAL = env.int("FEED_REFRESH_MIN_INTERVAL", 5 * 60)
+FEED_REFRESH_MAX_INTERVAL = env.int("FEED_REFRESH_MAX_INTERVAL", 24 * 60 * 60)
+FEED_REFRESH_DEFAULT_INTERVAL = env.int("FEED_REFRESH_DEFAULT_INTERVAL", 60 * 60)  # for feeds without posting history
+FEED_REFRESH_RATE_SAMPLE_SIZE = env.int("FEED_REFRESH_RATE_SAMPLE_SIZE", 10)  # latest posts used for the posting rate
+FEED_REFRESH_MAX_PER_TICK = env.int("FEED_REFRESH_MAX_PER_TICK", 1000)  # due feeds enqueued per beat tick
+FEED_REFRESH_CHUNK_SIZE = env.int("FEED_REFRESH_CHUNK_SIZE", 500)  # due feeds streamed and enqueued at a time
+# Postgres text search configuration of the post search vectors, the posts have to be reindexed after changing it.
+POST_SEARCH_CONFIG = env("POST_SEARCH_CONFIG", default="english")
+REDIS_URL = env("REDIS_URL", default=CELERY_BROKER_URL)
+REALTIME_QUEUE_SIZE = env.int("REALTIME_QUEUE_SIZE", 100)  # pending pushes per websocket client before dropping
+SYNC_PAGE_SIZE = env.int("SYNC_PAGE_SIZE", 500)  # posts per delta sync response
+RESPONSE_CACHE_TIMEOUT = env.int("RESPONSE_CACHE_TIMEOUT", 10 * 60)  # seconds, cached API responses per user
+POST_EXCERPT_LENGTH = env.int("POST_EXCERPT_LENGTH", 280)  # characters of the post excerpts, see `?excerpt=true`
+# Feeds refreshed one by one are parsed while downloaded, stopping after this many consecutive unchanged entries.
+FEED_STREAM_PARSING = env.bool("FEED_STREAM_PARSING", True)
+FEED_STREAM_KNOWN_RUN = env.int("FEED_STREAM_KNOWN_RUN", 5)
+# Stages of the batch refresh pipeline, see `FeedRefreshPipeline`, the downloads use FEED_FETCH_CONCURRENCY.
+FEED_PARSE_PROCESSES = env.int("FEED_PARSE_PROCESSES", 0)  # parsing processes per worker, 0 means one per core
+FEED_PIPELINE_QUEUE_SIZE = env.int("FEED_PIPELINE_QUEUE_SIZE", 100)  # downloaded documents waiting to be saved
+# Politeness limits per host shared by all the workers through Redis, see `HostLimiter`, 0 disables a limit.
+FEED_HOST_MAX_CONCURRENCY = env.int("FEED_HOST_MAX_CONCURRENCY", 4)  # requests in flight per host
+FEED_HOST_RATE_LIMIT = env.float("FEED_HOST_RATE_LIMIT", 2)  # requests per second per host
+FEED_HOST_RATE_BURST = env.int("FEED_HOST_RATE_BURST", 5)  # requests per host allowed at once above the rate
+FEED_DNS_CACHE_TTL = env.int("FEED_DNS_CACHE_TTL", 5 * 60)  # seconds the addresses of the feed hosts are cached
+FEED_HTTP_KEEPALIVE_EXPIRY = env.int("FEED_HTTP_KEEPALIVE_EXPIRY", 60)  # seconds idle connections are kept open
+# Seconds a queued or running refresh of a feed holds it, the other refresh requests of the feed are coalesced.
+FEED_REFRESH_LEASE_TTL = env.int("FEED_REFRESH_LEASE_TTL", 10 * 60)
+# Time limits of a `refresh_feeds_batch`, in seconds, kept below FEED_REFRESH_LEASE_TTL so the leases outlive it.
+FEED_REFRESH_BATCH_SOFT_TIME_LIMIT = env.int("FEED_REFRESH_BATCH_SOFT_TIME_LIMIT", 8 * 60)
+FEED_REFRESH_BATCH_TIME_LIMIT = env.int("FEED_REFRESH_BATCH_TIME_LIMIT", 9 * 60)
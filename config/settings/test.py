@@ -35,3 +35,6 @@ TEMPLATES[0]["OPTIONS"]["debug"] = True  # type: ignore # noqa: F405
 MEDIA_URL = "http://media.testserver/media/"
 # Your stuff...
 # ------------------------------------------------------------------------------
+# The tests don't share hosts with other workers, see `HostLimiter`.
+FEED_HOST_MAX_CONCURRENCY = 0
+FEED_HOST_RATE_LIMIT = 0
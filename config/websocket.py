@@ -1,13 +1,92 @@
-async def websocket_application(scope, receive, send):
-    while True:
-        event = await receive()
+import asyncio
+import json
+from http.cookies import SimpleCookie
+from importlib import import_module
+from types import SimpleNamespace
+from urllib.parse import parse_qs, urlparse
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user
+from django.http.request import validate_host
+from rest_framework.authtoken.models import Token
+
+from rss_reader.feed.models import UserFeed
+from rss_reader.feed.realtime import broadcaster, feed_channel, user_channel
+
+
+@sync_to_async
+def authenticate(scope):
+    """
+    Authenticate a websocket connection with a DRF token, given as `?token=` since browsers can't set
+    headers on websockets, or with the session cookie of a page served by one of the allowed hosts.
 
-        if event["type"] == "websocket.connect":
-            await send({"type": "websocket.accept"})
+    Returns:
+        user (User): The authenticated user, None otherwise.
+    """
+    headers = {name.decode("latin1"): value.decode("latin1") for name, value in scope["headers"]}
+    token = parse_qs(scope["query_string"].decode()).get("token")
+    if token:
+        token = Token.objects.select_related("user").filter(key=token[0]).first()
+        return token.user if token and token.user.is_active else None
 
-        if event["type"] == "websocket.disconnect":
-            break
+    origin = urlparse(headers.get("origin", "")).hostname
+    session_key = SimpleCookie(headers.get("cookie", "")).get(settings.SESSION_COOKIE_NAME)
+    if origin is None or session_key is None or not validate_host(origin, settings.ALLOWED_HOSTS):
+        return None
+    session = import_module(settings.SESSION_ENGINE).SessionStore(session_key.value)
+    user = get_user(SimpleNamespace(session=session))
+    return user if user.is_authenticated else None
+
+
+@sync_to_async
+def followed_feed_ids(user):
+    return list(UserFeed.objects.filter(user=user).values_list("feed_id", flat=True))
+
+
+async def websocket_application(scope, receive, send):
+    """
+    Push the new posts of the followed feeds and the unread counts changes to the authenticated user,
+    see `rss_reader.feed.realtime`. Messages are sent as JSON text frames:
+        - {"type": "posts", "feed": 1, "posts": [10, 11], "unread_delta": 2}
+        - {"type": "unread", "feed": 1, "delta": -1, "unread_count": 1}
+        - {"type": "follow", "feed": 2} / {"type": "unfollow", "feed": 2}
+    """
+    event = await receive()
+    if event["type"] != "websocket.connect":
+        return
+    user = await authenticate(scope)
+    if user is None:
+        await send({"type": "websocket.close", "code": 4401})
+        return
+    await send({"type": "websocket.accept"})
 
-        if event["type"] == "websocket.receive":
-            if event["text"] == "ping":
-                await send({"type": "websocket.send", "text": "pong!"})
+    own_channel = user_channel(user.pk)
+    queue = broadcaster.queue()
+    await broadcaster.subscribe(queue, [own_channel, *map(feed_channel, await followed_feed_ids(user))])
+    receiving = asyncio.ensure_future(receive())
+    pushing = asyncio.ensure_future(queue.get())
+    try:
+        while True:
+            done, _ = await asyncio.wait({receiving, pushing}, return_when=asyncio.FIRST_COMPLETED)
+            if receiving in done:
+                event = receiving.result()
+                if event["type"] == "websocket.disconnect":
+                    break
+                if event.get("text") == "ping":
+                    await send({"type": "websocket.send", "text": "pong!"})
+                receiving = asyncio.ensure_future(receive())
+            if pushing in done:
+                channel, data = pushing.result()
+                if channel == own_channel:
+                    message = json.loads(data)
+                    if message["type"] == "follow":
+                        await broadcaster.subscribe(queue, [feed_channel(message["feed"])])
+                    elif message["type"] == "unfollow":
+                        await broadcaster.unsubscribe(queue, [feed_channel(message["feed"])])
+                await send({"type": "websocket.send", "text": data})
+                pushing = asyncio.ensure_future(queue.get())
+    finally:
+        receiving.cancel()
+        pushing.cancel()
+        await broadcaster.unsubscribe(queue)
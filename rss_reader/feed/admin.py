@@ -23,11 +23,11 @@ class PostAdminInline(admin.StackedInline):
 @admin.register(Feed)
 class FeedAdmin(admin.ModelAdmin):
     fieldsets = (
-        (None, {"fields": ("creator", "title", "description", "xml_url", "auto_refresh")}),
-        (_("Important dates"), {"fields": ("last_refresh_at", "created", "modified")}),
+        (None, {"fields": ("creator", "title", "description", "xml_url", "normalized_url", "auto_refresh")}),
+        (_("Important dates"), {"fields": ("last_refresh_at", "next_refresh_at", "created", "modified")}),
     )
     list_display = ["creator", "title", "auto_refresh"]
-    readonly_fields = ["creator", "last_refresh_at", "created", "modified"]
+    readonly_fields = ["creator", "normalized_url", "last_refresh_at", "next_refresh_at", "created", "modified"]
     search_fields = ["title"]
     list_filter = ["auto_refresh"]
     inlines = [PostAdminInline]
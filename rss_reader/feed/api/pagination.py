@@ -0,0 +1,150 @@
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from binascii import Error as BinasciiError
+from functools import reduce
+from operator import and_, or_
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import F, Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Cursor (keyset) pagination over a composite key ordered descending with NULLs last.
+
+    The cursor holds the key of the last item of the page, and the next page is fetched with a
+    `WHERE key < cursor` condition instead of an OFFSET, so with an index matching `ordering`
+    every page costs the same as the first one.
+    """
+
+    ordering = ("id",)
+    page_size = api_settings.PAGE_SIZE
+    page_size_query_param = "page_size"
+    max_page_size = 100
+    cursor_query_param = "cursor"
+    invalid_cursor_message = "Invalid cursor"
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.model = queryset.model
+        page_size = self.get_page_size(request)
+
+        # NULLS LAST only on the nullable keys, plain DESC ones are what the indexes of `ordering` provide.
+        queryset = queryset.order_by(
+            *[
+                F(field).desc(nulls_last=True) if self._is_nullable(field) else F(field).desc()
+                for field in self.ordering
+            ]
+        )
+        position = self.decode_cursor(request)
+        if position is not None:
+            queryset = queryset.filter(self._after(position))
+
+        results = list(queryset[: page_size + 1])
+        self.has_next = len(results) > page_size
+        results = results[:page_size]
+        self.next_position = self._position(results[-1]) if self.has_next else None
+        return results
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return min(max(page_size, 1), self.max_page_size)
+
+    def _after(self, position):
+        """
+        Condition matching the items that come after `position` in the descending order.
+        """
+        conditions = []
+        for index, (field, value) in enumerate(zip(self.ordering, position)):
+            # Only NULLs tie with a NULL key, and nothing comes after them.
+            if value is None:
+                continue
+            ties = [
+                Q(**{f"{previous}__isnull": True}) if previous_value is None else Q(**{previous: previous_value})
+                for previous, previous_value in zip(self.ordering[:index], position[:index])
+            ]
+            after = Q(**{f"{field}__lt": value})
+            if self._is_nullable(field):
+                after |= Q(**{f"{field}__isnull": True})
+            conditions.append(reduce(and_, ties, after))
+        if not conditions:
+            return Q(pk__in=[])
+        return reduce(or_, conditions)
+
+    def _position(self, item):
+        if isinstance(item, dict):
+            return [item[field] for field in self.ordering]
+        return [getattr(item, field) for field in self.ordering]
+
+    def _is_nullable(self, field):
+        try:
+            return self.model._meta.get_field(field).null
+        except FieldDoesNotExist:
+            return True
+
+    def _to_python(self, field, value):
+        try:
+            return self.model._meta.get_field(field).to_python(value)
+        except FieldDoesNotExist:
+            return value
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None
+        try:
+            position = json.loads(urlsafe_b64decode(encoded.encode("ascii")))
+            if not isinstance(position, list) or len(position) != len(self.ordering):
+                raise ValueError
+            return [self._to_python(field, value) for field, value in zip(self.ordering, position)]
+        except (BinasciiError, UnicodeError, ValueError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, position):
+        encoded = urlsafe_b64encode(json.dumps([self._serialize(value) for value in position]).encode()).decode(
+            "ascii"
+        )
+        return replace_query_param(self.request.build_absolute_uri(), self.cursor_query_param, encoded)
+
+    @staticmethod
+    def _serialize(value):
+        if hasattr(value, "isoformat"):
+            return value.isoformat()
+        return value
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        return self.encode_cursor(self.next_position)
+
+    def get_paginated_response(self, data):
+        return Response({"next": self.get_next_link(), "results": data})
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "properties": {
+                "next": {"type": "string", "nullable": True, "format": "uri"},
+                "results": schema,
+            },
+        }
+
+
+class PostPagination(KeysetPagination):
+    ordering = ("last_update", "id")
+
+
+class PostSearchPagination(KeysetPagination):
+    ordering = ("rank", "id")
+
+
+class TimelinePagination(KeysetPagination):
+    ordering = ("sort_time", "post_id")
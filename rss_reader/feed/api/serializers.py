@@ -1,9 +1,53 @@
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from binascii import Error as BinasciiError
+
+from django.conf import settings
+from django.db.models.functions import Left
+from django.utils.html import strip_tags
+from django.utils.text import Truncator
 from rest_framework import serializers
 
-from rss_reader.feed.models import Feed, Post
+from rss_reader.feed.models import Feed, Post, TimelineEntry, UserFeed
+
+# Characters of HTML read per character of a plain text excerpt.
+EXCERPT_MARKUP_RATIO = 10
+
+
+def get_requested_fields(request, fields):
+    """
+    The fields listed in the comma separated `fields` query parameter, in their declared order.
+
+    :return: all the fields if the parameter is missing or names none of them.
+    """
+    requested = request.query_params.get("fields", "").split(",") if request is not None else []
+    return tuple(field for field in fields if field in requested) or tuple(fields)
+
+
+def is_excerpt_requested(request):
+    return request is not None and request.query_params.get("excerpt", "").lower() in ("1", "true")
+
 
+def make_excerpt(html):
+    """
+    Plain text excerpt of an HTML text, at most `POST_EXCERPT_LENGTH` characters long.
+    """
+    return Truncator(" ".join(strip_tags(html).split())).chars(settings.POST_EXCERPT_LENGTH)
 
-class FeedOutputSerializer(serializers.ModelSerializer):
+
+class SparseFieldsMixin:
+    """
+    Only keep the fields listed in the `fields` query parameter of the request, see `get_requested_fields`.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        requested_fields = get_requested_fields(self.context.get("request"), self.fields.keys())
+        for field in set(self.fields.keys()) - set(requested_fields):
+            self.fields.pop(field)
+
+
+class FeedOutputSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Feed
         fields = ("id", "creator", "title", "xml_url", "description", "auto_refresh", "last_refresh_at")
@@ -18,6 +62,16 @@ class FeedInputSerializer(serializers.ModelSerializer):
         fields = ("creator", "xml_url")
 
 
+class UnreadCountOutputSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = UserFeed
+        fields = ("feed", "unread_count", "total_count")
+
+
+class MarkAllReadInputSerializer(serializers.Serializer):
+    older_than = serializers.DateTimeField(required=False, default=None)
+
+
 class PostInputSerializer(serializers.ModelSerializer):
     mark_as_read = serializers.BooleanField(default=False)
 
@@ -26,7 +80,160 @@ class PostInputSerializer(serializers.ModelSerializer):
         fields = ("id", "mark_as_read")
 
 
-class PostOutputSerializer(serializers.ModelSerializer):
+class PostOutputSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Post
         fields = ("id", "feed_id", "title", "description", "link", "published_time", "last_update")
+
+
+class PostSearchInputSerializer(serializers.Serializer):
+    q = serializers.CharField(max_length=255)
+
+
+class PostSearchOutputSerializer(PostOutputSerializer):
+    rank = serializers.FloatField(read_only=True)
+
+    class Meta(PostOutputSerializer.Meta):
+        fields = PostOutputSerializer.Meta.fields + ("rank",)
+
+
+class TimelineEntryOutputSerializer(serializers.ModelSerializer):
+    post = PostOutputSerializer()
+
+    class Meta:
+        model = TimelineEntry
+        fields = ("sort_time", "post")
+
+
+class ValuesSerializer:
+    """
+    Lightweight read-only serializer of `values()` rows for the listings, skipping the model instances and
+    the per-field `to_representation` of the model serializers.
+
+    The rows are read with `get_values`, which only selects the fields picked with `?fields=` and, with
+    `?excerpt=true`, a prefix of the `excerpt_fields` turned into a plain text excerpt.
+
+    Datetimes are left to the renderer, `ORJSONRenderer` outputs them the same way as `DateTimeField`.
+    """
+
+    fields = ()
+    # values() key of the fields named differently in the output.
+    sources = {}
+    excerpt_fields = ()
+
+    def __init__(self, instance, many=False, context=None):
+        self.instance = instance
+        self.many = many
+        request = (context or {}).get("request")
+        self.selected_fields = get_requested_fields(request, self.fields)
+        self.excerpt = is_excerpt_requested(request)
+        self.keys = {field: self._key(field, self.excerpt) for field in self.selected_fields}
+
+    @classmethod
+    def _key(cls, field, excerpt):
+        if excerpt and field in cls.excerpt_fields:
+            return f"{field}_excerpt"
+        return cls.sources.get(field, field)
+
+    @classmethod
+    def get_values(cls, queryset, request, *required):
+        """
+        Rows of the queryset with the requested fields, and the `required` keys such as the pagination ordering.
+        """
+        excerpt = is_excerpt_requested(request)
+        values, prefixes = [], {}
+        for field in get_requested_fields(request, cls.fields):
+            source = cls.sources.get(field, field)
+            if excerpt and field in cls.excerpt_fields:
+                # Only a prefix is read, long enough for the excerpt once the markup is stripped.
+                prefixes[cls._key(field, excerpt)] = Left(source, settings.POST_EXCERPT_LENGTH * EXCERPT_MARKUP_RATIO)
+            else:
+                values.append(source)
+        values += [key for key in required if key not in values]
+        return queryset.values(*values, **prefixes)
+
+    def to_representation(self, row):
+        data = {field: row[key] for field, key in self.keys.items()}
+        if self.excerpt:
+            for field in self.excerpt_fields:
+                if field in data:
+                    data[field] = make_excerpt(data[field])
+        return data
+
+    @property
+    def data(self):
+        if self.many:
+            return [self.to_representation(row) for row in self.instance]
+        return self.to_representation(self.instance)
+
+
+class PostValuesSerializer(ValuesSerializer):
+    fields = PostOutputSerializer.Meta.fields
+    excerpt_fields = ("description",)
+
+
+class PostSearchValuesSerializer(PostValuesSerializer):
+    fields = PostSearchOutputSerializer.Meta.fields
+
+
+class TimelineEntryValuesSerializer(PostValuesSerializer):
+    """
+    The fields are the ones of the post of the entry.
+    """
+
+    sources = {field: f"post__{field}" for field in PostOutputSerializer.Meta.fields}
+    sources.update(id="post_id", feed_id="post__feed")
+
+    @classmethod
+    def get_values(cls, queryset, request, *required):
+        return super().get_values(queryset, request, "sort_time", *required)
+
+    def to_representation(self, row):
+        return {"sort_time": row["sort_time"], "post": super().to_representation(row)}
+
+
+class SyncTokenField(serializers.Field):
+    """
+    Opaque token wrapping a position of the change sequence.
+    """
+
+    default_error_messages = {"invalid": "Invalid sync token."}
+
+    def to_representation(self, value):
+        return urlsafe_b64encode(json.dumps({"seq": value}).encode()).decode("ascii")
+
+    def to_internal_value(self, data):
+        try:
+            position = json.loads(urlsafe_b64decode(str(data).encode("ascii")))["seq"]
+        except (BinasciiError, UnicodeError, ValueError, TypeError, KeyError):
+            self.fail("invalid")
+        if not isinstance(position, int) or position < 0:
+            self.fail("invalid")
+        return position
+
+
+class SyncInputSerializer(serializers.Serializer):
+    token = SyncTokenField(required=False, default=None)
+
+
+class SyncSubscriptionOutputSerializer(serializers.ModelSerializer):
+    read = serializers.SerializerMethodField(help_text="Posts after `read_up_to` that are read")
+    unread = serializers.SerializerMethodField(help_text="Posts up to `read_up_to` that are unread")
+
+    class Meta:
+        model = UserFeed
+        fields = ("feed", "unread_count", "total_count", "read_up_to", "read", "unread")
+
+    def get_read(self, obj):
+        return [mark.post_id for mark in obj.read_marks.all() if mark.is_read]
+
+    def get_unread(self, obj):
+        return [mark.post_id for mark in obj.read_marks.all() if not mark.is_read]
+
+
+class SyncOutputSerializer(serializers.Serializer):
+    token = SyncTokenField(source="position")
+    more = serializers.BooleanField()
+    posts = PostOutputSerializer(many=True)
+    subscriptions = SyncSubscriptionOutputSerializer(many=True)
+    unsubscriptions = serializers.ListField(child=serializers.IntegerField())
@@ -1,19 +1,31 @@
-from django.utils.translation import gettext_lazy as _
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import mixins, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.viewsets import GenericViewSet
 
+from rss_reader.feed.api.pagination import PostPagination, PostSearchPagination, TimelinePagination
 from rss_reader.feed.api.serializers import (
     FeedInputSerializer,
     FeedOutputSerializer,
+    MarkAllReadInputSerializer,
     PostInputSerializer,
     PostOutputSerializer,
+    PostSearchInputSerializer,
+    PostSearchValuesSerializer,
+    PostValuesSerializer,
+    SyncInputSerializer,
+    SyncOutputSerializer,
+    TimelineEntryOutputSerializer,
+    TimelineEntryValuesSerializer,
+    UnreadCountOutputSerializer,
+    get_requested_fields,
 )
-from rss_reader.feed.filters import PostFilter
-from rss_reader.feed.models import Feed, Post
-from rss_reader.feed.tasks import refresh_feed
+from rss_reader.feed.caching import cached_response
+from rss_reader.feed.filters import PostFilter, TimelineFilter
+from rss_reader.feed.models import Feed, Post, TimelineEntry, UserFeed
+from rss_reader.feed.services import SyncService
+from rss_reader.feed.tasks import request_refresh
 
 
 class FeedViewSet(mixins.CreateModelMixin, mixins.ListModelMixin, mixins.RetrieveModelMixin, GenericViewSet):
@@ -33,16 +45,31 @@ class FeedViewSet(mixins.CreateModelMixin, mixins.ListModelMixin, mixins.Retriev
 
     def get_queryset(self):
         """
-        Returns a queryset of Feed objects filtered by the creator being the current user.
+        Returns a queryset of Feed objects created or followed by the current user.
+        The description isn't read unless it's one of the requested `fields`.
         """
-        return self.queryset.filter(creator=self.request.user)
+        queryset = self.queryset.visible_to(self.request.user)
+        if "description" not in get_requested_fields(self.request, FeedOutputSerializer.Meta.fields):
+            queryset = queryset.defer("description")
+        return queryset
+
+    @cached_response
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    @cached_response
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
 
     def perform_create(self, serializer):
-        instance = serializer.save()
-        refresh_feed.delay(instance.id)
-        return Response(
-            {"details": _("Feed created, the post feed will be updated shortly")}, status=status.HTTP_201_CREATED
-        )
+        """
+        Subscribes the user to the feed of the given URL, feeds are shared between all the users
+        adding the same URL so the feed is only created and fetched the first time it's added.
+        """
+        instance, created = Feed.objects.subscribe(self.request.user, serializer.validated_data["xml_url"])
+        serializer.instance = instance
+        if created:
+            request_refresh(instance.id)
 
     @action(detail=True, methods=["POST"])
     def follow(self, request, *args, **kwargs):
@@ -82,6 +109,42 @@ class FeedViewSet(mixins.CreateModelMixin, mixins.ListModelMixin, mixins.Retriev
         instance.unfollow(self.request.user)
         return Response(self.get_serializer(instance).data, status=status.HTTP_200_OK)
 
+    @action(detail=False, methods=["GET"], url_path="unread-counts")
+    @cached_response
+    def unread_counts(self, request, *args, **kwargs):
+        """
+        Enables authenticated users to retrieve the unread and total posts count of every followed feed,
+        served from the counters maintained on the subscriptions.
+
+        :return:
+            - `200 OK`
+            - `403 Forbidden` if the user is anonymous.
+        """
+        user_feeds = UserFeed.objects.filter(user=self.request.user).only("feed", "unread_count", "total_count")
+        return Response(UnreadCountOutputSerializer(user_feeds, many=True).data, status=status.HTTP_200_OK)
+
+    @action(detail=True, methods=["POST"], url_path="mark-all-read")
+    def mark_all_read(self, request, *args, **kwargs):
+        """
+        Enables authenticated users to mark all the posts of a followed feed as read.
+
+        :param kwargs:
+            - pk (int) which used to get the feed instance from DB.
+        :param data:
+            - older_than (datetime, optional) to only mark the posts published before it as read.
+
+        :return:
+            - `200 OK` if the posts are marked as read.
+            - `400 Bad Request` if the feed isn't followed or `older_than` is invalid.
+            - `403 Forbidden` if the user is anonymous.
+        """
+        instance = self.get_object()
+        serializer = MarkAllReadInputSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        instance.mark_all_read(self.request.user, serializer.validated_data["older_than"])
+        return Response(self.get_serializer(instance).data, status=status.HTTP_200_OK)
+
     @action(detail=True, methods=["PUT"], url_path="force-update")
     def force_update(self, request, *args, **kwargs):
         """
@@ -92,7 +155,13 @@ class FeedViewSet(mixins.CreateModelMixin, mixins.ListModelMixin, mixins.Retriev
             - pk (int) which used to get the feed instance from DB.
 
         :return:
-            - `200 OK` after running a background task to force update a feed instance.
+            - `200 OK` after running a background task to force update a feed instance, with its
+              `refresh_status`:
+                - "queued": a `refresh_feed` task was enqueued, its id is `refresh_task_id`
+                - "coalesced": a `refresh_feed` of the feed already queued or running is reused, its id is
+                  `refresh_task_id`
+                - "batched": the feed is being refreshed within a batch of feeds, `refresh_task_id` is null
+                  since the result of the batch isn't the one of the feed
             - `403 Forbidden` if the user is anonymous.
             - `404 Not Found` if provided feed doesn't exist or not created by the authenticated user.
         """
@@ -101,10 +170,14 @@ class FeedViewSet(mixins.CreateModelMixin, mixins.ListModelMixin, mixins.Retriev
         if not instance.auto_refresh:
             instance.activate_auto_refresh()
 
-        refresh_feed.delay(instance.id)
-        return Response(self.get_serializer(instance).data, status=status.HTTP_200_OK)
+        task_id, refresh_status = request_refresh(instance.id)
+        return Response(
+            {**self.get_serializer(instance).data, "refresh_task_id": task_id, "refresh_status": refresh_status},
+            status=status.HTTP_200_OK,
+        )
 
-    @action(detail=True, methods=["GET"], url_path="posts")
+    @action(detail=True, methods=["GET"], url_path="posts", pagination_class=PostPagination)
+    @cached_response
     def posts(self, request, *args, **kwargs):
         """
         Enables authenticated users to retrieve a paginated list of posts related to the passed feed ID.
@@ -118,29 +191,75 @@ class FeedViewSet(mixins.CreateModelMixin, mixins.ListModelMixin, mixins.Retriev
             - `403 Forbidden` if the user is anonymous.
         """
         instance = self.get_object()
-        posts_queryset = instance.posts.all()
-        serializer = PostOutputSerializer(posts_queryset, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        posts = PostValuesSerializer.get_values(instance.posts.all(), request, *self.paginator.ordering)
+        page = self.paginate_queryset(posts)
+        serializer = PostValuesSerializer(page, many=True, context=self.get_serializer_context())
+        return self.get_paginated_response(serializer.data)
 
 
 class PostViewSet(mixins.RetrieveModelMixin, mixins.ListModelMixin, GenericViewSet):
-    queryset = Post.objects.select_related("feed").prefetch_related("read_posts").all()
+    queryset = Post.objects.select_related("feed").defer("search_vector")
     filter_backends = (DjangoFilterBackend,)
     filterset_class = PostFilter
+    pagination_class = PostPagination
 
     def get_serializer_class(self):
         """
         Get the serializer class based on the action.
         """
-        if self.action == "retrieve":
+        if self.action in ("list", "retrieve"):
             return PostOutputSerializer
         return PostInputSerializer
 
     def get_queryset(self):
         """
-        :return: all the feeds posts registered by the authenticated user.
+        :return: all the posts of the feeds created or followed by the authenticated user, without their
+            description unless it's one of the requested `fields`.
         """
-        return self.queryset.filter(feed__creator=self.request.user)
+        queryset = self.queryset.filter(feed__in=Feed.objects.visible_to(self.request.user))
+        if "description" not in get_requested_fields(self.request, PostOutputSerializer.Meta.fields):
+            queryset = queryset.defer("description")
+        return queryset
+
+    @cached_response
+    def list(self, request, *args, **kwargs):
+        """
+        Enables authenticated users to list the posts of the feeds they created or follow, with the fields of
+        `PostOutputSerializer` rendered from values() rows.
+        """
+        queryset = self.filter_queryset(self.get_queryset())
+        posts = PostValuesSerializer.get_values(queryset, request, *self.paginator.ordering)
+        page = self.paginate_queryset(posts)
+        serializer = PostValuesSerializer(page, many=True, context=self.get_serializer_context())
+        return self.get_paginated_response(serializer.data)
+
+    @cached_response
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+
+    @action(detail=False, methods=["GET"], pagination_class=PostSearchPagination)
+    @cached_response
+    def search(self, request, *args, **kwargs):
+        """
+        Enables authenticated users to full-text search the posts of the feeds they created or follow,
+        best matches first. The `feed` and `read` filters of the posts list apply as well.
+
+        :param query_params:
+            - q (str) web search style query, e.g. `django "full text" -mysql`.
+
+        :return:
+            - `200 OK`
+            - `400 Bad Request` if `q` is missing.
+            - `403 Forbidden` if the user is anonymous.
+        """
+        serializer = PostSearchInputSerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+
+        queryset = self.filter_queryset(self.get_queryset()).search(serializer.validated_data["q"])
+        posts = PostSearchValuesSerializer.get_values(queryset, request, *self.paginator.ordering)
+        page = self.paginate_queryset(posts)
+        serializer = PostSearchValuesSerializer(page, many=True, context=self.get_serializer_context())
+        return self.get_paginated_response(serializer.data)
 
     @action(detail=True, methods=["POST"], url_path="mark-as-read")
     def mark_as_read(self, request, *args, **kwargs):
@@ -175,3 +294,56 @@ class PostViewSet(mixins.RetrieveModelMixin, mixins.ListModelMixin, GenericViewS
         instance = self.get_object()
         instance.mark_as_unread(self.request.user)
         return Response(self.get_serializer(instance).data, status=status.HTTP_200_OK)
+
+
+class TimelineViewSet(mixins.ListModelMixin, GenericViewSet):
+    """
+    The "river of news" of the authenticated user: the posts of every followed feed, newest first.
+
+    Served from the timeline entries written when the posts are fetched, `?read=false` only lists
+    the unread posts.
+    """
+
+    queryset = TimelineEntry.objects.all()
+    serializer_class = TimelineEntryOutputSerializer
+    filter_backends = (DjangoFilterBackend,)
+    filterset_class = TimelineFilter
+    pagination_class = TimelinePagination
+
+    def get_queryset(self):
+        """
+        :return: the timeline entries of the authenticated user.
+        """
+        return self.queryset.filter(user=self.request.user)
+
+    @cached_response
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        entries = TimelineEntryValuesSerializer.get_values(queryset, request, *self.paginator.ordering)
+        page = self.paginate_queryset(entries)
+        serializer = TimelineEntryValuesSerializer(page, many=True, context=self.get_serializer_context())
+        return self.get_paginated_response(serializer.data)
+
+
+class SyncViewSet(GenericViewSet):
+    def list(self, request, *args, **kwargs):
+        """
+        Enables authenticated users to fetch everything that changed since their previous sync: created or updated
+        posts of the followed feeds, read state and counters of the subscriptions, and unfollowed feeds.
+
+        Posts of a newly followed feed that were fetched before the subscription aren't part of the changes,
+        they're listed with the posts of the feed.
+
+        :param query_params:
+            - token (str, optional) returned by the previous sync, everything is returned without it.
+
+        :return:
+            - `200 OK` with the token of the next sync, which should follow right away if `more` is true.
+            - `400 Bad Request` if the token is invalid.
+            - `403 Forbidden` if the user is anonymous.
+        """
+        serializer = SyncInputSerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+
+        changes = SyncService(self.request.user).changes_since(serializer.validated_data["token"])
+        return Response(SyncOutputSerializer(changes).data, status=status.HTTP_200_OK)
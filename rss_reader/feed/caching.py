@@ -0,0 +1,73 @@
+import hashlib
+from functools import wraps
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from rest_framework import status
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+
+
+def _version_key(user_id):
+    return f"feed:responses:version:{user_id}"
+
+
+def get_responses_version(user_id):
+    """
+    Version of the cached API responses of a user, every change of what the user sees gets a new one.
+    """
+    version = cache.get(_version_key(user_id))
+    if version is None:
+        cache.add(_version_key(user_id), uuid4().hex, timeout=None)
+        version = cache.get(_version_key(user_id))
+    return version
+
+
+def invalidate_responses(user_ids):
+    """
+    Give new versions to the cached API responses of the given users, in one round trip once the current
+    transaction is committed.
+    """
+    user_ids = set(user_ids)
+    if user_ids:
+        transaction.on_commit(
+            lambda: cache.set_many({_version_key(user_id): uuid4().hex for user_id in user_ids}, timeout=None)
+        )
+
+
+def cached_response(view_method):
+    """
+    Cache the successful responses of a view method per user, path and query string, under the version of
+    the user's responses.
+
+    Responses carry a strong ETag hashing their JSON content, cached along with it, so a request whose
+    `If-None-Match` matches is answered with a 304 and a cache hit is served without querying the posts and
+    feeds nor serializing them. A response recomputed after its cache entry expired, or changed without a
+    new version, gets a new ETag.
+    """
+
+    @wraps(view_method)
+    def wrapper(self, request, *args, **kwargs):
+        version = get_responses_version(request.user.pk)
+        key = f"feed:responses:{request.user.pk}:{version}:{request.get_full_path()}"
+        if_none_match = [tag.strip() for tag in request.headers.get("If-None-Match", "").split(",")]
+
+        cached = cache.get(key)
+        if cached is not None:
+            etag, data = cached
+            if etag in if_none_match:
+                return Response(status=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+            return Response(data, headers={"ETag": etag})
+
+        response = view_method(self, request, *args, **kwargs)
+        if response.status_code == status.HTTP_200_OK:
+            etag = f'"{hashlib.sha256(JSONRenderer().render(response.data)).hexdigest()[:32]}"'
+            cache.set(key, (etag, response.data), timeout=settings.RESPONSE_CACHE_TIMEOUT)
+            if etag in if_none_match:
+                return Response(status=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+            response["ETag"] = etag
+        return response
+
+    return wrapper
@@ -0,0 +1,179 @@
+import logging
+import re
+from datetime import datetime, timedelta
+from datetime import timezone as dt_timezone
+
+from dateutil import parser
+
+logger = logging.getLogger(__name__)
+
+RFC822_RE = re.compile(
+    r"(?:[a-z]{3},?\s+)?(\d{1,2})\s+([a-z]{3})[a-z]*\.?\s+(\d{4}|\d{2})\s+(\d{1,2}):(\d{2})(?::(\d{2}))?"
+    r"(?:\s*([+-]\d{2}:?\d{2}|[a-z]{1,3}))?\s*$",
+    re.IGNORECASE,
+)
+MONTHS = {
+    month: number
+    for number, month in enumerate(
+        ("jan", "feb", "mar", "apr", "may", "jun", "jul", "aug", "sep", "oct", "nov", "dec"), start=1
+    )
+}
+# Hours from UTC of the zone names allowed by RFC 822.
+TIMEZONES = {
+    "z": 0,
+    "ut": 0,
+    "utc": 0,
+    "gmt": 0,
+    "est": -5,
+    "edt": -4,
+    "cst": -6,
+    "cdt": -5,
+    "mst": -7,
+    "mdt": -6,
+    "pst": -8,
+    "pdt": -7,
+}
+# Other formats found in the wild, tried in order until one matches the dates of a feed.
+KNOWN_FORMATS = (
+    "%Y-%m-%d %H:%M:%S%z",
+    "%Y-%m-%d %H:%M:%S",
+    "%Y/%m/%d %H:%M:%S",
+    "%a, %d %b %Y %H:%M:%S %Z",
+    "%a %b %d %H:%M:%S %Y",
+    "%a %b %d %H:%M:%S %z %Y",
+    "%d %B %Y %H:%M:%S %z",
+    "%B %d, %Y %H:%M:%S",
+    "%B %d, %Y",
+    "%d.%m.%Y %H:%M:%S",
+)
+# Feeds whose detected format is remembered by each process, forgotten all at once when full.
+DETECTED_FORMATS_SIZE = 10000
+_detected_formats = {}
+
+
+def parse_rfc822(value):
+    """
+    RFC 822 dates of RSS, with 2 or 4 digits years and with or without a weekday, seconds and zone.
+
+    Returns:
+        date (datetime): Aware datetime, None if the value isn't an RFC 822 date
+    """
+    match = RFC822_RE.match(value)
+    if match is None:
+        return None
+    day, month, year, hour, minute, second, zone = match.groups()
+    month = MONTHS.get(month.lower())
+    year = int(year)
+    if year < 100:
+        year += 2000 if year < 50 else 1900
+    if zone is None:
+        offset = 0
+    elif zone[0] in "+-":
+        zone = zone.replace(":", "")
+        offset = int(zone[1:3]) * 60 + int(zone[3:5])
+        offset = -offset if zone[0] == "-" else offset
+    elif zone.lower() in TIMEZONES:
+        offset = TIMEZONES[zone.lower()] * 60
+    else:
+        return None
+    try:
+        return datetime(
+            year,
+            month,
+            int(day),
+            int(hour),
+            int(minute),
+            int(second or 0),
+            tzinfo=dt_timezone(timedelta(minutes=offset)),
+        )
+    except (TypeError, ValueError):
+        # Unknown month or out of range field.
+        return None
+
+
+def parse_rfc3339(value):
+    """
+    RFC 3339 dates of Atom, and the ISO 8601 ones accepted by `datetime.fromisoformat`.
+
+    Returns:
+        date (datetime): Datetime, naive if the value has no offset, None if the value isn't an ISO 8601 date
+    """
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        return None
+
+
+class DateParser:
+    """
+    Normalize the dates of the entries of a feed to aware UTC datetimes, trying the cheapest ways first:
+
+    - the time tuple already parsed by feedparser
+    - the RFC 822 and RFC 3339 parsers, for the formats required by RSS and Atom
+    - the format detected for the previous dates of the feed, or the first of `KNOWN_FORMATS` that matches
+    - dateutil, which guesses any format but is an order of magnitude slower
+
+    Dates without an offset are taken as UTC, like feedparser does. The detected formats are remembered
+    per feed across refreshes.
+
+    Usage:
+        date_parser = DateParser(feed.xml_url)
+        published_time = date_parser.parse(entry)
+    """
+
+    def __init__(self, feed_key=None):
+        self.feed_key = feed_key
+        self.format = _detected_formats.get(feed_key)
+
+    def parse(self, entry, key="published"):
+        """
+        Parameters:
+            entry (dict): Entry from feedparser or `StreamingFeedParser`
+            key (str): Name of the date, feedparser's tuple is read from `<key>_parsed`
+
+        Returns:
+            date (datetime): Aware UTC datetime, None if the entry has no date or it can't be parsed
+        """
+        parsed = entry.get(f"{key}_parsed")
+        if parsed:
+            return datetime(*parsed[:6], tzinfo=dt_timezone.utc)
+        value = entry.get(key)
+        if not value:
+            return None
+        value = value.strip()
+        date = parse_rfc822(value) or parse_rfc3339(value) or self._parse_known_format(value) or self._guess(value)
+        if date is None:
+            return None
+        if date.tzinfo is None:
+            return date.replace(tzinfo=dt_timezone.utc)
+        return date.astimezone(dt_timezone.utc)
+
+    def _parse_known_format(self, value):
+        if self.format is not None:
+            try:
+                return datetime.strptime(value, self.format)
+            except ValueError:
+                pass
+        for date_format in KNOWN_FORMATS:
+            try:
+                date = datetime.strptime(value, date_format)
+            except ValueError:
+                continue
+            self._remember(date_format)
+            return date
+        return None
+
+    def _remember(self, date_format):
+        self.format = date_format
+        if self.feed_key is not None:
+            if len(_detected_formats) >= DETECTED_FORMATS_SIZE:
+                _detected_formats.clear()
+            _detected_formats[self.feed_key] = date_format
+
+    @staticmethod
+    def _guess(value):
+        try:
+            return parser.parse(value)
+        except (parser.ParserError, OverflowError, ValueError) as exc:
+            logger.info(f'Unparsable entry date "{value}": {exc}')
+            return None
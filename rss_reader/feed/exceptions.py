@@ -2,5 +2,7 @@ class FeedException(Exception):
     details = "Error while parsing feed"
 
     def __init__(self, details=None, context=None):
-        self.details = details or self.default_details
+        # Passing the details to Exception keeps them when pickled, e.g. out of the parse processes.
+        super().__init__(details)
+        self.details = details or self.details
         self.context = context
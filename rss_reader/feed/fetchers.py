@@ -0,0 +1,112 @@
+import asyncio
+import logging
+from dataclasses import dataclass, field
+
+import httpx
+from django.conf import settings
+
+from rss_reader.feed.http import conditional_headers, make_async_client
+from rss_reader.feed.models import Feed
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class FetchResult:
+    """
+    Outcome of downloading a single feed document.
+    """
+
+    feed_id: int
+    status: int | None = None
+    content: bytes = b""
+    headers: dict = field(default_factory=dict)
+    error: Exception | None = None
+
+
+class AsyncFeedFetcher:
+    """
+    Download many feeds concurrently from a single worker.
+
+    The number of in-flight requests is bounded by a semaphore, and the stored
+    ETag / Last-Modified validators of every feed are sent along with its request.
+    The requests go through `make_async_client`, so the limits of every host are respected.
+
+    Usage:
+        - Fetch a batch of feeds
+            `results = AsyncFeedFetcher().run(feeds)`
+    """
+
+    def __init__(self, concurrency=None, timeout=None, transport=None):
+        self.concurrency = concurrency or settings.FEED_FETCH_CONCURRENCY
+        self.timeout = timeout or settings.FEED_FETCH_TIMEOUT
+        self.transport = transport
+
+    async def fetch(self, client: httpx.AsyncClient, semaphore: asyncio.Semaphore, feed: Feed):
+        """
+        Download one feed document, never raising.
+
+        Parameters:
+            client (httpx.AsyncClient): Shared HTTP client
+            semaphore (asyncio.Semaphore): Bounds the number of concurrent requests
+            feed (Feed): Feed to download
+
+        Returns:
+            result (FetchResult): Response status, body and headers, or the raised error
+        """
+        async with semaphore:
+            return await self._download(client, feed)
+
+    async def _download(self, client, feed):
+        try:
+            response = await client.get(feed.xml_url, headers=conditional_headers(feed))
+        except httpx.HTTPError as exc:
+            logger.warning(f'Failed fetching feed "{feed.xml_url}": {exc}')
+            return FetchResult(feed_id=feed.id, error=exc)
+        return FetchResult(
+            feed_id=feed.id, status=response.status_code, content=response.content, headers=dict(response.headers)
+        )
+
+    def _client(self):
+        return make_async_client(self.transport, self.timeout)
+
+    async def fetch_all(self, feeds):
+        semaphore = asyncio.Semaphore(self.concurrency)
+        async with self._client() as client:
+            return await asyncio.gather(*(self.fetch(client, semaphore, feed) for feed in feeds))
+
+    async def stream(self, feeds, callback, stopped=None):
+        """
+        Download the given feeds concurrently, handing every result over to `callback` as soon as it is
+        downloaded instead of returning them all at the end.
+
+        A download slot is only released once the callback returns, so a consumer that can't keep up
+        holds the next downloads back rather than letting the documents pile up in memory.
+
+        Parameters:
+            feeds (list): Feed instances
+            callback (coroutine function): Awaited with the FetchResult of every feed
+            stopped (threading.Event): Once set, the feeds that aren't downloading yet are skipped
+        """
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def fetch(client, feed):
+            async with semaphore:
+                if stopped is not None and stopped.is_set():
+                    return
+                await callback(await self._download(client, feed))
+
+        async with self._client() as client:
+            await asyncio.gather(*(fetch(client, feed) for feed in feeds))
+
+    def run(self, feeds):
+        """
+        Download the given feeds concurrently.
+
+        Parameters:
+            feeds (list): Feed instances
+
+        Returns:
+            results (list): FetchResult per feed, in the same order
+        """
+        return asyncio.run(self.fetch_all(feeds))
@@ -1,6 +1,6 @@
 from django_filters import rest_framework as filters
 
-from rss_reader.feed.models import Post
+from rss_reader.feed.models import Post, TimelineEntry
 
 
 class PostFilter(filters.FilterSet):
@@ -12,7 +12,7 @@ class PostFilter(filters.FilterSet):
 
     def _filter_read(self, queryset, name, value):
         """
-        Filter the given queryset based on the read status of posts.
+        Filter the given queryset based on the read status of posts for the requesting user.
 
         :param queryset: The queryset to be filtered.
         :param name: The name of the filter.
@@ -23,7 +23,23 @@ class PostFilter(filters.FilterSet):
         if value is None:
             return queryset
         if value is False:
-            return queryset.exclude(read_posts__read_posts__in=queryset)
+            return queryset.unread_by(self.request.user)
         if value is True:
-            return queryset.filter(read_posts__read_posts__in=queryset)
+            return queryset.read_by(self.request.user)
         return queryset
+
+
+class TimelineFilter(filters.FilterSet):
+    read = filters.BooleanFilter(method="_filter_read")
+
+    class Meta:
+        model = TimelineEntry
+        fields = ["read"]
+
+    def _filter_read(self, queryset, name, value):
+        """
+        Filter the timeline entries of the requesting user based on the read status of their posts.
+        """
+        if value is None:
+            return queryset
+        return queryset.read() if value else queryset.unread()
@@ -0,0 +1,69 @@
+import logging
+
+import redis
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Takes the lease if it's free or renews it if the owner already holds it, returns the owner of the lease.
+CLAIM_SCRIPT = """
+local owner = redis.call('GET', KEYS[1])
+if owner == false or owner == ARGV[1] then
+    redis.call('SET', KEYS[1], ARGV[1], 'PX', ARGV[2])
+    return ARGV[1]
+end
+return owner
+"""
+# Only the owner can release the lease, a lease that expired may have been taken by another task since.
+RELEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+_client = None
+
+
+def _get_client():
+    global _client
+    if _client is None:
+        _client = redis.Redis.from_url(settings.REDIS_URL, decode_responses=True)
+    return _client
+
+
+def refresh_lease_key(feed_id):
+    return f"feed:refresh:{feed_id}"
+
+
+def claim_refresh(feed_id, owner):
+    """
+    Take the refresh lease of a feed, so a single refresh of the feed is queued or running at a time.
+    The lease expires after `FEED_REFRESH_LEASE_TTL` seconds in case its owner never releases it.
+
+    Redis being unavailable doesn't stop refreshes, the lease is then considered taken.
+
+    Parameters:
+        feed_id (int): Feed to refresh
+        owner (str): Id of the refresh task
+
+    Returns:
+        owner (str): Id of the task holding the lease, `owner` if it's been taken or renewed
+    """
+    try:
+        return _get_client().eval(
+            CLAIM_SCRIPT, 1, refresh_lease_key(feed_id), owner, settings.FEED_REFRESH_LEASE_TTL * 1000
+        )
+    except redis.RedisError as exc:
+        logger.warning(f"Failed claiming the refresh lease of feed with id: {feed_id}: {exc}")
+        return owner
+
+
+def release_refresh(feed_id, owner):
+    """
+    Release the refresh lease of a feed, if it's still held by `owner`.
+    """
+    try:
+        _get_client().eval(RELEASE_SCRIPT, 1, refresh_lease_key(feed_id), owner)
+    except redis.RedisError as exc:
+        logger.warning(f"Failed releasing the refresh lease of feed with id: {feed_id}: {exc}")
@@ -0,0 +1,80 @@
+import time
+import warnings
+from statistics import median
+
+from dateutil import parser
+from django.core.management.base import BaseCommand
+
+from rss_reader.feed.dates import DateParser
+
+# Entry dates as found in real feeds, the most common formats first.
+CORPUS = [
+    "Sat, 01 Jan 2022 12:00:00 GMT",
+    "Sat, 01 Jan 2022 12:00:00 +0000",
+    "Mon, 3 Oct 2022 08:15:42 -0400",
+    "Tue, 14 Feb 2023 19:01:00 EST",
+    "Wed, 05 Jul 23 06:30:00 PDT",
+    "Thu, 16 Nov 2023 10:00 +0100",
+    "2022-01-01T12:00:00Z",
+    "2023-03-14T15:09:26+02:00",
+    "2023-03-14T15:09:26.535897Z",
+    "2021-12-31T23:59:59.999-05:00",
+    "2024-02-29T00:00:00",
+    "2023-08-21 09:12:44+0000",
+    "2023-08-21 09:12:44",
+    "2023/08/21 09:12:44",
+    "Mon Aug 21 09:12:44 2023",
+    "August 21, 2023",
+]
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare the entries per second of DateParser against dateutil's parser on a corpus of real-world "
+        "entry dates, with and without the time tuples parsed by feedparser."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--runs", type=int, default=20, help="Measurements per parser")
+        parser.add_argument("--repeat", type=int, default=100, help="Passes over the corpus per measurement")
+
+    def handle(self, *args, **options):
+        entries = [{"published": value} for value in CORPUS] * options["repeat"]
+        parsed_entries = [
+            {"published": value, "published_parsed": DateParser().parse({"published": value}).timetuple()}
+            for value in CORPUS
+        ] * options["repeat"]
+
+        def dateutil_parser():
+            with warnings.catch_warnings():
+                # dateutil ignores the US zone names of RFC 822, DateParser doesn't.
+                warnings.simplefilter("ignore", parser.UnknownTimezoneWarning)
+                for entry in entries:
+                    parser.parse(entry["published"])
+
+        def date_parser(entries):
+            def parse():
+                date_parser = DateParser("benchmark")
+                for entry in entries:
+                    date_parser.parse(entry)
+
+            return parse
+
+        self.stdout.write(f"{'parser':>24} {'entries/s':>12} {'speedup':>8}")
+        baseline = self._entries_per_second(dateutil_parser, len(entries), options["runs"])
+        self.stdout.write(f"{'dateutil':>24} {baseline:>12.0f} {1:>7.1f}x")
+        for name, parse in (
+            ("DateParser", date_parser(entries)),
+            ("DateParser with tuples", date_parser(parsed_entries)),
+        ):
+            rate = self._entries_per_second(parse, len(entries), options["runs"])
+            self.stdout.write(f"{name:>24} {rate:>12.0f} {rate / baseline:>7.1f}x")
+
+    @staticmethod
+    def _entries_per_second(parse, count, runs):
+        timings = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            parse()
+            timings.append(time.perf_counter() - start)
+        return count / median(timings)
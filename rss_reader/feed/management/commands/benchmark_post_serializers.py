@@ -0,0 +1,73 @@
+import time
+from statistics import median
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from rest_framework.renderers import JSONRenderer
+
+from rss_reader.feed.api.renderers import ORJSONRenderer
+from rss_reader.feed.api.serializers import PostOutputSerializer, PostValuesSerializer
+from rss_reader.feed.models import Feed, Post
+from rss_reader.users.models import User
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare the pages per second of the post listing serialization paths: model instances through "
+        "PostOutputSerializer and JSONRenderer, against values() rows through PostValuesSerializer and "
+        "ORJSONRenderer. Everything is created inside a transaction that is rolled back at the end."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sizes", type=int, nargs="+", default=[20, 100, 500], help="Page sizes")
+        parser.add_argument("--runs", type=int, default=50, help="Pages rendered per measurement")
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self._benchmark(options["sizes"], options["runs"])
+                raise Rollback
+        except Rollback:
+            pass
+
+    def _benchmark(self, sizes, runs):
+        user = User.objects.create(username="benchmark-post-serializers")
+        feed = Feed.objects.create(creator=user, title="Benchmark", xml_url="https://benchmark.invalid/feed.xml")
+        Post.objects.bulk_create(
+            Post(
+                feed=feed,
+                title=f"Post {index}",
+                description="Lorem ipsum dolor sit amet, consectetur adipiscing elit. " * 10,
+                link=f"https://benchmark.invalid/{index}",
+                published_time=feed.created,
+                last_update=feed.created,
+            )
+            for index in range(max(sizes))
+        )
+        posts = feed.posts.order_by("-last_update", "-id")
+
+        def model_serializer(size):
+            return JSONRenderer().render(PostOutputSerializer(posts.defer("search_vector")[:size], many=True).data)
+
+        def values_serializer(size):
+            rows = PostValuesSerializer.get_values(posts, None)[:size]
+            return ORJSONRenderer().render(PostValuesSerializer(rows, many=True).data)
+
+        self.stdout.write(f"{'page size':>10} {'model pages/s':>14} {'values pages/s':>15} {'speedup':>8}")
+        for size in sizes:
+            model = self._pages_per_second(lambda: model_serializer(size), runs)
+            values = self._pages_per_second(lambda: values_serializer(size), runs)
+            self.stdout.write(f"{size:>10} {model:>14.1f} {values:>15.1f} {values / model:>7.1f}x")
+
+    @staticmethod
+    def _pages_per_second(render, runs):
+        timings = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            render()
+            timings.append(time.perf_counter() - start)
+        return 1 / median(timings)
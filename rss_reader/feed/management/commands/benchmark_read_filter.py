@@ -0,0 +1,79 @@
+import time
+from statistics import median
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from rss_reader.feed.models import Feed, Post, ReadMark, UserFeed
+from rss_reader.users.models import User
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure the latency of the read/unread post filter while the read state table grows. "
+        "Everything is created inside a transaction that is rolled back at the end."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--posts", type=int, default=1000, help="Posts of the benchmarked feed")
+        parser.add_argument(
+            "--sizes",
+            type=int,
+            nargs="+",
+            default=[0, 10_000, 100_000, 500_000],
+            help="Read marks of other users to reach before each measurement",
+        )
+        parser.add_argument("--runs", type=int, default=20, help="Queries per measurement")
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self._benchmark(options["posts"], options["sizes"], options["runs"])
+                raise Rollback
+        except Rollback:
+            pass
+
+    def _benchmark(self, posts_count, sizes, runs):
+        user = User.objects.create(username="benchmark-read-filter")
+        feed = Feed.objects.create(creator=user, title="Benchmark", xml_url="https://benchmark.invalid/feed.xml")
+        Post.objects.bulk_create(
+            Post(feed=feed, title=f"Post {index}", link=f"https://benchmark.invalid/{index}")
+            for index in range(posts_count)
+        )
+        post_ids = list(feed.posts.order_by("id").values_list("id", flat=True))
+        # The benchmarked user read the first half of the feed and a few posts after it.
+        user_feed = UserFeed.objects.create(user=user, feed=feed, read_up_to=post_ids[len(post_ids) // 2])
+        ReadMark.objects.bulk_create(
+            ReadMark(user_feed=user_feed, post_id=post_id, is_read=True)
+            for post_id in post_ids[len(post_ids) // 2 + 1 :: 10]
+        )
+
+        self.stdout.write(f"{'read marks':>12} {'unread p50 (ms)':>16} {'read p50 (ms)':>14}")
+        other_users = 0
+        for size in sizes:
+            while ReadMark.objects.count() < size:
+                other_users += 1
+                other_user = User.objects.create(username=f"benchmark-read-filter-{other_users}")
+                other_feed = UserFeed.objects.create(user=other_user, feed=feed)
+                ReadMark.objects.bulk_create(
+                    ReadMark(user_feed=other_feed, post_id=post_id, is_read=True) for post_id in post_ids
+                )
+            with connection.cursor() as cursor:
+                for model in (UserFeed, ReadMark):
+                    cursor.execute(f"ANALYZE {model._meta.db_table}")
+            unread = self._time(lambda: list(Post.objects.filter(feed=feed).unread_by(user)[:20]), runs)
+            read = self._time(lambda: list(Post.objects.filter(feed=feed).read_by(user)[:20]), runs)
+            self.stdout.write(f"{ReadMark.objects.count():>12} {unread:>16.2f} {read:>14.2f}")
+
+    @staticmethod
+    def _time(query, runs):
+        timings = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            query()
+            timings.append((time.perf_counter() - start) * 1000)
+        return median(timings)
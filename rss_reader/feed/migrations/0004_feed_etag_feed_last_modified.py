@@ -0,0 +1,24 @@
+# Generated by Django 4.2.6 on 2026-10-18 19:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("feed", "0003_userfeed_read_posts"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="feed",
+            name="etag",
+            field=models.CharField(blank=True, help_text="ETag header of the last fetched response", max_length=255),
+        ),
+        migrations.AddField(
+            model_name="feed",
+            name="last_modified",
+            field=models.CharField(
+                blank=True, help_text="Last-Modified header of the last fetched response", max_length=255
+            ),
+        ),
+    ]
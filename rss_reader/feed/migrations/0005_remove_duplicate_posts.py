@@ -0,0 +1,37 @@
+# Generated by Django 4.2.6 on 2026-10-18 19:25
+
+from django.db import migrations
+from django.db.models import Count, Max
+
+
+def remove_duplicate_posts(apps, schema_editor):
+    """
+    Keep the latest post of every (feed, link) pair, moving the read state of the duplicates onto it.
+    """
+    Post = apps.get_model("feed", "Post")
+    UserFeed = apps.get_model("feed", "UserFeed")
+    ReadPost = UserFeed.read_posts.through
+
+    duplicates = (
+        Post.objects.values("feed_id", "link").annotate(total=Count("id"), keep_id=Max("id")).filter(total__gt=1)
+    )
+    for duplicate in duplicates:
+        stale_ids = list(
+            Post.objects.filter(feed_id=duplicate["feed_id"], link=duplicate["link"])
+            .exclude(id=duplicate["keep_id"])
+            .values_list("id", flat=True)
+        )
+        readers = set(ReadPost.objects.filter(post_id__in=stale_ids).values_list("userfeed_id", flat=True))
+        readers -= set(ReadPost.objects.filter(post_id=duplicate["keep_id"]).values_list("userfeed_id", flat=True))
+        ReadPost.objects.bulk_create(ReadPost(userfeed_id=reader, post_id=duplicate["keep_id"]) for reader in readers)
+        Post.objects.filter(id__in=stale_ids).delete()
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("feed", "0004_feed_etag_feed_last_modified"),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_posts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,16 @@
+# Generated by Django 4.2.6 on 2026-10-18 19:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("feed", "0005_remove_duplicate_posts"),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name="post",
+            constraint=models.UniqueConstraint(fields=("feed", "link"), name="unique_feed_post_link"),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 4.2.6 on 2026-10-18 19:28
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("feed", "0006_unique_feed_post_link"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="feed",
+            name="next_refresh_at",
+            field=models.DateTimeField(
+                db_index=True,
+                default=django.utils.timezone.now,
+                help_text="When the feed is due for its next automatic refresh",
+            ),
+        ),
+    ]
@@ -0,0 +1,72 @@
+# Generated by Django 4.2.6 on 2026-10-18 19:40
+
+from collections import defaultdict
+
+from django.db import migrations
+
+from rss_reader.feed.utils import normalize_feed_url
+
+
+def merge_duplicate_feeds(apps, schema_editor):
+    """
+    Fill in normalized_url and merge feeds sharing it into the oldest one.
+
+    Posts and subscriptions of the duplicates are moved to the kept feed, merging the read
+    state of posts/subscriptions that exist on both sides, and the creators of the duplicates
+    are subscribed to the kept feed so they keep seeing it.
+    """
+    Feed = apps.get_model("feed", "Feed")
+    Post = apps.get_model("feed", "Post")
+    UserFeed = apps.get_model("feed", "UserFeed")
+    ReadPost = UserFeed.read_posts.through
+
+    feeds_by_url = defaultdict(list)
+    for feed in Feed.objects.order_by("id"):
+        feed.normalized_url = normalize_feed_url(feed.xml_url)
+        feed.save(update_fields=["normalized_url"])
+        feeds_by_url[feed.normalized_url].append(feed)
+
+    for kept, *duplicates in feeds_by_url.values():
+        for duplicate in duplicates:
+            kept_posts = dict(Post.objects.filter(feed=kept).values_list("link", "id"))
+            for post in Post.objects.filter(feed=duplicate):
+                if post.link not in kept_posts:
+                    post.feed = kept
+                    post.save(update_fields=["feed"])
+                    continue
+                readers = set(ReadPost.objects.filter(post_id=post.id).values_list("userfeed_id", flat=True))
+                readers -= set(
+                    ReadPost.objects.filter(post_id=kept_posts[post.link]).values_list("userfeed_id", flat=True)
+                )
+                ReadPost.objects.filter(post_id=post.id, userfeed_id__in=readers).update(
+                    post_id=kept_posts[post.link]
+                )
+                post.delete()
+
+            for user_feed in UserFeed.objects.filter(feed=duplicate):
+                kept_user_feed = UserFeed.objects.filter(user_id=user_feed.user_id, feed=kept).first()
+                if kept_user_feed is None:
+                    user_feed.feed = kept
+                    user_feed.save(update_fields=["feed"])
+                    continue
+                read_posts = set(ReadPost.objects.filter(userfeed_id=user_feed.id).values_list("post_id", flat=True))
+                read_posts -= set(
+                    ReadPost.objects.filter(userfeed_id=kept_user_feed.id).values_list("post_id", flat=True)
+                )
+                ReadPost.objects.filter(userfeed_id=user_feed.id, post_id__in=read_posts).update(
+                    userfeed_id=kept_user_feed.id
+                )
+                user_feed.delete()
+
+            UserFeed.objects.get_or_create(user_id=duplicate.creator_id, feed=kept)
+            duplicate.delete()
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("feed", "0008_feed_normalized_url"),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_feeds, migrations.RunPython.noop),
+    ]
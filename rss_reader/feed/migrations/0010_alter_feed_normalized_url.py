@@ -0,0 +1,22 @@
+# Generated by Django 4.2.6 on 2026-10-18 19:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("feed", "0009_merge_duplicate_feeds"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="feed",
+            name="normalized_url",
+            field=models.CharField(
+                editable=False,
+                help_text="Normalized xml_url, feeds are shared by this key",
+                max_length=255,
+                unique=True,
+            ),
+        ),
+    ]
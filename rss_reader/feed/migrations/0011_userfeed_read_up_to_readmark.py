@@ -0,0 +1,43 @@
+# Generated by Django 4.2.6 on 2026-10-18 19:31
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("feed", "0010_alter_feed_normalized_url"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="userfeed",
+            name="read_up_to",
+            field=models.BigIntegerField(
+                default=0, help_text="Posts of the feed up to this id are read, unless they're marked as unread"
+            ),
+        ),
+        migrations.CreateModel(
+            name="ReadMark",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("is_read", models.BooleanField()),
+                (
+                    "post",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE, related_name="read_marks", to="feed.post"
+                    ),
+                ),
+                (
+                    "user_feed",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE, related_name="read_marks", to="feed.userfeed"
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name="readmark",
+            constraint=models.UniqueConstraint(fields=("user_feed", "post"), name="unique_user_feed_read_mark"),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 4.2.6 on 2026-10-18 19:31
+
+from django.db import migrations
+
+
+def migrate_read_posts(apps, schema_editor):
+    """
+    Turn the read posts of every subscription into a read watermark, the longest run of read posts
+    from the start of the feed, plus read marks for the read posts after it.
+    """
+    Post = apps.get_model("feed", "Post")
+    UserFeed = apps.get_model("feed", "UserFeed")
+    ReadMark = apps.get_model("feed", "ReadMark")
+
+    for user_feed in UserFeed.objects.filter(read_posts__isnull=False).distinct():
+        read_ids = set(user_feed.read_posts.values_list("id", flat=True))
+        read_up_to = 0
+        for post_id in Post.objects.filter(feed_id=user_feed.feed_id).order_by("id").values_list("id", flat=True):
+            if post_id not in read_ids:
+                break
+            read_up_to = post_id
+        user_feed.read_up_to = read_up_to
+        user_feed.save(update_fields=["read_up_to"])
+        ReadMark.objects.bulk_create(
+            ReadMark(user_feed=user_feed, post_id=post_id, is_read=True)
+            for post_id in read_ids
+            if post_id > read_up_to
+        )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("feed", "0011_userfeed_read_up_to_readmark"),
+    ]
+
+    operations = [
+        migrations.RunPython(migrate_read_posts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,16 @@
+# Generated by Django 4.2.6 on 2026-10-18 19:31
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("feed", "0012_migrate_read_posts_to_read_marks"),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name="userfeed",
+            name="read_posts",
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 4.2.6 on 2026-10-18 19:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("feed", "0013_remove_userfeed_read_posts"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="post",
+            index=models.Index(
+                models.OrderBy(models.F("last_update"), descending=True, nulls_last=True),
+                models.OrderBy(models.F("id"), descending=True),
+                name="post_last_update_id_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="post",
+            index=models.Index(
+                models.F("feed"),
+                models.OrderBy(models.F("last_update"), descending=True, nulls_last=True),
+                models.OrderBy(models.F("id"), descending=True),
+                name="post_feed_last_update_id_idx",
+            ),
+        ),
+    ]
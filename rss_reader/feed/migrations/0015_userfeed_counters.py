@@ -0,0 +1,22 @@
+# Generated by Django 4.2.6 on 2026-10-18 19:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("feed", "0014_post_keyset_indexes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="userfeed",
+            name="total_count",
+            field=models.PositiveIntegerField(default=0, help_text="Number of posts of the feed"),
+        ),
+        migrations.AddField(
+            model_name="userfeed",
+            name="unread_count",
+            field=models.PositiveIntegerField(default=0, help_text="Number of posts of the feed not read by the user"),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 4.2.6 on 2026-10-18 19:48
+
+from django.db import migrations
+
+
+def populate_counters(apps, schema_editor):
+    Post = apps.get_model("feed", "Post")
+    UserFeed = apps.get_model("feed", "UserFeed")
+    ReadMark = apps.get_model("feed", "ReadMark")
+
+    for user_feed in UserFeed.objects.all():
+        total_count = Post.objects.filter(feed_id=user_feed.feed_id).count()
+        read_count = (
+            Post.objects.filter(feed_id=user_feed.feed_id, id__lte=user_feed.read_up_to).count()
+            - ReadMark.objects.filter(user_feed=user_feed, is_read=False).count()
+            + ReadMark.objects.filter(user_feed=user_feed, is_read=True).count()
+        )
+        user_feed.total_count = total_count
+        user_feed.unread_count = total_count - read_count
+        user_feed.save(update_fields=["total_count", "unread_count"])
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("feed", "0015_userfeed_counters"),
+    ]
+
+    operations = [
+        migrations.RunPython(populate_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,62 @@
+# Generated by Django 4.2.6 on 2026-10-18 19:55
+
+from django.db import migrations
+from django.db.models import Count, Min
+
+
+def remove_duplicate_user_feeds(apps, schema_editor):
+    """
+    Keep the oldest subscription of every (user, feed) pair, merging the read state of the others into it:
+    a post read in any of them stays read.
+    """
+    Post = apps.get_model("feed", "Post")
+    UserFeed = apps.get_model("feed", "UserFeed")
+    ReadMark = apps.get_model("feed", "ReadMark")
+
+    duplicates = (
+        UserFeed.objects.values("user_id", "feed_id")
+        .annotate(total=Count("id"), keep_id=Min("id"))
+        .filter(total__gt=1)
+    )
+    for duplicate in duplicates:
+        user_feeds = list(UserFeed.objects.filter(user_id=duplicate["user_id"], feed_id=duplicate["feed_id"]))
+        marks = {user_feed.id: {} for user_feed in user_feeds}
+        for user_feed_id, post_id, is_read in ReadMark.objects.filter(user_feed__in=user_feeds).values_list(
+            "user_feed_id", "post_id", "is_read"
+        ):
+            marks[user_feed_id][post_id] = is_read
+
+        # Only the posts with a mark can be read differently than the highest watermark tells.
+        read_up_to = max(user_feed.read_up_to for user_feed in user_feeds)
+        merged_marks = {}
+        for post_id in set().union(*marks.values()):
+            is_read = any(
+                marks[user_feed.id].get(post_id, post_id <= user_feed.read_up_to) for user_feed in user_feeds
+            )
+            if is_read != (post_id <= read_up_to):
+                merged_marks[post_id] = is_read
+
+        keep = next(user_feed for user_feed in user_feeds if user_feed.id == duplicate["keep_id"])
+        UserFeed.objects.filter(user_id=keep.user_id, feed_id=keep.feed_id).exclude(id=keep.id).delete()
+        ReadMark.objects.filter(user_feed=keep).delete()
+        ReadMark.objects.bulk_create(
+            ReadMark(user_feed=keep, post_id=post_id, is_read=is_read) for post_id, is_read in merged_marks.items()
+        )
+        read_count = (
+            Post.objects.filter(feed_id=keep.feed_id, id__lte=read_up_to).count()
+            - sum(not is_read for is_read in merged_marks.values())
+            + sum(merged_marks.values())
+        )
+        keep.read_up_to = read_up_to
+        keep.unread_count = max(keep.total_count - read_count, 0)
+        keep.save(update_fields=["read_up_to", "unread_count"])
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("feed", "0016_populate_userfeed_counters"),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_user_feeds, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,16 @@
+# Generated by Django 4.2.6 on 2026-10-18 19:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("feed", "0017_remove_duplicate_user_feeds"),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name="userfeed",
+            constraint=models.UniqueConstraint(fields=("user", "feed"), name="unique_user_feed"),
+        ),
+    ]
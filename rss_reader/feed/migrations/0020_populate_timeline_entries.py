@@ -0,0 +1,27 @@
+# Generated by Django 4.2.6 on 2026-10-18 19:41
+
+from django.db import migrations
+
+
+def populate_timeline_entries(apps, schema_editor):
+    Post = apps.get_model("feed", "Post")
+    UserFeed = apps.get_model("feed", "UserFeed")
+    TimelineEntry = apps.get_model("feed", "TimelineEntry")
+
+    schema_editor.execute(
+        f"INSERT INTO {TimelineEntry._meta.db_table} (user_id, user_feed_id, post_id, sort_time) "
+        "SELECT user_feed.user_id, user_feed.id, post.id, COALESCE(post.published_time, post.created) "
+        f"FROM {Post._meta.db_table} post "
+        f"JOIN {UserFeed._meta.db_table} user_feed ON user_feed.feed_id = post.feed_id "
+        "ON CONFLICT (user_feed_id, post_id) DO NOTHING"
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("feed", "0019_timelineentry"),
+    ]
+
+    operations = [
+        migrations.RunPython(populate_timeline_entries, migrations.RunPython.noop),
+    ]
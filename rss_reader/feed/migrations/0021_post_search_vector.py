@@ -0,0 +1,25 @@
+# Generated by Django 4.2.6 on 2026-10-18 19:41
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("feed", "0020_populate_timeline_entries"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="post",
+            name="search_vector",
+            field=django.contrib.postgres.search.SearchVectorField(
+                editable=False, help_text="Maintained when the post is fetched", null=True
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="post",
+            index=django.contrib.postgres.indexes.GinIndex(fields=["search_vector"], name="post_search_vector_idx"),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 4.2.6 on 2026-10-18 19:52
+
+from django.conf import settings
+from django.contrib.postgres.search import SearchVector
+from django.db import migrations
+
+
+def populate_search_vector(apps, schema_editor):
+    Post = apps.get_model("feed", "Post")
+
+    Post.objects.update(
+        search_vector=SearchVector("title", weight="A", config=settings.POST_SEARCH_CONFIG)
+        + SearchVector("description", weight="B", config=settings.POST_SEARCH_CONFIG)
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("feed", "0021_post_search_vector"),
+    ]
+
+    operations = [
+        migrations.RunPython(populate_search_vector, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,88 @@
+# Generated by Django 4.2.6 on 2026-10-18 19:50
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import rss_reader.feed.models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("feed", "0022_populate_post_search_vector"),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            "CREATE SEQUENCE feed_change_seq",
+            "DROP SEQUENCE feed_change_seq",
+        ),
+        # Takes the values of the change sequence, including the defaults of the change_seq fields below.
+        migrations.RunSQL(
+            """
+            CREATE FUNCTION feed_next_change_seq() RETURNS bigint LANGUAGE plpgsql AS $$
+            DECLARE
+                low_water bigint;
+            BEGIN
+                -- The first value taken by a transaction is announced beforehand with a lock on a lower value,
+                -- held until the transaction ends, see `current_change_seq`. The locks use the two keys form,
+                -- the first key in a range of its own (1178944836 is "FEED") and the second one below 2^31.
+                IF coalesce(current_setting('feed.change_seq_low_water', true), '') = '' THEN
+                    SELECT CASE WHEN is_called THEN last_value ELSE last_value - 1 END INTO low_water
+                    FROM feed_change_seq;
+                    PERFORM pg_advisory_xact_lock_shared(
+                        (1178944836 + (low_water >> 31))::integer, (low_water & 2147483647)::integer
+                    );
+                    PERFORM set_config('feed.change_seq_low_water', low_water::text, true);
+                END IF;
+                RETURN nextval('feed_change_seq');
+            END
+            $$
+            """,
+            "DROP FUNCTION feed_next_change_seq()",
+        ),
+        migrations.AddField(
+            model_name="post",
+            name="change_seq",
+            field=models.BigIntegerField(
+                db_index=True,
+                default=rss_reader.feed.models.next_change_seq,
+                help_text="Change sequence of the last update",
+            ),
+        ),
+        migrations.AddField(
+            model_name="userfeed",
+            name="change_seq",
+            field=models.BigIntegerField(
+                default=rss_reader.feed.models.next_change_seq,
+                help_text="Change sequence of the last read state or counters update",
+            ),
+        ),
+        migrations.CreateModel(
+            name="Unsubscription",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("change_seq", models.BigIntegerField()),
+                (
+                    "feed",
+                    models.ForeignKey(
+                        db_constraint=False,
+                        on_delete=django.db.models.deletion.DO_NOTHING,
+                        related_name="+",
+                        to="feed.feed",
+                    ),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="unsubscriptions",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [models.Index(fields=["user", "change_seq"], name="unsubscription_user_seq_idx")],
+            },
+        ),
+    ]
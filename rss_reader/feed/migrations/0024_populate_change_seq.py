@@ -0,0 +1,26 @@
+# Generated by Django 4.2.6 on 2026-10-18 20:02
+
+from django.db import migrations
+
+
+def populate_change_seq(apps, schema_editor):
+    Post = apps.get_model("feed", "Post")
+    UserFeed = apps.get_model("feed", "UserFeed")
+
+    # Adding the columns gave all the existing rows the same change sequence value.
+    for table in (Post._meta.db_table, UserFeed._meta.db_table):
+        schema_editor.execute(
+            f"UPDATE {table} SET change_seq = numbered.change_seq "
+            f"FROM (SELECT id, nextval('feed_change_seq') AS change_seq FROM {table} ORDER BY id) numbered "
+            f"WHERE {table}.id = numbered.id"
+        )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("feed", "0023_change_seq"),
+    ]
+
+    operations = [
+        migrations.RunPython(populate_change_seq, migrations.RunPython.noop),
+    ]
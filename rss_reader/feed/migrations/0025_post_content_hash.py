@@ -0,0 +1,22 @@
+# Generated by Django 4.2.6 on 2026-10-18 21:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("feed", "0024_populate_change_seq"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="post",
+            name="content_hash",
+            field=models.CharField(
+                blank=True,
+                editable=False,
+                help_text="Hash of the title and description, see `content_hash`",
+                max_length=64,
+            ),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.6 on 2026-10-18 21:03
+
+from django.db import migrations
+
+
+def populate_content_hash(apps, schema_editor):
+    Post = apps.get_model("feed", "Post")
+
+    # Same hash as `rss_reader.feed.utils.content_hash`.
+    schema_editor.execute(
+        f"UPDATE {Post._meta.db_table} SET content_hash = encode("
+        "sha256(convert_to(title, 'UTF8') || '\\x00'::bytea || convert_to(description, 'UTF8')), 'hex')"
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("feed", "0025_post_content_hash"),
+    ]
+
+    operations = [
+        migrations.RunPython(populate_content_hash, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 4.2.6 on 2026-10-18 21:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("feed", "0026_populate_post_content_hash"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="post",
+            name="content_hash",
+            field=models.CharField(
+                blank=True, editable=False, help_text="Hash of the fetched fields, see `content_hash`", max_length=64
+            ),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 4.2.6 on 2026-10-18 21:41
+
+from django.db import migrations
+
+
+def populate_content_hash(apps, schema_editor):
+    Post = apps.get_model("feed", "Post")
+
+    # Same hash as `rss_reader.feed.utils.content_hash`, which now covers the link and published time too.
+    schema_editor.execute(
+        f"UPDATE {Post._meta.db_table} SET content_hash = encode(sha256("
+        "convert_to(title, 'UTF8') || '\\x00'::bytea || convert_to(description, 'UTF8') || '\\x00'::bytea "
+        "|| convert_to(link, 'UTF8') || '\\x00'::bytea "
+        "|| convert_to(coalesce(trunc(extract(epoch FROM published_time))::bigint::text, ''), 'UTF8')), 'hex')"
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("feed", "0027_alter_post_content_hash"),
+    ]
+
+    operations = [
+        migrations.RunPython(populate_content_hash, migrations.RunPython.noop),
+    ]
@@ -1,9 +1,104 @@
 from django.conf import settings
-from django.db import models
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector, SearchVectorField
+from django.db import connection, models
+from django.db.models.functions import Cast, Coalesce, Greatest
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 from model_utils.models import TimeStampedModel
 from rest_framework.exceptions import ValidationError
 
+from rss_reader.feed.caching import invalidate_responses
+from rss_reader.feed.realtime import publish, user_channel
+from rss_reader.feed.utils import normalize_feed_url
+
+
+class NextChangeSeq(models.Func):
+    """
+    Next value of the change sequence, a monotonic counter stamped on the rows read by the delta sync
+    whenever they change.
+    """
+
+    template = "feed_next_change_seq()"
+    output_field = models.BigIntegerField()
+
+
+def next_change_seq():
+    """
+    Takes the next value of the change sequence, for the rows created one by one.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT feed_next_change_seq()")
+        return cursor.fetchone()[0]
+
+
+# First key of the advisory locks taken by `feed_next_change_seq`, "FEED" in ASCII.
+CHANGE_SEQ_LOCK_KEY = 1178944836
+
+
+def current_change_seq():
+    """
+    Highest value of the change sequence below which every change is committed, 0 if none was taken yet.
+
+    Values are taken in order but committed in any order, so the last value taken isn't enough: a
+    transaction still in flight may have taken a lower one. Every transaction taking values holds a
+    shared advisory lock on a value lower than its first one until it ends (see `feed_next_change_seq`),
+    the lowest lock held by the other transactions bounds the changes that may still show up.
+    """
+    with connection.cursor() as cursor:
+        # The sequence is read before the locks: a value it includes was announced before being taken.
+        cursor.execute("SELECT CASE WHEN is_called THEN last_value ELSE 0 END FROM feed_change_seq")
+        last_value = cursor.fetchone()[0]
+        # Only the locks in the range of keys of the function count, other advisory locks are left alone.
+        cursor.execute(
+            """
+            SELECT min(((classid::bigint - %(first_key)s) << 31) | objid::bigint)
+            FROM pg_locks
+            WHERE locktype = 'advisory'
+                AND objsubid = 2
+                AND classid::bigint BETWEEN %(first_key)s AND %(first_key)s + 65535
+                AND pid <> pg_backend_pid()
+                AND database = (SELECT oid FROM pg_database WHERE datname = current_database())
+            """,
+            {"first_key": CHANGE_SEQ_LOCK_KEY},
+        )
+        low_water = cursor.fetchone()[0]
+    return last_value if low_water is None else min(last_value, low_water)
+
+
+class FeedQuerySet(models.QuerySet):
+    def visible_to(self, user):
+        """
+        Feeds created or followed by the given user.
+        """
+        return self.filter(
+            models.Q(creator=user) | models.Exists(UserFeed.objects.filter(user=user, feed=models.OuterRef("pk")))
+        )
+
+    def subscribe(self, user, xml_url):
+        """
+        Subscribe a user to the feed of the given URL, the feed is only created if no other
+        user has added the same (normalized) URL before.
+
+        Parameters:
+            user (User): The subscribing user, becomes the creator if the feed is new.
+            xml_url (str): The feed URL.
+
+        Returns:
+            (Feed, bool): The feed and whether it has been created.
+        """
+        feed, created = self.get_or_create(
+            normalized_url=normalize_feed_url(xml_url), defaults={"creator": user, "xml_url": xml_url}
+        )
+        user_feed, subscribed = UserFeed.objects.get_or_create(user=user, feed=feed)
+        if subscribed:
+            Unsubscription.objects.filter(user=user, feed=feed).delete()
+            user_feed.refresh_counters()
+            TimelineEntry.objects.backfill(user_feed)
+            publish(user_channel(user.pk), {"type": "follow", "feed": feed.pk})
+            invalidate_responses([user.pk])
+        return feed, created
+
 
 class Feed(TimeStampedModel):
     creator = models.ForeignKey(
@@ -12,21 +107,50 @@ class Feed(TimeStampedModel):
     title = models.CharField(max_length=255)
     description = models.TextField()
     xml_url = models.URLField()
+    normalized_url = models.CharField(
+        max_length=255, unique=True, editable=False, help_text="Normalized xml_url, feeds are shared by this key"
+    )
     auto_refresh = models.BooleanField(default=True)
     last_refresh_at = models.DateTimeField(auto_now_add=True)
+    next_refresh_at = models.DateTimeField(
+        default=timezone.now, db_index=True, help_text="When the feed is due for its next automatic refresh"
+    )
+    etag = models.CharField(max_length=255, blank=True, help_text="ETag header of the last fetched response")
+    last_modified = models.CharField(
+        max_length=255, blank=True, help_text="Last-Modified header of the last fetched response"
+    )
+
+    objects = FeedQuerySet.as_manager()
+
+    def save(self, *args, **kwargs):
+        self.normalized_url = normalize_feed_url(self.xml_url)
+        super().save(*args, **kwargs)
 
     def deactivate_auto_refresh(self):
         self.auto_refresh = False
         self.save(update_fields=["auto_refresh"])
+        self.invalidate_responses()
 
     def activate_auto_refresh(self):
         self.auto_refresh = True
         self.save(update_fields=["auto_refresh"])
+        self.invalidate_responses()
+
+    def invalidate_responses(self):
+        """
+        Invalidates the cached API responses of the users who see the feed, its creator and followers.
+        """
+        invalidate_responses([self.creator_id, *self.followers.values_list("user_id", flat=True)])
 
     def follow(self, user):
         obj, created = UserFeed.objects.get_or_create(user=user, feed=self)
         if not created:
             raise ValidationError({"non_field_errors": _("You've already followed this feed.")})
+        Unsubscription.objects.filter(user=user, feed=self).delete()
+        obj.refresh_counters()
+        TimelineEntry.objects.backfill(obj)
+        publish(user_channel(user.pk), {"type": "follow", "feed": self.pk})
+        invalidate_responses([user.pk])
         return obj
 
     def unfollow(self, user):
@@ -34,6 +158,28 @@ class Feed(TimeStampedModel):
         if not user_feed:
             raise ValidationError({"non_field_errors": _("You're not following this feed.")})
         user_feed.delete()
+        Unsubscription.objects.create(user=user, feed=self, change_seq=NextChangeSeq())
+        publish(user_channel(user.pk), {"type": "unfollow", "feed": self.pk})
+        invalidate_responses([user.pk])
+
+    def mark_all_read(self, user, older_than=None):
+        """
+        Marks the posts of the feed as read for a given user.
+
+        Args:
+            user (User): The user for whom the posts will be marked as read.
+            older_than (datetime): Only mark the posts published before it, all of them if not given.
+
+        Raises:
+            ValidationError: If the user isn't following the feed.
+
+        Returns:
+            None
+        """
+        user_feed = UserFeed.objects.filter(user=user, feed=self).last()
+        if user_feed is None:
+            raise ValidationError({"non_field_errors": _("You're not following this feed.")})
+        user_feed.mark_all_read(older_than)
 
     class Meta:
         db_table = "feed"
@@ -44,6 +190,50 @@ class Feed(TimeStampedModel):
         return f"{self.pk}: {self.title}"
 
 
+class PostQuerySet(models.QuerySet):
+    @staticmethod
+    def _read_condition(user):
+        """
+        A post is read by a user if the user's subscription to its feed has the post marked as read,
+        or has it below the read watermark and not marked as unread,
+
+        It's a single EXISTS correlated on the user's subscription, served by the (user, feed) and
+        (user_feed, post) unique indexes whatever the size of the read state of other users.
+        """
+        read_marks = ReadMark.objects.filter(
+            user_feed=models.OuterRef("pk"), post=models.OuterRef(models.OuterRef("pk"))
+        )
+        user_feeds = UserFeed.objects.filter(user=user, feed=models.OuterRef("feed")).filter(
+            models.Exists(read_marks.filter(is_read=True))
+            | (models.Q(read_up_to__gte=models.OuterRef("pk")) & ~models.Exists(read_marks.filter(is_read=False)))
+        )
+        return models.Exists(user_feeds)
+
+    def read_by(self, user):
+        return self.filter(self._read_condition(user))
+
+    def unread_by(self, user):
+        return self.exclude(self._read_condition(user))
+
+    def update_search_vector(self):
+        """
+        Recomputes the stored search vector of the posts in a single UPDATE, titles weigh more than descriptions.
+        """
+        return self.update(
+            search_vector=SearchVector("title", weight="A", config=settings.POST_SEARCH_CONFIG)
+            + SearchVector("description", weight="B", config=settings.POST_SEARCH_CONFIG)
+        )
+
+    def search(self, query):
+        """
+        Posts matching a web search style query (`"exact phrase"`, `or`, `-excluded`), annotated with their `rank`.
+        """
+        search_query = SearchQuery(query, search_type="websearch", config=settings.POST_SEARCH_CONFIG)
+        # ts_rank returns a `real`, cast so the rank round-trips exactly through the pagination cursor.
+        rank = Cast(SearchRank(models.F("search_vector"), search_query), models.FloatField())
+        return self.filter(search_vector=search_query).annotate(rank=rank)
+
+
 class Post(TimeStampedModel):
     feed = models.ForeignKey(Feed, on_delete=models.CASCADE, related_name="posts")
     title = models.CharField(max_length=255)
@@ -51,12 +241,35 @@ class Post(TimeStampedModel):
     link = models.URLField()
     published_time = models.DateTimeField(null=True, blank=True)
     last_update = models.DateTimeField(null=True, blank=True)
+    change_seq = models.BigIntegerField(
+        default=next_change_seq, db_index=True, help_text="Change sequence of the last update"
+    )
+    search_vector = SearchVectorField(null=True, editable=False, help_text="Maintained when the post is fetched")
+    content_hash = models.CharField(
+        max_length=64, blank=True, editable=False, help_text="Hash of the fetched fields, see `content_hash`"
+    )
+
+    objects = PostQuerySet.as_manager()
 
     class Meta:
         db_table = "post"
         verbose_name = "Post"
         verbose_name_plural = "Posts"
         ordering = ["-last_update"]
+        constraints = [models.UniqueConstraint(fields=["feed", "link"], name="unique_feed_post_link")]
+        indexes = [
+            # Keyset pagination of posts, see `PostPagination`.
+            models.Index(
+                models.F("last_update").desc(nulls_last=True), models.F("id").desc(), name="post_last_update_id_idx"
+            ),
+            models.Index(
+                "feed",
+                models.F("last_update").desc(nulls_last=True),
+                models.F("id").desc(),
+                name="post_feed_last_update_id_idx",
+            ),
+            GinIndex(fields=["search_vector"], name="post_search_vector_idx"),
+        ]
 
     def __str__(self):
         return f"{self.pk}: {self.title}"
@@ -69,18 +282,18 @@ class Post(TimeStampedModel):
             user (User): The user for whom the feed post should be marked as read.
 
         Raises:
-            ValidationError: If the feed post has already been marked as read by the user.
+            ValidationError: If the feed post has already been marked as read by the user,
+                or the user isn't following its feed.
 
         Returns:
             None
         """
         user_feed = UserFeed.objects.filter(user=user, feed=self.feed).last()
-        if self in user_feed.read_posts.all():
+        if user_feed is None:
+            raise ValidationError({"non_field_errors": _("You're not following this feed.")})
+        if not user_feed.set_read(self, True):
             raise ValidationError({"non_field_errors": _("You've already marked this feed post as read.")})
 
-        user_feed.read_posts.add(self)
-        user_feed.save()
-
     def mark_as_unread(self, user):
         """
         Marks a feed post as unread for a given user.
@@ -89,16 +302,17 @@ class Post(TimeStampedModel):
             user (User): The user for whom the feed post should be marked as unread.
 
         Raises:
-            ValidationError: If the feed post has already been marked as unread.
+            ValidationError: If the feed post has already been marked as unread,
+                or the user isn't following its feed.
 
         Returns:
             None
         """
         user_feed = UserFeed.objects.filter(user=user, feed=self.feed).last()
-        if self not in user_feed.read_posts.all():
+        if user_feed is None:
+            raise ValidationError({"non_field_errors": _("You're not following this feed.")})
+        if not user_feed.set_read(self, False):
             raise ValidationError({"non_field_errors": _("You've already marked this feed post as unread.")})
-        user_feed.read_posts.remove(self)
-        user_feed.save()
 
     def mark_all_read(self, user):
         """
@@ -107,11 +321,16 @@ class Post(TimeStampedModel):
         Args:
             user (User): The user for whom the posts will be marked as read.
 
+        Raises:
+            ValidationError: If the user isn't following the feed.
+
         Returns:
             None
         """
         user_feed = UserFeed.objects.filter(user=user, feed=self.feed).last()
-        user_feed.read_posts.add(*[post for post in self.feed.posts.all()])
+        if user_feed is None:
+            raise ValidationError({"non_field_errors": _("You're not following this feed.")})
+        user_feed.mark_all_read()
 
     def mark_all_unread(self, user):
         """
@@ -120,11 +339,16 @@ class Post(TimeStampedModel):
         Args:
             user (User): The user for whom to mark the posts as unread.
 
+        Raises:
+            ValidationError: If the user isn't following the feed.
+
         Returns:
             None
         """
         user_feed = UserFeed.objects.filter(user=user, feed=self.feed).last()
-        user_feed.read_posts.clear()
+        if user_feed is None:
+            raise ValidationError({"non_field_errors": _("You're not following this feed.")})
+        user_feed.mark_all_unread()
 
 
 class UserFeed(TimeStampedModel):
@@ -140,6 +364,252 @@ class UserFeed(TimeStampedModel):
         related_name="followers",
         help_text="The feed that is followed/un-followed by users",
     )
-    read_posts = models.ManyToManyField(
-        Post, blank=True, related_name="read_posts", help_text="Posts that read by the user"
+    read_up_to = models.BigIntegerField(
+        default=0, help_text="Posts of the feed up to this id are read, unless they're marked as unread"
+    )
+    unread_count = models.PositiveIntegerField(default=0, help_text="Number of posts of the feed not read by the user")
+    total_count = models.PositiveIntegerField(default=0, help_text="Number of posts of the feed")
+    change_seq = models.BigIntegerField(
+        default=next_change_seq, help_text="Change sequence of the last read state or counters update"
     )
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=["user", "feed"], name="unique_user_feed")]
+
+    def is_read(self, post):
+        """
+        Whether the given post of the feed is read by the user.
+        """
+        mark = self.read_marks.filter(post=post).first()
+        if mark is not None:
+            return mark.is_read
+        return post.id <= self.read_up_to
+
+    def get_read_posts(self):
+        """
+        Returns a queryset of the feed posts that are read by the user.
+        """
+        return self.feed.posts.read_by(self.user_id)
+
+    def set_read(self, post, is_read):
+        """
+        Changes the read status of a post of the feed for the user.
+
+        Only posts whose status differs from the read watermark get a ReadMark, and the watermark
+        is moved forward whenever the posts right after it become read, so the marks stay few.
+
+        Parameters:
+            post (Post): A post of the feed.
+            is_read (bool): The new read status.
+
+        Returns:
+            changed (bool): False if the post already had this read status.
+        """
+        if self.is_read(post) == is_read:
+            return False
+        if is_read == (post.id <= self.read_up_to):
+            self.read_marks.filter(post=post).delete()
+        else:
+            ReadMark.objects.update_or_create(user_feed=self, post=post, defaults={"is_read": is_read})
+        if is_read and post.id > self.read_up_to:
+            self._advance_read_watermark()
+        self._add_to_unread_count(-1 if is_read else 1)
+        return True
+
+    def _add_to_unread_count(self, delta):
+        UserFeed.objects.filter(pk=self.pk).update(
+            unread_count=Greatest(models.F("unread_count") + delta, 0), change_seq=NextChangeSeq()
+        )
+        self.unread_count = max(self.unread_count + delta, 0)
+        self._notify_read_state_change(delta)
+
+    def _notify_read_state_change(self, delta):
+        """
+        Notifies the user's clients of a read state change, pushing the unread count delta and invalidating
+        the cached API responses.
+        """
+        invalidate_responses([self.user_id])
+        if delta:
+            publish(
+                user_channel(self.user_id),
+                {"type": "unread", "feed": self.feed_id, "delta": delta, "unread_count": self.unread_count},
+            )
+
+    def refresh_counters(self):
+        """
+        Recounts the unread and total posts of the subscription from the posts and the read state.
+        """
+        self.total_count = self.feed.posts.count()
+        self.unread_count = self.total_count - self.get_read_posts().count()
+        UserFeed.objects.filter(pk=self.pk).update(
+            unread_count=self.unread_count, total_count=self.total_count, change_seq=NextChangeSeq()
+        )
+
+    def mark_all_read(self, older_than=None):
+        """
+        Marks the posts of the feed as read, inside the database without loading them.
+
+        Without a cutoff the watermark simply moves to the last post. With a cutoff the older posts
+        after the watermark get read marks in one `INSERT ... SELECT`, which are then folded into the
+        watermark as far as possible.
+
+        Args:
+            older_than (datetime): Only mark the posts published (or fetched, if the publish time
+                is unknown) before it, all of them if not given.
+
+        Returns:
+            None
+        """
+        previous_unread_count = self.unread_count
+        if older_than is None:
+            last_post = Post.objects.filter(feed=models.OuterRef("feed")).order_by("-id").values("id")[:1]
+            UserFeed.objects.filter(pk=self.pk).update(
+                read_up_to=Coalesce(models.Subquery(last_post), 0), unread_count=0, change_seq=NextChangeSeq()
+            )
+            self.refresh_from_db(fields=["read_up_to", "unread_count"])
+            self.read_marks.all().delete()
+            self._notify_read_state_change(self.unread_count - previous_unread_count)
+            return
+
+        older_posts = self.feed.posts.filter(
+            models.Q(published_time__lte=older_than) | models.Q(published_time=None, created__lte=older_than)
+        )
+        self.read_marks.filter(is_read=False, post__in=older_posts).delete()
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {ReadMark._meta.db_table} (user_feed_id, post_id, is_read) "
+                f"SELECT %s, id, true FROM {Post._meta.db_table} "
+                "WHERE feed_id = %s AND id > %s AND COALESCE(published_time, created) <= %s "
+                "ON CONFLICT (user_feed_id, post_id) DO NOTHING",
+                [self.pk, self.feed_id, self.read_up_to, older_than],
+            )
+        self._advance_read_watermark()
+        self.refresh_counters()
+        self._notify_read_state_change(self.unread_count - previous_unread_count)
+
+    def mark_all_unread(self):
+        """
+        Marks all posts of the feed as unread.
+        """
+        previous_unread_count = self.unread_count
+        UserFeed.objects.filter(pk=self.pk).update(
+            read_up_to=0, unread_count=models.F("total_count"), change_seq=NextChangeSeq()
+        )
+        self.refresh_from_db(fields=["read_up_to", "unread_count"])
+        self.read_marks.all().delete()
+        self._notify_read_state_change(self.unread_count - previous_unread_count)
+
+    def _advance_read_watermark(self):
+        next_unread_id = (
+            self.feed.posts.filter(id__gt=self.read_up_to)
+            .exclude(id__in=self.read_marks.filter(is_read=True).values("post_id"))
+            .order_by("id")
+            .values_list("id", flat=True)
+            .first()
+        )
+        if next_unread_id is None:
+            read_up_to = self.feed.posts.aggregate(last_id=models.Max("id"))["last_id"] or 0
+        else:
+            read_up_to = next_unread_id - 1
+        if read_up_to > self.read_up_to:
+            self.read_up_to = read_up_to
+            self.save(update_fields=["read_up_to"])
+            self.read_marks.filter(post_id__lte=read_up_to, is_read=True).delete()
+
+
+class ReadMark(models.Model):
+    """
+    Read status of a post that differs from the read watermark of the subscription:
+    a read post after the watermark or an unread post before it.
+    """
+
+    user_feed = models.ForeignKey(UserFeed, on_delete=models.CASCADE, related_name="read_marks")
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name="read_marks")
+    is_read = models.BooleanField()
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=["user_feed", "post"], name="unique_user_feed_read_mark")]
+
+
+class Unsubscription(models.Model):
+    """
+    Tombstone of a subscription, so the delta sync can tell clients to drop the feed.
+    It's removed when the user follows the feed again.
+    """
+
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="unsubscriptions")
+    feed = models.ForeignKey(Feed, on_delete=models.DO_NOTHING, db_constraint=False, related_name="+")
+    change_seq = models.BigIntegerField()
+
+    class Meta:
+        indexes = [models.Index(fields=["user", "change_seq"], name="unsubscription_user_seq_idx")]
+
+
+class TimelineEntryQuerySet(models.QuerySet):
+    def _insert(self, where, params):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {TimelineEntry._meta.db_table} (user_id, user_feed_id, post_id, sort_time) "
+                "SELECT user_feed.user_id, user_feed.id, post.id, COALESCE(post.published_time, post.created) "
+                f"FROM {Post._meta.db_table} post "
+                f"JOIN {UserFeed._meta.db_table} user_feed ON user_feed.feed_id = post.feed_id "
+                f"WHERE {where} "
+                "ON CONFLICT (user_feed_id, post_id) DO NOTHING",
+                params,
+            )
+
+    def fan_out(self, feed, links):
+        """
+        Adds the posts of the feed with the given links to the timeline of every follower of the feed,
+        in a single `INSERT ... SELECT`.
+        """
+        if links:
+            self._insert("post.feed_id = %s AND post.link = ANY(%s)", [feed.pk, list(links)])
+
+    def backfill(self, user_feed):
+        """
+        Adds the existing posts of the feed to the timeline of a new follower.
+        """
+        self._insert("user_feed.id = %s", [user_feed.pk])
+
+    @staticmethod
+    def _read_condition():
+        """
+        An entry is read if its post is read by the subscriber, see `PostQuerySet._read_condition`.
+        """
+        read_marks = ReadMark.objects.filter(user_feed=models.OuterRef("user_feed"), post=models.OuterRef("post"))
+        return models.Exists(read_marks.filter(is_read=True)) | (
+            models.Q(user_feed__read_up_to__gte=models.F("post_id")) & ~models.Exists(read_marks.filter(is_read=False))
+        )
+
+    def read(self):
+        return self.filter(self._read_condition())
+
+    def unread(self):
+        return self.exclude(self._read_condition())
+
+
+class TimelineEntry(models.Model):
+    """
+    A post of a followed feed in the timeline of the user.
+
+    The timeline is written when posts are fetched (fan-out on write) rather than merged from all the
+    followed feeds on every read, so a page of it is a single index range scan on (user, sort_time).
+    Entries are removed along with the subscription.
+    """
+
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="timeline_entries")
+    user_feed = models.ForeignKey(UserFeed, on_delete=models.CASCADE, related_name="timeline_entries")
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name="timeline_entries")
+    sort_time = models.DateTimeField(help_text="Publish time of the post, or its fetch time if unknown")
+
+    objects = TimelineEntryQuerySet.as_manager()
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=["user_feed", "post"], name="unique_timeline_entry")]
+        indexes = [
+            # Keyset pagination of the timeline, see `TimelinePagination`.
+            models.Index(
+                "user", models.F("sort_time").desc(), models.F("post_id").desc(), name="timeline_user_sort_idx"
+            ),
+        ]
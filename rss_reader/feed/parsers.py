@@ -0,0 +1,277 @@
+import logging
+import xml.etree.ElementTree as ET
+
+import feedparser
+
+# Private helpers of feedparser, so streamed posts are sanitized exactly like parsed ones. feedparser is pinned,
+# and `test_same_posts_as_feedparser` compares both parsers on every upgrade.
+from feedparser.mixin import _FeedParserMixin
+from feedparser.sanitizer import _sanitize_html
+from feedparser.urls import make_safe_absolute_uri, resolve_relative_uris
+
+from rss_reader.feed.dates import DateParser
+from rss_reader.feed.exceptions import FeedException
+from rss_reader.feed.utils import content_hash
+
+logger = logging.getLogger(__name__)
+
+RSS1 = "{http://purl.org/rss/1.0/}"
+RDF = "{http://www.w3.org/1999/02/22-rdf-syntax-ns#}"
+ATOM = "{http://www.w3.org/2005/Atom}"
+DC = "{http://purl.org/dc/elements/1.1/}"
+CONTENT = "{http://purl.org/rss/1.0/modules/content/}"
+XHTML = "{http://www.w3.org/1999/xhtml}"
+XML_BASE = "{http://www.w3.org/XML/1998/namespace}base"
+
+ROOT_TAGS = {"rss", f"{RDF}RDF", f"{ATOM}feed"}
+CHANNEL_TAGS = {"channel", f"{RSS1}channel", f"{ATOM}feed"}
+ENTRY_TAGS = {"item", f"{RSS1}item", f"{ATOM}entry"}
+
+# Elements read from the channel and the entries, named like the keys of feedparser's output.
+FEED_FIELDS = {
+    "title": "title",
+    f"{RSS1}title": "title",
+    f"{ATOM}title": "title",
+    "link": "link",
+    f"{RSS1}link": "link",
+    f"{ATOM}link": "link",
+    "description": "subtitle",
+    f"{RSS1}description": "subtitle",
+    f"{ATOM}subtitle": "subtitle",
+}
+ENTRY_FIELDS = {
+    "title": "title",
+    f"{RSS1}title": "title",
+    f"{ATOM}title": "title",
+    "link": "link",
+    f"{RSS1}link": "link",
+    f"{ATOM}link": "link",
+    "guid": "id",
+    f"{ATOM}id": "id",
+    "description": "summary",
+    f"{RSS1}description": "summary",
+    f"{ATOM}summary": "summary",
+    f"{CONTENT}encoded": "content",
+    f"{ATOM}content": "content",
+    "pubDate": "published",
+    f"{DC}date": "updated",
+    f"{ATOM}published": "published",
+    f"{ATOM}updated": "updated",
+}
+# Fields that may hold markup, their relative URIs are resolved and they're sanitized like feedparser does.
+MARKUP_FIELDS = {"title", "subtitle", "summary", "content"}
+HTML_TYPES = {"text/html", "application/xhtml+xml"}
+
+
+class StreamingFeedParser:
+    """
+    Incremental parser of RSS 2.0, RSS 1.0 and Atom documents, fed chunk by chunk as they are downloaded.
+
+    The entries are returned as soon as they are complete, as dicts with the keys of feedparser's entries
+    that `FeedService` reads, and dropped from the tree right away: the memory used is bounded by the
+    largest entry rather than by the document, and the caller can stop reading anytime.
+
+    The values are the ones feedparser gives: links are made absolute, and markup goes through
+    feedparser's sanitizer, so both parsers store the same posts.
+    Malformed documents raise a `FeedException`, like the ones feedparser flags as malformed.
+
+    Usage:
+        parser = StreamingFeedParser(response.headers.get("content-location", ""))
+        for chunk in chunks:
+            for entry in parser.feed(chunk):
+                ...
+        entries = parser.close()
+        parser.feed_fields
+    """
+
+    def __init__(self, content_location=""):
+        self._parser = ET.XMLPullParser(events=("start", "end"))
+        self._stack = []
+        # Base URI of the elements of the stack, feedparser's default is the Content-Location header.
+        self._bases = [make_safe_absolute_uri(content_location)]
+        self.feed_fields = {}
+
+    def feed(self, data):
+        """
+        Parameters:
+            data (bytes): Next chunk of the document
+
+        Returns:
+            entries (list): Entries completed by the chunk
+        """
+        try:
+            self._parser.feed(data)
+            return self._read_events()
+        except ET.ParseError as exc:
+            raise FeedException(details=f"Found Malformed feed: {exc}")
+
+    def close(self):
+        """
+        Returns:
+            entries (list): Entries completed by the end of the document
+        """
+        try:
+            self._parser.close()
+            return self._read_events()
+        except ET.ParseError as exc:
+            raise FeedException(details=f"Found Malformed feed: {exc}")
+
+    def _read_events(self):
+        entries = []
+        for event, element in self._parser.read_events():
+            if event == "start":
+                if not self._stack and element.tag not in ROOT_TAGS:
+                    raise FeedException(details=f'Unsupported feed format "{element.tag}"')
+                self._stack.append(element)
+                base = self._bases[-1]
+                if element.get(XML_BASE) is not None:
+                    # Kept resolved on the element for its fields, read once the entry is complete.
+                    base = make_safe_absolute_uri(base, element.get(XML_BASE))
+                    element.set(XML_BASE, base)
+                self._bases.append(base)
+                continue
+
+            self._stack.pop()
+            base = self._bases.pop()
+            parent = self._stack[-1] if self._stack else None
+            if element.tag in ENTRY_TAGS:
+                entries.append(self._read_entry(element, base))
+            elif parent is None or parent.tag not in CHANNEL_TAGS:
+                # Part of an element that isn't complete yet.
+                continue
+            elif element.tag in FEED_FIELDS:
+                self._read_field(self.feed_fields, FEED_FIELDS[element.tag], element, base)
+            # Nothing is kept once read, so the tree never holds more than the element being parsed.
+            parent.remove(element)
+        return entries
+
+    def _read_entry(self, element, base):
+        entry = {}
+        for child in element:
+            if child.tag in ENTRY_FIELDS:
+                self._read_field(entry, ENTRY_FIELDS[child.tag], child, child.get(XML_BASE, base))
+        # Same fallbacks as feedparser: permalink guids are links, full contents stand for missing summaries.
+        guid = element.find("guid")
+        if "link" not in entry and guid is not None and guid.get("isPermaLink", "true") == "true":
+            entry["link"] = make_safe_absolute_uri(guid.get(XML_BASE, base), entry["id"])
+        if "summary" not in entry and "content" in entry:
+            entry["summary"] = entry["content"]
+        return entry
+
+    def _read_field(self, fields, key, element, base):
+        if key in fields:
+            return
+        if key == "link" and element.get("href") is not None:
+            # Atom links, only the alternate one is the link of the page.
+            if element.get("rel", "alternate") == "alternate":
+                fields[key] = make_safe_absolute_uri(base, element.get("href").strip())
+            return
+        text = self._inner_markup(element).strip()
+        if key == "link":
+            text = make_safe_absolute_uri(base, text)
+        elif key in MARKUP_FIELDS:
+            text = self._sanitize(element, text, base)
+        fields[key] = text
+
+    @staticmethod
+    def _inner_markup(element):
+        """
+        Text and inline XHTML of the element, serialized without namespace prefixes and without the
+        enclosing `<div>` of Atom XHTML contents, like feedparser.
+        """
+        children = list(element)
+        if (
+            element.get("type") == "xhtml"
+            and len(children) == 1
+            and children[0].tag in (f"{XHTML}div", f"{ATOM}div")
+            and not (element.text or "").strip()
+        ):
+            element, children = children[0], list(children[0])
+        for descendant in (descendant for child in children for descendant in child.iter()):
+            # feedparser also reads markup left in the default Atom namespace as XHTML.
+            for namespace in (XHTML, ATOM):
+                if descendant.tag.startswith(namespace):
+                    descendant.tag = descendant.tag[len(namespace) :]
+        return (element.text or "") + "".join(ET.tostring(child, encoding="unicode") for child in children)
+
+    @staticmethod
+    def _sanitize(element, text, base):
+        if element.tag.startswith(ATOM):
+            content_type = _FeedParserMixin.map_content_type(element.get("type", "text"))
+        elif element.tag in ("title", f"{RSS1}title"):
+            # Plain text, unless it looks like HTML.
+            content_type = "text/html" if _FeedParserMixin.looks_like_html(text) else "text/plain"
+        else:
+            content_type = "text/html"
+        if content_type not in HTML_TYPES:
+            return text
+        text = resolve_relative_uris(text, base, "utf-8", content_type)
+        return _sanitize_html(text, "utf-8", content_type)
+
+
+# The functions below don't touch the database, so `parse_document` can run in the parse processes of
+# `FeedRefreshPipeline`.
+
+
+def check_malformed(parsed_data):
+    if parsed_data.get("bozo_exception"):
+        msg = 'Found Malformed feed, "{}": {}'.format(parsed_data.get("href"), parsed_data.get("bozo_exception"))
+        logger.warning(msg)
+        raise FeedException(details=msg)
+
+
+def prepare_feed_fields(feed_dict):
+    fields = {
+        "title": feed_dict.get("title"),
+        "link": feed_dict.get("link"),
+        "description": feed_dict.get("subtitle"),
+    }
+    return fields
+
+
+def _published_time(post_entity, date_parser):
+    # Entries without a publish date, e.g. Atom entries with only <updated>, fall back to their update date.
+    return date_parser.parse(post_entity) or date_parser.parse(post_entity, "updated")
+
+
+def prepare_post_fields(post_entity, date_parser=None):
+    """
+    Prepare post fields based scraped post attrs.
+
+    Parameters:
+        post_entity (dict): Object from feedparser.FeedParserDict
+        date_parser (DateParser): Date parser of the feed of the post
+
+    Returns:
+        fields (dict): All needed fields to create an post object
+
+    """
+    fields = {
+        "title": post_entity.get("title"),
+        "description": post_entity.get("summary"),
+        "link": post_entity.get("link"),
+        "published_time": _published_time(post_entity, date_parser or DateParser()),
+    }
+    fields["content_hash"] = content_hash(**fields)
+    return fields
+
+
+def parse_document(xml_url, content, headers):
+    """
+    Parse a downloaded feed document Using feedparser, and prepare the fields of the feed and its posts.
+
+    Parameters:
+        xml_url (str): URL of the feed, for the error messages
+        content (bytes): Raw feed document
+        headers (dict): Response headers of the download
+
+    Returns:
+        (dict, list): Fields of the feed, fields of its posts
+    """
+    parsed_data = feedparser.parse(content, response_headers=headers)
+    parsed_data["href"] = xml_url
+    check_malformed(parsed_data)
+    date_parser = DateParser(xml_url)
+    return prepare_feed_fields(parsed_data.get("feed", {})), [
+        prepare_post_fields(entry, date_parser) for entry in parsed_data.get("entries", [])
+    ]
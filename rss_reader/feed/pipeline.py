@@ -0,0 +1,189 @@
+import asyncio
+import contextlib
+import logging
+import multiprocessing
+import os
+import queue
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass
+from http import HTTPStatus
+
+import httpx
+from django.conf import settings
+
+from rss_reader.feed.exceptions import FeedException
+from rss_reader.feed.fetchers import AsyncFeedFetcher
+from rss_reader.feed.parsers import parse_document
+from rss_reader.feed.services import FeedService
+
+logger = logging.getLogger(__name__)
+
+_parse_executor = None
+
+
+def _get_parse_executor():
+    """
+    Process pool of the parse stage, shared by all the pipelines run by the worker process.
+
+    Its processes are started from a fork server rather than forked from the worker, which is running the
+    fetch thread and holds database connections.
+    """
+    global _parse_executor
+    if _parse_executor is None:
+        _parse_executor = ProcessPoolExecutor(
+            max_workers=settings.FEED_PARSE_PROCESSES or os.cpu_count(),
+            mp_context=multiprocessing.get_context("forkserver"),
+        )
+    return _parse_executor
+
+
+def _reset_parse_executor():
+    global _parse_executor
+    if _parse_executor is not None:
+        _parse_executor.shutdown(wait=False, cancel_futures=True)
+        _parse_executor = None
+
+
+class PipelineStopped(Exception):
+    pass
+
+
+@dataclass
+class RefreshResult:
+    """
+    Outcome of refreshing a single feed.
+    `deferred` when the download waited too long for a connection or for the limits of its host.
+    """
+
+    feed_id: int
+    created: int = 0
+    error: Exception | None = None
+    deferred: bool = False
+
+
+class FeedRefreshPipeline:
+    """
+    Refresh a batch of feeds in three stages running at the same time, so the network and the CPUs are
+    both kept busy:
+
+    - fetch: downloads the documents in a background thread, `FEED_FETCH_CONCURRENCY` at a time
+    - parse: parses them with `parse_document` in a pool of `FEED_PARSE_PROCESSES` processes
+    - persist: bulk writes the feeds and their posts from the calling thread, one feed at a time
+
+    At most `FEED_PIPELINE_QUEUE_SIZE` documents are in between the fetch and persist stages, downloads
+    wait for room when parsing or persisting falls behind. Not modified and failed downloads skip the
+    parse stage.
+
+    Usage:
+        - Refresh a batch of feeds
+            `results = FeedRefreshPipeline().run(feeds)`
+    """
+
+    # Seconds given to the fetch stage to stop, its parse threads check `stopped` every second.
+    stop_timeout = 5
+
+    def __init__(self, fetcher=None, queue_size=None):
+        self.fetcher = fetcher or AsyncFeedFetcher()
+        self.queue_size = queue_size or settings.FEED_PIPELINE_QUEUE_SIZE
+
+    def run(self, feeds):
+        """
+        Refresh the given feeds. A feed failing to download, parse or save doesn't stop the others.
+
+        Parameters:
+            feeds (list): Feed instances
+
+        Returns:
+            results (list): RefreshResult per feed, in the order they were saved
+        """
+        feeds = {feed.id: feed for feed in feeds}
+        slots = threading.Semaphore(self.queue_size)
+        processed = queue.Queue()
+        stopped = threading.Event()
+        fetching = {}
+
+        def parse(fetch_result):
+            while not slots.acquire(timeout=1):
+                if stopped.is_set():
+                    raise PipelineStopped
+            if stopped.is_set():
+                raise PipelineStopped
+            status = fetch_result.status
+            if fetch_result.error or status == HTTPStatus.NOT_MODIFIED or status >= HTTPStatus.BAD_REQUEST:
+                processed.put((fetch_result, None))
+                return
+            feed = feeds[fetch_result.feed_id]
+            try:
+                parsing = _get_parse_executor().submit(
+                    parse_document, feed.xml_url, fetch_result.content, fetch_result.headers
+                )
+            except BrokenProcessPool as exc:
+                parsing = Future()
+                parsing.set_exception(exc)
+            parsing.add_done_callback(lambda parsing: processed.put((fetch_result, parsing)))
+
+        async def stream():
+            fetching["loop"], fetching["task"] = asyncio.get_running_loop(), asyncio.current_task()
+            if stopped.is_set():
+                return
+            await self.fetcher.stream(feeds.values(), lambda result: asyncio.to_thread(parse, result), stopped)
+
+        def fetch():
+            try:
+                asyncio.run(stream())
+            except (asyncio.CancelledError, PipelineStopped):
+                pass
+            except Exception as exc:
+                processed.put(exc)
+
+        fetch_thread = threading.Thread(target=fetch, name="feed-pipeline-fetch", daemon=True)
+        fetch_thread.start()
+        results = []
+        try:
+            while len(results) < len(feeds):
+                item = processed.get()
+                if isinstance(item, Exception):
+                    raise item
+                fetch_result, parsing = item
+                results.append(self._persist(feeds[fetch_result.feed_id], fetch_result, parsing))
+                slots.release()
+        finally:
+            # Stops the downloads in flight too when the persist stage gives up, e.g. on the soft time limit
+            # of the task, so nothing keeps running in the background once the task returned.
+            stopped.set()
+            if "task" in fetching:
+                with contextlib.suppress(RuntimeError):  # The event loop is already closed.
+                    fetching["loop"].call_soon_threadsafe(fetching["task"].cancel)
+            fetch_thread.join(timeout=self.stop_timeout)
+            if fetch_thread.is_alive():
+                logger.warning("The fetch stage of the pipeline didn't stop in time.")
+        return results
+
+    @staticmethod
+    def _persist(feed, fetch_result, parsing):
+        service = FeedService(feed)
+        if isinstance(fetch_result.error, httpx.PoolTimeout):
+            return RefreshResult(feed_id=feed.id, error=fetch_result.error, deferred=True)
+        try:
+            if fetch_result.error:
+                raise FeedException(details=str(fetch_result.error))
+            if parsing is None:
+                created = service.update_feed_from_response(fetch_result.status, b"", fetch_result.headers)
+            else:
+                feed_fields, posts_fields = parsing.result()
+                headers = fetch_result.headers
+                response = {"etag": headers.get("etag"), "modified": headers.get("last-modified"), "headers": headers}
+                created = service.save_prepared_data(feed_fields, posts_fields, response)
+        except FeedException as exc:
+            return RefreshResult(feed_id=feed.id, error=exc)
+        except BrokenProcessPool as exc:
+            logger.error(f"The parse processes died while parsing feed with id: {feed.id}")
+            _reset_parse_executor()
+            return RefreshResult(feed_id=feed.id, error=exc)
+        except Exception as exc:
+            # Any other error of a feed, e.g. a field the database rejects, doesn't stop the batch either.
+            logger.exception(f"Failed refreshing feed with id: {feed.id}")
+            return RefreshResult(feed_id=feed.id, error=exc)
+        return RefreshResult(feed_id=feed.id, created=created)
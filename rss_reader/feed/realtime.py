@@ -0,0 +1,137 @@
+import asyncio
+import json
+import logging
+from collections import defaultdict
+
+import redis
+from django.conf import settings
+from django.db import transaction
+from redis import asyncio as aioredis
+
+logger = logging.getLogger(__name__)
+
+
+def feed_channel(feed_id):
+    """
+    Channel of the posts fetched for a feed, shared by all of its followers.
+    """
+    return f"feed:{feed_id}"
+
+
+def user_channel(user_id):
+    """
+    Channel of the read state and subscription changes of a user.
+    """
+    return f"user:{user_id}"
+
+
+_client = None
+
+
+def _get_client():
+    global _client
+    if _client is None:
+        _client = redis.Redis.from_url(settings.REDIS_URL)
+    return _client
+
+
+def publish(channel, message):
+    """
+    Publish a message to the clients listening on a channel, once the current transaction is committed.
+
+    Delivery is best effort: clients reconcile with the API when they (re)connect, so a Redis failure is
+    logged and never fails the caller.
+
+    Parameters:
+        channel (str): `feed_channel` or `user_channel`
+        message (dict): JSON serializable payload, with a `type` key
+    """
+
+    def _publish():
+        try:
+            _get_client().publish(channel, json.dumps(message))
+        except redis.RedisError as exc:
+            logger.warning(f'Failed publishing to "{channel}": {exc}')
+
+    transaction.on_commit(_publish)
+
+
+class Broadcaster:
+    """
+    Multiplex a single Redis pub/sub connection over all the clients connected to the process.
+
+    Every client gets a bounded queue, and Redis is only subscribed once per channel whatever the number
+    of clients listening on it, so an idle client costs an entry in a few dicts. Messages for a client
+    whose queue is full are dropped rather than buffered.
+
+    Usage:
+        queue = broadcaster.queue()
+        await broadcaster.subscribe(queue, [feed_channel(1)])
+        channel, data = await queue.get()
+        await broadcaster.unsubscribe(queue)
+    """
+
+    def __init__(self, url=None, queue_size=None):
+        self.url = url or settings.REDIS_URL
+        self.queue_size = queue_size or settings.REALTIME_QUEUE_SIZE
+        self._queues = defaultdict(set)
+        self._channels = defaultdict(set)
+        self._pubsub = None
+        self._reader = None
+
+    def queue(self):
+        return asyncio.Queue(maxsize=self.queue_size)
+
+    async def subscribe(self, queue, channels):
+        new_channels = [channel for channel in channels if not self._queues[channel]]
+        for channel in channels:
+            self._queues[channel].add(queue)
+            self._channels[queue].add(channel)
+        if new_channels:
+            if self._pubsub is None:
+                self._pubsub = aioredis.Redis.from_url(self.url).pubsub(ignore_subscribe_messages=True)
+            await self._pubsub.subscribe(*new_channels)
+        # The reader stops once nothing is subscribed anymore.
+        if self._pubsub is not None and (self._reader is None or self._reader.done()):
+            self._reader = asyncio.create_task(self._read())
+
+    async def unsubscribe(self, queue, channels=None):
+        """
+        Stop delivering the given channels to the queue, all of its channels if not given.
+        """
+        channels = set(self._channels[queue]) if channels is None else self._channels[queue] & set(channels)
+        unused_channels = []
+        for channel in channels:
+            self._queues[channel].discard(queue)
+            self._channels[queue].discard(channel)
+            if not self._queues[channel]:
+                del self._queues[channel]
+                unused_channels.append(channel)
+        if not self._channels[queue]:
+            del self._channels[queue]
+        if unused_channels:
+            await self._pubsub.unsubscribe(*unused_channels)
+
+    async def _read(self):
+        while self._pubsub.subscribed:
+            try:
+                async for message in self._pubsub.listen():
+                    self._dispatch(message)
+            except redis.RedisError as exc:
+                # The connection subscribes again to the channels when it reconnects.
+                logger.warning(f"Lost the realtime Redis connection: {exc}")
+                await asyncio.sleep(1)
+
+    def _dispatch(self, message):
+        if message["type"] != "message":
+            return
+        channel = message["channel"].decode()
+        data = message["data"].decode()
+        for queue in self._queues.get(channel, ()):
+            try:
+                queue.put_nowait((channel, data))
+            except asyncio.QueueFull:
+                logger.warning(f'Dropped a message of "{channel}" for a slow client')
+
+
+broadcaster = Broadcaster()
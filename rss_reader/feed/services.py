@@ -1,12 +1,33 @@
 import logging
+import re
+from datetime import timedelta
+from datetime import timezone as dt_timezone
+from email.utils import parsedate_to_datetime
+from http import HTTPStatus
+from itertools import islice
 
 import feedparser
-from dateutil import parser
+import httpx
+from django.conf import settings
 from django.core.mail import send_mail
+from django.db import transaction
+from django.db.models import F, Q
 from django.utils import timezone
 
+from rss_reader.feed.dates import DateParser
 from rss_reader.feed.exceptions import FeedException
-from rss_reader.feed.models import Feed, Post
+from rss_reader.feed.http import conditional_headers, get_client, make_client
+from rss_reader.feed.models import (
+    Feed,
+    NextChangeSeq,
+    Post,
+    TimelineEntry,
+    Unsubscription,
+    UserFeed,
+    current_change_seq,
+)
+from rss_reader.feed.parsers import StreamingFeedParser, check_malformed, prepare_feed_fields, prepare_post_fields
+from rss_reader.feed.realtime import feed_channel, publish
 
 logger = logging.getLogger(__name__)
 
@@ -20,85 +41,409 @@ class FeedService:
             `feed_svc = FeedService(feed)`
         - Update feed and post
             `feed_svc.update_feed()`
+        - Update feed and post, streaming the document and stopping at the first known entries
+            `feed_svc.update_feed(streaming=True)`
         - Get raw parsed data
             `feed_svc.parse_rss_link()`
     """
 
-    def __init__(self, feed: Feed):
+    def __init__(self, feed: Feed, transport=None):
         self.feed = feed
+        # The shared client keeps the connections to the hosts alive between refreshes.
+        self.client = get_client() if transport is None else make_client(transport)
+        self.response_headers = {}
 
     def parse_rss_link(self):
         """
-        Parse RSS link Using feedparser
+        Download the RSS link and parse it Using feedparser
+
+        The validators stored from the previous fetch (ETag / Last-Modified) are sent along
+        so unchanged feeds answer with `304 Not Modified` instead of the whole document.
 
         - Returns:
-            parsed (dict): Parsed object for this RSS link
+            parsed (dict): Parsed object for this RSS link, or None if the feed has not been modified
         """
         link = self.feed.xml_url
-        parsed_data = feedparser.parse(link)
-        if parsed_data.get("bozo_exception"):
-            msg = 'Found Malformed feed, "{}": {}'.format(parsed_data.get("href"), parsed_data.get("bozo_exception"))
+        try:
+            response = self.client.get(link, headers=conditional_headers(self.feed))
+        except httpx.HTTPError as exc:
+            msg = f'Failed fetching feed "{link}": {exc}'
             logger.warning(msg)
             raise FeedException(details=msg)
-        return parsed_data
+        self.response_headers = dict(response.headers)
+        if response.status_code == HTTPStatus.NOT_MODIFIED:
+            return None
+        self._check_status(response.status_code)
+        return self.parse_content(response.content, self.response_headers)
+
+    def parse_rss_stream(self):
+        """
+        Download and parse the RSS link incrementally with `StreamingFeedParser`.
+
+        Feeds list their newest entries first, so reading stops after a run of `FEED_STREAM_KNOWN_RUN`
+        entries that are already stored unchanged, and the rest of the document is never downloaded.
+        Memory stays bounded whatever the size of the document.
 
-    def _prepare_feed_fields(self, feed_dict):
-        fields = {
-            "title": feed_dict.get("title"),
-            "link": feed_dict.get("link"),
-            "description": feed_dict.get("subtitle"),
+        - Returns:
+            parsed (dict): Parsed object with the same keys as feedparser's, but only the entries up to the
+                known ones, and their `posts_fields` already prepared, or None if the feed has not been modified
+        """
+        link = self.feed.xml_url
+        try:
+            with self.client.stream("GET", link, headers=conditional_headers(self.feed)) as response:
+                self.response_headers = dict(response.headers)
+                if response.status_code == HTTPStatus.NOT_MODIFIED:
+                    return None
+                if response.status_code >= HTTPStatus.BAD_REQUEST:
+                    raise FeedException(details=f'Failed fetching feed "{link}": HTTP {response.status_code}')
+                parser = StreamingFeedParser(response.headers.get("content-location", ""))
+                entries, posts_fields = [], []
+                for entry, fields in self._until_known_run(self._stream_entries(response, parser)):
+                    entries.append(entry)
+                    posts_fields.append(fields)
+        except httpx.HTTPError as exc:
+            msg = f'Failed fetching feed "{link}": {exc}'
+            logger.warning(msg)
+            raise FeedException(details=msg)
+        except FeedException as exc:
+            logger.warning(exc.details)
+            raise
+        return {
+            "href": link,
+            "feed": parser.feed_fields,
+            "entries": entries,
+            "posts_fields": posts_fields,
+            "headers": self.response_headers,
+            "etag": self.response_headers.get("etag"),
+            "modified": self.response_headers.get("last-modified"),
         }
-        return fields
 
-    def _prepare_post_fields(self, post_entity):
+    @staticmethod
+    def _stream_entries(response, parser):
+        for chunk in response.iter_bytes():
+            yield from parser.feed(chunk)
+        yield from parser.close()
+
+    def _until_known_run(self, entries):
         """
-        Prepare post fields based scraped post attrs.
+        Yield the entries, along with their fields from `prepare_post_fields`, until a run of
+        `FEED_STREAM_KNOWN_RUN` consecutive ones that are already stored with the same link and content hash.
+        Known links are looked up one run length of entries at a time.
+        """
+        run_length = settings.FEED_STREAM_KNOWN_RUN
+        date_parser = DateParser(self.feed.xml_url)
+        entries = iter(entries)
+        known_run = 0
+        while chunk := list(islice(entries, run_length)):
+            known = set(
+                self.feed.posts.filter(link__in=[entry.get("link") for entry in chunk]).values_list(
+                    "link", "content_hash"
+                )
+            )
+            for entry in chunk:
+                fields = self._prepare_post_fields(entry, date_parser)
+                yield entry, fields
+                if (fields["link"], fields["content_hash"]) in known:
+                    known_run += 1
+                else:
+                    known_run = 0
+                if known_run >= run_length:
+                    return
+
+    def parse_content(self, content, headers=None):
+        """
+        Parse an already downloaded feed document Using feedparser
 
         Parameters:
-            post_entity (dict): Object from feedparser.FeedParserDict
+            content (bytes): Raw feed document
+            headers (dict): Response headers of the download
 
         Returns:
-            fields (dict): All needed fields to create an post object
-
+            parsed (dict): Parsed object for this document
         """
-        fields = {
-            "title": post_entity.get("title"),
-            "description": post_entity.get("summary"),
-            "link": post_entity.get("link"),
-            "published_time": parser.parse(post_entity.get("published")),
-        }
-        return fields
+        headers = headers or {}
+        parsed_data = feedparser.parse(content, response_headers=headers)
+        parsed_data["href"] = self.feed.xml_url
+        parsed_data["etag"] = headers.get("etag")
+        parsed_data["modified"] = headers.get("last-modified")
+        self._check_malformed(parsed_data)
+        return parsed_data
 
-    def update_feed(self):
+    _check_malformed = staticmethod(check_malformed)
+
+    def _store_validators(self, parsed_data):
+        self.feed.etag = parsed_data.get("etag") or ""
+        self.feed.last_modified = parsed_data.get("modified") or ""
+
+    _prepare_feed_fields = staticmethod(prepare_feed_fields)
+    _prepare_post_fields = staticmethod(prepare_post_fields)
+
+    def update_feed(self, streaming=False):
         """
         Update the feed object and it's posts based on the scraped data.
         Will create new post if it does not exist or update the existing ones.
+        Nothing is parsed or written (except the refresh time) if the feed has not been modified.
+
+        Parameters:
+            streaming (bool): Parse the document incrementally with `parse_rss_stream`
+
+        Returns:
+            count (int): new created posts count.
+
+        """
+        parsed_data = self.parse_rss_stream() if streaming else self.parse_rss_link()
+        if parsed_data is None:
+            return self._mark_not_modified(self.response_headers)
+        return self.save_parsed_data(parsed_data)
+
+    def update_feed_from_response(self, status, content, headers):
+        """
+        Same as `update_feed` but for a feed document that has been downloaded elsewhere.
+
+        Parameters:
+            status (int): HTTP status of the download
+            content (bytes): Raw feed document
+            headers (dict): Response headers of the download
+
+        Returns:
+            count (int): new created posts count.
+        """
+        if status == HTTPStatus.NOT_MODIFIED:
+            return self._mark_not_modified(headers)
+        self._check_status(status)
+        return self.save_parsed_data(self.parse_content(content, headers))
+
+    def _check_status(self, status):
+        if status >= HTTPStatus.BAD_REQUEST:
+            msg = f'Failed fetching feed "{self.feed.xml_url}": HTTP {status}'
+            logger.warning(msg)
+            raise FeedException(details=msg)
+
+    def _mark_not_modified(self, headers):
+        self.feed.last_refresh_at = timezone.now()
+        self._schedule_next_refresh(headers)
+        self.feed.save(update_fields=["last_refresh_at", "next_refresh_at"])
+        return 0
+
+    def _schedule_next_refresh(self, headers):
+        """
+        Schedule the next refresh of the feed based on how often it publishes posts,
+        never sooner than the response is allowed to be cached.
+
+        Parameters:
+            headers (dict): Response headers of the last fetch
+        """
+        interval = max(self._posting_interval(), self._cache_lifetime(headers))
+        interval = min(max(interval, settings.FEED_REFRESH_MIN_INTERVAL), settings.FEED_REFRESH_MAX_INTERVAL)
+        self.feed.next_refresh_at = self.feed.last_refresh_at + timedelta(seconds=interval)
+
+    def _posting_interval(self):
+        """
+        Returns:
+            interval (float): Average seconds between the latest posts of the feed
+        """
+        published_times = list(
+            self.feed.posts.exclude(published_time=None)
+            .order_by("-published_time")
+            .values_list("published_time", flat=True)[: settings.FEED_REFRESH_RATE_SAMPLE_SIZE]
+        )
+        if len(published_times) < 2:
+            return settings.FEED_REFRESH_DEFAULT_INTERVAL
+        return (published_times[0] - published_times[-1]).total_seconds() / (len(published_times) - 1)
+
+    @staticmethod
+    def _cache_lifetime(headers):
+        """
+        Returns:
+            lifetime (float): Seconds the response may be cached for according to Cache-Control / Expires
+        """
+        headers = {key.lower(): value for key, value in (headers or {}).items()}
+        max_age = re.search(r"max-age=(\d+)", headers.get("cache-control", ""))
+        if max_age:
+            return int(max_age.group(1))
+        try:
+            expires = parsedate_to_datetime(headers.get("expires", ""))
+        except (TypeError, ValueError):
+            return 0
+        if expires.tzinfo is None:
+            expires = expires.replace(tzinfo=dt_timezone.utc)
+        return max((expires - timezone.now()).total_seconds(), 0)
 
+    def save_parsed_data(self, parsed_data):
+        """
+        Save the feed and its posts from feedparser output.
+
+        Parameters:
+            parsed_data (dict): Object from feedparser.parse, or from `parse_rss_stream` whose entries are
+                already prepared
 
         Returns:
             count (int): new created posts count.
+        """
+        feed_fields = self._prepare_feed_fields(parsed_data.get("feed", {}))
+        posts_fields = parsed_data.get("posts_fields")
+        if posts_fields is None:
+            date_parser = DateParser(self.feed.xml_url)
+            posts_fields = [self._prepare_post_fields(post, date_parser) for post in parsed_data.get("entries", {})]
+        return self.save_prepared_data(feed_fields, posts_fields, parsed_data)
 
+    def save_prepared_data(self, feed_fields, posts_fields, response):
         """
-        parsed_data = self.parse_rss_link()
-        feed_dict = parsed_data.get("feed", {})
-        post_entries = parsed_data.get("entries", {})
+        Save the feed and its posts from already prepared fields, see `prepare_feed_fields` and
+        `prepare_post_fields`, which both `parse_document` and the streaming path use.
+        Unchanged posts aren't written, and the cached responses are only invalidated when something changed.
+        Everything is written in one transaction, so the posts, timelines, counters and notifications of a
+        refresh are all saved or none is.
+
+        Parameters:
+            feed_fields (dict): Fields of the feed
+            posts_fields (list): Fields of its posts
+            response (dict): `etag`, `modified` and `headers` of the download
 
-        feed_fields = self._prepare_feed_fields(feed_dict)
+        Returns:
+            count (int): new created posts count.
+        """
+        stored_fields = {field.name for field in Feed._meta.concrete_fields}
+        changed_fields = [
+            field
+            for field, value in feed_fields.items()
+            if field in stored_fields and getattr(self.feed, field) != value
+        ]
         for field, value in feed_fields.items():
             setattr(self.feed, field, value)
-        self.feed.last_update = timezone.now()
-        self.feed.save()
-
-        total_created_posts = 0
-        for post in post_entries:
-            fields = self._prepare_post_fields(post)
-            fields["last_update"] = timezone.now()
-            _, created = Post.objects.update_or_create(link=fields.pop("link"), feed=self.feed, defaults=fields)
-            if created:
-                total_created_posts += 1
+        self._store_validators(response)
+        self.feed.last_update = self.feed.last_refresh_at = timezone.now()
+
+        with transaction.atomic():
+            posts_fields = self._skip_unchanged_posts(posts_fields)
+            total_created_posts = self._save_posts(posts_fields)
+            self._schedule_next_refresh(response.get("headers"))
+            self.feed.save(
+                update_fields=["etag", "last_modified", "last_refresh_at", "next_refresh_at", *changed_fields]
+            )
+            if changed_fields or posts_fields:
+                self.feed.invalidate_responses()
+        return total_created_posts
+
+    def _skip_unchanged_posts(self, posts_fields):
+        """
+        Parameters:
+            posts_fields (list): Fields of the posts from `prepare_post_fields`
+
+        Returns:
+            posts_fields (list): Fields of the new posts and of the ones whose content hash changed
+        """
+        hashes = dict(
+            self.feed.posts.filter(link__in=[fields["link"] for fields in posts_fields]).values_list(
+                "link", "content_hash"
+            )
+        )
+        return [fields for fields in posts_fields if hashes.get(fields["link"]) != fields["content_hash"]]
+
+    def _save_posts(self, posts_fields):
+        """
+        Upsert the scraped posts in a single statement keyed by (feed, link).
+
+        Parameters:
+            posts_fields (list): Fields of the posts from `prepare_post_fields`
+
+        Returns:
+            count (int): new created posts count.
+        """
+        now = timezone.now()
+        # Entries sharing a link would hit the same row twice in one statement, the last one wins.
+        posts = {}
+        for fields in posts_fields:
+            posts[fields["link"]] = Post(feed=self.feed, last_update=now, change_seq=NextChangeSeq(), **fields)
+        if not posts:
+            return 0
+
+        existing_links = set(self.feed.posts.filter(link__in=posts.keys()).values_list("link", flat=True))
+        Post.objects.bulk_create(
+            posts.values(),
+            update_conflicts=True,
+            unique_fields=["feed", "link"],
+            update_fields=[
+                "title",
+                "description",
+                "published_time",
+                "last_update",
+                "modified",
+                "change_seq",
+                "content_hash",
+            ],
+        )
+        self.feed.posts.filter(link__in=posts.keys()).update_search_vector()
+        created_links = posts.keys() - existing_links
+        total_created_posts = len(created_links)
+        if total_created_posts:
+            TimelineEntry.objects.fan_out(self.feed, created_links)
+            UserFeed.objects.filter(feed=self.feed).update(
+                unread_count=F("unread_count") + total_created_posts,
+                total_count=F("total_count") + total_created_posts,
+                change_seq=NextChangeSeq(),
+            )
+            created_ids = list(self.feed.posts.filter(link__in=created_links).values_list("id", flat=True))
+            publish(
+                feed_channel(self.feed.id),
+                {"type": "posts", "feed": self.feed.id, "posts": created_ids, "unread_delta": total_created_posts},
+            )
         return total_created_posts
 
 
+class SyncService:
+    """
+    Changes of the posts, read state and subscriptions of a user since a point of the change sequence.
+
+    Usage:
+        - Get the changes since the position returned by the previous sync, or everything if None
+            `changes = SyncService(user).changes_since(position)`
+    """
+
+    def __init__(self, user, page_size=None):
+        self.user = user
+        self.page_size = page_size or settings.SYNC_PAGE_SIZE
+
+    def changes_since(self, position=None):
+        """
+        Parameters:
+            position (int): Change sequence position of the previous sync, None for a full sync.
+
+        Returns:
+            changes (dict):
+                - position: to pass to the next sync
+                - more: whether more posts changed up to now, the next sync should follow right away
+                - posts: created or updated posts of the followed feeds, at most `page_size`
+                - subscriptions: subscriptions whose read state or counters changed, or new ones
+                - unsubscriptions: ids of the unfollowed feeds
+        """
+        upper = current_change_seq()
+        changed = Q(change_seq__lte=upper)
+        if position is not None:
+            changed &= Q(change_seq__gt=position)
+
+        posts = list(
+            Post.objects.filter(changed, feed__in=UserFeed.objects.filter(user=self.user).values("feed"))
+            .defer("search_vector")
+            .order_by("change_seq")[: self.page_size + 1]
+        )
+        more = len(posts) > self.page_size
+        if more:
+            posts = posts[: self.page_size]
+            upper = posts[-1].change_seq
+            changed &= Q(change_seq__lte=upper)
+
+        subscriptions = UserFeed.objects.filter(changed, user=self.user).prefetch_related("read_marks")
+        unsubscriptions = Unsubscription.objects.filter(changed, user=self.user).values_list("feed_id", flat=True)
+        return {
+            "position": upper,
+            "more": more,
+            "posts": posts,
+            "subscriptions": list(subscriptions),
+            "unsubscriptions": list(unsubscriptions),
+        }
+
+
 class NotificationService:
     @staticmethod
     def notify(user, subject, message):
@@ -1,54 +1,221 @@
 import json
 import logging
+from datetime import timedelta
+from functools import partial
+from itertools import islice
 
 from celery import group, shared_task
-from celery.exceptions import MaxRetriesExceededError
+from celery.exceptions import MaxRetriesExceededError, SoftTimeLimitExceeded
+from celery.utils import uuid
 from django.conf import settings
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
 
 from rss_reader.feed.exceptions import FeedException
-from rss_reader.feed.models import Feed
+from rss_reader.feed.leases import claim_refresh, release_refresh
+from rss_reader.feed.models import Feed, UserFeed
+from rss_reader.feed.pipeline import FeedRefreshPipeline
 from rss_reader.feed.services import FeedService, NotificationService
 
 logger = logging.getLogger(__name__)
 
 
-@shared_task
-def periodic_update_feeds_task():
+def _chunked(iterable, size):
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+@shared_task(bind=True)
+def periodic_update_feeds_task(self):
     """
-    Celery beat task that updates feeds.
+    Celery beat task that updates the feeds that are due for a refresh.
+
+    Every due feed is selected once however many followers it has, and the feeds are streamed
+    and enqueued chunk by chunk. Enqueued feeds are pushed back by the default refresh interval
+    so the next ticks don't enqueue them again while they're waiting in the queue, refreshing
+    them reschedules them.
+
+    With `FEED_REFRESH_BATCH_SIZE`, every chunk is a single `refresh_feeds_batch` message rather than a
+    `refresh_feed` message and result per feed.
+
+    The number of enqueued feeds is published as a `feeds-enqueued` task event.
     """
+    now = timezone.now()
+    due_feeds = (
+        Feed.objects.filter(
+            Exists(UserFeed.objects.filter(feed=OuterRef("pk"))), auto_refresh=True, next_refresh_at__lte=now
+        )
+        .order_by("next_refresh_at")
+        .values_list("id", flat=True)[: settings.FEED_REFRESH_MAX_PER_TICK]
+    )
+    batch_size = settings.FEED_REFRESH_BATCH_SIZE
+    chunk_size = batch_size or settings.FEED_REFRESH_CHUNK_SIZE
+    enqueued = 0
+    for feeds in _chunked(due_feeds.iterator(chunk_size=chunk_size), chunk_size):
+        Feed.objects.filter(id__in=feeds).update(
+            next_refresh_at=now + timedelta(seconds=settings.FEED_REFRESH_DEFAULT_INTERVAL)
+        )
+        if batch_size:
+            refresh_feeds_batch.delay(feeds)
+        else:
+            # Groupping them to get use of celery async options.
+            group(refresh_feed.s(feed_id) for feed_id in feeds).apply_async()
+        enqueued += len(feeds)
 
-    feeds = Feed.objects.filter(followers__isnull=False, auto_refresh=True).values_list("id", flat=True)
-    if not feeds:
+    self.send_event("feeds-enqueued", count=enqueued)
+    logger.info(f"Enqueued {enqueued} feeds for refresh.")
+    if not enqueued:
         return "No Feeds to update"
-    # Groupping them to get use of celery async options.
-    group(refresh_feed.s(feed_id) for feed_id in feeds).apply_async()
+    return json.dumps({"detail": f"Enqueued Feeds: {enqueued}"})
+
+
+# Prefix of the lease owners that are batches, see `refresh_feeds_batch`.
+BATCH_LEASE_PREFIX = "batch:"
+
+
+def _enqueue_refresh(feed_id, task_id):
+    try:
+        refresh_feed.apply_async((feed_id,), task_id=task_id)
+    except Exception:
+        release_refresh(feed_id, task_id)
+        raise
+
+
+def request_refresh(feed_id):
+    """
+    Enqueue a `refresh_feed` of the feed, unless one is already queued or running: the request is then
+    coalesced into it.
+
+    The task is only enqueued once the current transaction is committed, so it sees what the request
+    wrote. If the transaction is rolled back instead, the lease is left to expire.
+
+    Parameters:
+        feed_id (int): Feed to refresh
+
+    Returns:
+        (str, str): Id of the `refresh_feed` task taking care of the request, and its status:
+            - "queued": a new task was enqueued
+            - "coalesced": the request joined a `refresh_feed` already queued or running
+            - "batched": the feed is being refreshed by a `refresh_feeds_batch`, whose result is the counts
+              of the whole batch, so no task id is returned
+    """
+    task_id = uuid()
+    owner = claim_refresh(feed_id, task_id)
+    if owner == task_id:
+        transaction.on_commit(partial(_enqueue_refresh, feed_id, task_id))
+        return task_id, "queued"
+    if owner.startswith(BATCH_LEASE_PREFIX):
+        return None, "batched"
+    return owner, "coalesced"
 
 
 @shared_task(
+    bind=True,
     autoretry_for=(FeedException,),
     retry_kwargs={"max_retries": settings.MAX_RETRY_FEED_UPDATES},
     retry_backoff=settings.RETRY_BACKOFF_IN_SECONDS,
     retry_backoff_max=settings.RETRY_BACKOFF_MAX,
 )
-def refresh_feed(feed_id):
+def refresh_feed(self, feed_id):
+    """
+    Refresh a feed while holding its refresh lease, see `claim_refresh`.
+
+    The tasks enqueued while another refresh of the feed is queued or running (beat ticks, force updates,
+    retries) return right away instead of refreshing it again. The retries run under the same task id, so
+    they keep the lease until the last one.
+    """
+    task_id = self.request.id or uuid()
+    owner = claim_refresh(feed_id, task_id)
+    if owner != task_id:
+        logger.info(f"Refresh of feed with id: {feed_id} coalesced into task {owner}")
+        return json.dumps({"detail": f"Coalesced into task: {owner}"})
+
     updated_feed_ids = []
     failed_feed_ids = []
-    feed = Feed.objects.get(id=feed_id)
+    retrying = False
     try:
-        feed_svc = FeedService(feed)
-        feed_svc.update_feed()
-        updated_feed_ids.append(feed_id)
-    except FeedException:
+        feed = Feed.objects.get(id=feed_id)
         try:
-            refresh_feed.retry()
-        except MaxRetriesExceededError:
-            feed.deactivate_auto_refresh()
-            failed_feed_ids.append(feed_id)
-            NotificationService.notify(
-                user=feed.creator,
-                subject="Feed has exceeded the max number of retries",
-                message=f"Feed with id: {feed.id} has exceeded the max number of retries.",
-            )
-            logger.error(f"Updating feed with id: {feed.id} has exceeded the max number of retries. ")
+            feed_svc = FeedService(feed)
+            feed_svc.update_feed(streaming=settings.FEED_STREAM_PARSING)
+            updated_feed_ids.append(feed_id)
+        except FeedException:
+            try:
+                retrying = True
+                self.retry()
+            except MaxRetriesExceededError:
+                retrying = False
+                feed.deactivate_auto_refresh()
+                failed_feed_ids.append(feed_id)
+                NotificationService.notify(
+                    user=feed.creator,
+                    subject="Feed has exceeded the max number of retries",
+                    message=f"Feed with id: {feed.id} has exceeded the max number of retries.",
+                )
+                logger.error(f"Updating feed with id: {feed.id} has exceeded the max number of retries. ")
+    finally:
+        if not retrying:
+            release_refresh(feed_id, task_id)
     return json.dumps({"detail": f"Updated Feed: {updated_feed_ids}, Failed Feed: {len(failed_feed_ids)} "})
+
+
+@shared_task(
+    bind=True,
+    soft_time_limit=settings.FEED_REFRESH_BATCH_SOFT_TIME_LIMIT,
+    time_limit=settings.FEED_REFRESH_BATCH_TIME_LIMIT,
+)
+def refresh_feeds_batch(self, feed_ids):
+    """
+    Refresh a batch of feeds through `FeedRefreshPipeline`, downloading, parsing and saving them at the
+    same time with the HTTP client, parse processes and database connection of the worker.
+
+    Feeds whose refresh is already queued or running elsewhere are skipped, see `claim_refresh`.
+    Feeds that fail are handed over to `refresh_feed` so they go through its retry policy, the others
+    aren't affected. Feeds held back by the limits of their host, or not refreshed before the soft time
+    limit, are deferred: they're rescheduled `FEED_REFRESH_MIN_INTERVAL` later rather than retried.
+
+    Returns:
+        result (str): JSON counts of the feeds refreshed, skipped, deferred and failed, and of the created posts.
+    """
+    owner = f"{BATCH_LEASE_PREFIX}{self.request.id or uuid()}"
+    started_at = timezone.now()
+    leased_feed_ids = [feed_id for feed_id in feed_ids if claim_refresh(feed_id, owner) == owner]
+    counts = {
+        "updated": 0,
+        "failed": 0,
+        "deferred": 0,
+        "skipped": len(feed_ids) - len(leased_feed_ids),
+        "created_posts": 0,
+    }
+    deferred_feed_ids, reported_feed_ids = [], set()
+    try:
+        feeds = list(Feed.objects.filter(id__in=leased_feed_ids))
+        for result in FeedRefreshPipeline().run(feeds):
+            reported_feed_ids.add(result.feed_id)
+            release_refresh(result.feed_id, owner)
+            if result.deferred:
+                deferred_feed_ids.append(result.feed_id)
+            elif result.error is None:
+                counts["updated"] += 1
+                counts["created_posts"] += result.created
+            else:
+                counts["failed"] += 1
+                request_refresh(result.feed_id)
+    except SoftTimeLimitExceeded:
+        # The feeds saved so far were rescheduled by their refresh, the reported ones are already handled.
+        pending_feeds = Feed.objects.filter(id__in=set(leased_feed_ids) - reported_feed_ids)
+        deferred_feed_ids += pending_feeds.exclude(last_refresh_at__gte=started_at).values_list("id", flat=True)
+        logger.warning(f"Timed out refreshing a batch of {len(feed_ids)} feeds.")
+    finally:
+        for feed_id in leased_feed_ids:
+            release_refresh(feed_id, owner)
+    if deferred_feed_ids:
+        Feed.objects.filter(id__in=deferred_feed_ids).update(
+            next_refresh_at=timezone.now() + timedelta(seconds=settings.FEED_REFRESH_MIN_INTERVAL)
+        )
+        counts["deferred"] = len(deferred_feed_ids)
+    if counts["failed"]:
+        logger.warning(f"Failed refreshing {counts['failed']} of {len(feed_ids)} feeds, retrying them one by one.")
+    return json.dumps(counts)
@@ -37,5 +37,5 @@ class UserFeedFactory(DjangoModelFactory):
         if not create:
             return
         if read_posts:
-            for order in read_posts:
-                self.read_posts.add(read_posts)
+            for post in read_posts:
+                self.set_read(post, True)
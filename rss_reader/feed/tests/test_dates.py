@@ -0,0 +1,62 @@
+import time
+from datetime import datetime
+from datetime import timezone as dt_timezone
+from unittest.mock import patch
+
+from django.test import TestCase
+
+from rss_reader.feed import dates
+from rss_reader.feed.dates import DateParser
+
+EXPECTED = datetime(2022, 1, 1, 12, 0, tzinfo=dt_timezone.utc)
+
+
+class DateParserTestCase(TestCase):
+    def setUp(self):
+        dates._detected_formats.clear()
+
+    def _parse(self, value):
+        return DateParser().parse({"published": value})
+
+    def test_parse_feedparser_tuple(self):
+        entry = {"published": "not parsed again", "published_parsed": time.gmtime(EXPECTED.timestamp())}
+        self.assertEqual(DateParser().parse(entry), EXPECTED)
+
+    def test_parse_rfc822(self):
+        for value in (
+            "Sat, 01 Jan 2022 12:00:00 GMT",
+            "Sat, 1 Jan 2022 12:00:00 +0000",
+            "Sat, 01 Jan 22 07:00:00 EST",
+            "01 Jan 2022 14:00 +02:00",
+            "Saturday, 01 January 2022 12:00:00 Z",
+        ):
+            with self.subTest(value=value):
+                self.assertEqual(self._parse(value), EXPECTED)
+
+    def test_parse_rfc3339(self):
+        for value in (
+            "2022-01-01T12:00:00Z",
+            "2022-01-01T13:00:00+01:00",
+            "2022-01-01T12:00:00.000000",
+            "2022-01-01T12:00",
+        ):
+            with self.subTest(value=value):
+                self.assertEqual(self._parse(value), EXPECTED)
+
+    def test_detected_format_is_remembered_per_feed(self):
+        self.assertEqual(DateParser("feed").parse({"published": "2022/01/01 12:00:00"}), EXPECTED)
+
+        date_parser = DateParser("feed")
+        self.assertEqual(date_parser.format, "%Y/%m/%d %H:%M:%S")
+        with patch("rss_reader.feed.dates.parser.parse") as mock_parse:
+            self.assertEqual(date_parser.parse({"published": "2022/01/01 12:00:00"}), EXPECTED)
+        mock_parse.assert_not_called()
+        self.assertIsNone(DateParser("other feed").format)
+
+    def test_fallback_to_dateutil(self):
+        self.assertIsNone(self._parse("sometime last week"))
+        self.assertEqual(self._parse("Jan 1 2022 12:00pm"), EXPECTED)
+
+    def test_missing_date(self):
+        self.assertIsNone(DateParser().parse({}))
+        self.assertIsNone(self._parse(""))
@@ -0,0 +1,50 @@
+import asyncio
+
+import httpx
+from django.test import TestCase
+
+from rss_reader.feed.fetchers import AsyncFeedFetcher
+from rss_reader.feed.tests.factories import FeedFactory
+
+RSS_DOCUMENT = b"""<?xml version="1.0"?>
+<rss version="2.0"><channel><title>Example Feed</title></channel></rss>
+"""
+
+
+class AsyncFeedFetcherTestCase(TestCase):
+    def setUp(self):
+        self.feed = FeedFactory.create(xml_url="https://example.com/feed.xml")
+        self.not_modified_feed = FeedFactory.create(xml_url="https://example.com/cached.xml", etag='"abc"')
+        self.broken_feed = FeedFactory.create(xml_url="https://broken.example.com/feed.xml")
+
+    def _handler(self, request):
+        if request.url.host == "broken.example.com":
+            raise httpx.ConnectError("Connection refused", request=request)
+        if request.headers.get("If-None-Match") == '"abc"':
+            return httpx.Response(304)
+        return httpx.Response(200, content=RSS_DOCUMENT, headers={"ETag": '"new"'})
+
+    def test_run(self):
+        fetcher = AsyncFeedFetcher(concurrency=2, transport=httpx.MockTransport(self._handler))
+        feeds = [self.feed, self.not_modified_feed, self.broken_feed]
+        results = fetcher.run(feeds)
+
+        self.assertEqual([result.feed_id for result in results], [feed.id for feed in feeds])
+        self.assertEqual(results[0].status, 200)
+        self.assertEqual(results[0].content, RSS_DOCUMENT)
+        self.assertEqual(results[0].headers["etag"], '"new"')
+        self.assertEqual(results[1].status, 304)
+        self.assertIsNone(results[2].status)
+        self.assertIsInstance(results[2].error, httpx.ConnectError)
+
+    def test_stream(self):
+        fetcher = AsyncFeedFetcher(concurrency=2, transport=httpx.MockTransport(self._handler))
+        results = []
+
+        async def callback(result):
+            results.append(result)
+
+        asyncio.run(fetcher.stream([self.feed, self.not_modified_feed, self.broken_feed], callback))
+
+        statuses = {result.feed_id: result.status for result in results}
+        self.assertEqual(statuses, {self.feed.id: 200, self.not_modified_feed.id: 304, self.broken_feed.id: None})
@@ -0,0 +1,202 @@
+import asyncio
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import patch
+from uuid import uuid4
+
+import httpcore
+import httpx
+from django.test import SimpleTestCase, override_settings
+
+from rss_reader.feed.http import (
+    CachingDNSBackend,
+    DNSCache,
+    HostLimiter,
+    LimitedTransport,
+    PooledTransport,
+    _environment_proxies,
+    make_async_client,
+    make_client,
+)
+
+
+def _host():
+    return f"{uuid4().hex}.example.com"
+
+
+class TestHostLimiter(SimpleTestCase):
+    def test_max_concurrency(self):
+        limiter, host = HostLimiter(max_concurrency=1, rate=0), _host()
+        token = limiter.acquire(host, timeout=1)
+        self.assertIsNotNone(token)
+        with self.assertRaises(httpx.PoolTimeout):
+            limiter.acquire(host, timeout=0.1)
+        # Other hosts aren't limited.
+        self.assertIsNotNone(limiter.acquire(_host(), timeout=0.1))
+
+        limiter.release(host, token)
+        self.assertIsNotNone(limiter.acquire(host, timeout=0.1))
+
+    def test_rate_limit(self):
+        limiter, host = HostLimiter(max_concurrency=0, rate=1, burst=2), _host()
+        limiter.acquire(host, timeout=0.1)
+        limiter.acquire(host, timeout=0.1)
+        with self.assertRaises(httpx.PoolTimeout):
+            limiter.acquire(host, timeout=0.1)
+        # One token is back a second later.
+        limiter.acquire(host, timeout=2)
+
+    def test_disabled(self):
+        limiter = HostLimiter(max_concurrency=0, rate=0)
+        self.assertIsNone(limiter.acquire(_host(), timeout=0.1))
+        self.assertIsNone(limiter._client)
+
+    def test_redis_unavailable(self):
+        limiter = HostLimiter(max_concurrency=1, rate=1, url="redis://localhost:1/0")
+        with self.assertLogs("rss_reader.feed.http", "WARNING"):
+            self.assertIsNone(limiter.acquire(_host(), timeout=0.1))
+
+    def test_async(self):
+        async def acquire():
+            limiter, host = HostLimiter(max_concurrency=1, rate=0), _host()
+            token = await limiter.aacquire(host, timeout=1)
+            with self.assertRaises(httpx.PoolTimeout):
+                await limiter.aacquire(host, timeout=0.1)
+            await limiter.arelease(host, token)
+            self.assertIsNotNone(await limiter.aacquire(host, timeout=0.1))
+            await limiter.aclose()
+
+        asyncio.run(acquire())
+
+
+@override_settings(FEED_HOST_MAX_CONCURRENCY=1, FEED_HOST_RATE_LIMIT=0)
+class TestClients(SimpleTestCase):
+    def setUp(self):
+        self.transport = httpx.MockTransport(lambda request: httpx.Response(200, content=b"<rss/>"))
+        self.url = f"https://{_host()}/feed.xml"
+
+    def test_slot_released_with_response(self):
+        with make_client(self.transport, timeout=0.2) as client:
+            with client.stream("GET", self.url):
+                with self.assertRaises(httpx.PoolTimeout):
+                    client.get(self.url)
+            self.assertEqual(client.get(self.url).content, b"<rss/>")
+            self.assertEqual(client.get(self.url).status_code, 200)
+
+    def test_async_slot_released_with_response(self):
+        async def get():
+            async with make_async_client(self.transport, timeout=0.2) as client:
+                async with client.stream("GET", self.url):
+                    with self.assertRaises(httpx.PoolTimeout):
+                        await client.get(self.url)
+                self.assertEqual((await client.get(self.url)).content, b"<rss/>")
+                self.assertEqual((await client.get(self.url)).status_code, 200)
+
+        asyncio.run(get())
+
+
+class TestDNSCache(SimpleTestCase):
+    @override_settings(FEED_DNS_CACHE_TTL=60)
+    def test_resolve(self):
+        dns_cache = DNSCache()
+        with patch("rss_reader.feed.http.socket.getaddrinfo") as mock_getaddrinfo:
+            mock_getaddrinfo.return_value = [
+                (10, 1, 6, "", ("2001:db8::1", 443, 0, 0)),
+                (2, 1, 6, "", ("192.0.2.1", 443)),
+                (2, 1, 6, "", ("192.0.2.1", 443)),
+            ]
+            self.assertEqual(dns_cache.resolve("example.com", 443), ["2001:db8::1", "192.0.2.1"])
+            self.assertEqual(dns_cache.resolve("example.com", 443), ["2001:db8::1", "192.0.2.1"])
+            self.assertEqual(mock_getaddrinfo.call_count, 1)
+
+            dns_cache.evict("example.com", 443)
+            dns_cache.resolve("example.com", 443)
+            self.assertEqual(mock_getaddrinfo.call_count, 2)
+
+    @override_settings(FEED_DNS_CACHE_TTL=0)
+    def test_expired(self):
+        dns_cache = DNSCache()
+        with patch("rss_reader.feed.http.socket.getaddrinfo") as mock_getaddrinfo:
+            mock_getaddrinfo.return_value = [(2, 1, 6, "", ("192.0.2.1", 443))]
+            dns_cache.resolve("example.com", 443)
+            dns_cache.resolve("example.com", 443)
+            self.assertEqual(mock_getaddrinfo.call_count, 2)
+
+    def test_connect_falls_back_to_next_address(self):
+        with patch("rss_reader.feed.http.dns_cache", DNSCache()) as dns_cache, patch.object(
+            dns_cache, "resolve", return_value=["2001:db8::1", "192.0.2.1"]
+        ), patch("rss_reader.feed.http.httpcore.SyncBackend.connect_tcp") as mock_connect_tcp:
+            mock_connect_tcp.side_effect = [httpcore.ConnectError("unreachable"), "stream"]
+            self.assertEqual(CachingDNSBackend().connect_tcp("example.com", 443), "stream")
+            self.assertEqual([call.args[0] for call in mock_connect_tcp.call_args_list], ["2001:db8::1", "192.0.2.1"])
+
+            mock_connect_tcp.side_effect = httpcore.ConnectError("unreachable")
+            with patch.object(dns_cache, "evict") as mock_evict, self.assertRaises(httpcore.ConnectError):
+                CachingDNSBackend().connect_tcp("example.com", 443)
+            mock_evict.assert_called_once_with("example.com", 443)
+
+
+class TestProxies(SimpleTestCase):
+    @patch.dict("os.environ", {"HTTPS_PROXY": "http://proxy.example.com:3128", "NO_PROXY": "localhost"}, clear=True)
+    def test_environment_proxies(self):
+        with make_client() as client:
+            proxied = client._transport_for_url(httpx.URL("https://example.com/feed.xml"))
+            self.assertIsInstance(proxied, LimitedTransport)
+            self.assertIsInstance(proxied.transport._pool, httpcore.HTTPProxy)
+            # Excluded hosts, and plain HTTP, go through the default transport.
+            self.assertIs(client._transport_for_url(httpx.URL("https://localhost/feed.xml")), client._transport)
+            self.assertIs(client._transport_for_url(httpx.URL("http://example.com/feed.xml")), client._transport)
+            self.assertIsInstance(client._transport.transport, PooledTransport)
+
+    @patch.dict(
+        "os.environ", {"HTTP_PROXY": "proxy.example.com:3128", "NO_PROXY": "localhost,.example.org,::1"}, clear=True
+    )
+    def test_environment_proxies_patterns(self):
+        self.assertEqual(
+            _environment_proxies(),
+            {
+                "http://": "http://proxy.example.com:3128",
+                "all://localhost": None,
+                "all://*.example.org": None,
+                "all://[::1]": None,
+            },
+        )
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header("Content-Length", "6")
+        self.end_headers()
+        self.wfile.write(b"<rss/>")
+
+    def log_message(self, *args):
+        pass
+
+
+@patch.dict("os.environ", {}, clear=True)
+class TestPooledTransport(SimpleTestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.url = f"http://localhost:{self.server.server_port}/feed.xml"
+
+    def test_request(self):
+        with make_client() as client:
+            self.assertEqual(client.get(self.url).content, b"<rss/>")
+            with client.stream("GET", self.url) as response:
+                self.assertEqual(response.read(), b"<rss/>")
+
+    def test_async_request(self):
+        async def get():
+            async with make_async_client() as client:
+                return (await client.get(self.url)).content
+
+        self.assertEqual(asyncio.run(get()), b"<rss/>")
+
+    def test_errors_are_httpx_ones(self):
+        self.server.server_close()
+        with make_client() as client, self.assertRaises(httpx.ConnectError):
+            client.get(self.url)
@@ -1,7 +1,10 @@
+from datetime import timedelta
+
 from django.test import TestCase
+from django.utils import timezone
 from rest_framework.exceptions import ValidationError
 
-from rss_reader.feed.models import UserFeed
+from rss_reader.feed.models import Feed, Post, UserFeed
 from rss_reader.feed.tests.factories import FeedFactory, PostFactory, UserFeedFactory
 from rss_reader.users.tests.factories import UserFactory
 
@@ -41,6 +44,29 @@ class TestFeedModel(TestCase):
         self.feed.unfollow(self.user)
         self.assertFalse(UserFeed.objects.filter(user=self.user, feed=self.feed).exists())
 
+    def test_normalized_url(self):
+        self.assertEqual(self.feed.normalized_url, "https://example.com/feed.xml")
+
+    def test_subscribe_shares_feed_by_normalized_url(self):
+        other_user = UserFactory.create()
+        feed, created = Feed.objects.subscribe(other_user, "HTTPS://Example.com:443/feed.xml#latest")
+        self.assertFalse(created)
+        self.assertEqual(feed, self.feed)
+        self.assertTrue(UserFeed.objects.filter(user=other_user, feed=self.feed).exists())
+
+    def test_subscribe_creates_new_feed(self):
+        feed, created = Feed.objects.subscribe(self.user, "https://example.com/other.xml")
+        self.assertTrue(created)
+        self.assertEqual(feed.creator, self.user)
+        self.assertTrue(UserFeed.objects.filter(user=self.user, feed=feed).exists())
+
+    def test_visible_to(self):
+        other_user = UserFactory.create()
+        self.assertFalse(Feed.objects.visible_to(other_user).exists())
+        self.feed.follow(other_user)
+        self.assertEqual(list(Feed.objects.visible_to(other_user)), [self.feed])
+        self.assertEqual(list(Feed.objects.visible_to(self.user)), [self.feed])
+
 
 class TestPostModel(TestCase):
     def setUp(self):
@@ -61,12 +87,11 @@ class TestPostModel(TestCase):
             last_update=None,
         )
         self.user_feed = UserFeedFactory.create(user=self.user, feed=self.feed)
-        # self.user_feed.read_posts.add(self.post)
-        # self.user_feed.save()
 
     def test_mark_as_read(self):
         self.post.mark_as_read(self.user)
-        self.assertTrue(self.post in self.user_feed.read_posts.all())
+        self.user_feed.refresh_from_db()
+        self.assertTrue(self.user_feed.is_read(self.post))
 
     def test_mark_read_post_as_read_raises_error(self):
         self.post.mark_as_read(self.user)
@@ -76,7 +101,8 @@ class TestPostModel(TestCase):
     def test_mark_as_unread(self):
         self.post.mark_as_read(self.user)
         self.post.mark_as_unread(self.user)
-        self.assertFalse(self.post in self.user_feed.read_posts.all())
+        self.user_feed.refresh_from_db()
+        self.assertFalse(self.user_feed.is_read(self.post))
 
     def test_mark_unread_post_as_unread_raises_error(self):
         with self.assertRaises(ValidationError):
@@ -84,8 +110,85 @@ class TestPostModel(TestCase):
 
     def test_mark_all_read(self):
         self.post.mark_all_read(self.user)
-        self.assertEqual(self.user_feed.read_posts.count(), self.feed.posts.count())
+        self.assertEqual(self.user_feed.get_read_posts().count(), self.feed.posts.count())
 
     def test_mark_all_unread(self):
+        self.post.mark_all_read(self.user)
+        self.post.mark_all_unread(self.user)
+        self.assertEqual(self.user_feed.get_read_posts().count(), 0)
+
+    def test_feed_mark_all_read_older_than(self):
+        now = timezone.now()
+        self.post.published_time = now - timedelta(days=3)
+        self.post.save()
+        old_post = PostFactory.create(feed=self.feed, published_time=now - timedelta(days=2))
+        new_post = PostFactory.create(feed=self.feed, published_time=now)
+        self.post.mark_as_read(self.user)
+        self.post.mark_as_unread(self.user)
+
+        self.feed.mark_all_read(self.user, older_than=now - timedelta(days=1))
+
+        self.assertEqual(set(self.user_feed.get_read_posts()), {self.post, old_post})
+        self.assertEqual(set(Post.objects.unread_by(self.user)), {new_post})
+        self.user_feed.refresh_from_db()
+        self.assertEqual(self.user_feed.read_up_to, old_post.id)
+        self.assertFalse(self.user_feed.read_marks.exists())
+
+    def test_feed_mark_all_read_not_followed_raises_error(self):
+        with self.assertRaises(ValidationError):
+            self.feed.mark_all_read(UserFactory.create())
+
+    def test_unread_counters(self):
+        self.user_feed.refresh_counters()
+        PostFactory.create(feed=self.feed, published_time=timezone.now())
+        self.assertEqual((self.user_feed.unread_count, self.user_feed.total_count), (1, 1))
+        self.user_feed.refresh_counters()
+        self.assertEqual((self.user_feed.unread_count, self.user_feed.total_count), (2, 2))
+
+        self.post.mark_as_read(self.user)
+        self.user_feed.refresh_from_db()
+        self.assertEqual(self.user_feed.unread_count, 1)
+
+        self.post.mark_as_unread(self.user)
+        self.user_feed.refresh_from_db()
+        self.assertEqual(self.user_feed.unread_count, 2)
+
+        self.feed.mark_all_read(self.user, older_than=timezone.now() - timedelta(days=1))
+        self.user_feed.refresh_from_db()
+        self.assertEqual(self.user_feed.unread_count, 2)
+
+        self.post.mark_all_read(self.user)
+        self.user_feed.refresh_from_db()
+        self.assertEqual(self.user_feed.unread_count, 0)
+
         self.post.mark_all_unread(self.user)
-        self.assertEqual(self.user_feed.read_posts.count(), 0)
+        self.user_feed.refresh_from_db()
+        self.assertEqual(self.user_feed.unread_count, 2)
+
+    def test_read_state_is_compacted(self):
+        second_post, third_post = PostFactory.create_batch(2, feed=self.feed)
+
+        third_post.mark_as_read(self.user)
+        self.user_feed.refresh_from_db()
+        self.assertLess(self.user_feed.read_up_to, self.post.id)
+        self.assertEqual(list(self.user_feed.read_marks.values_list("post_id", "is_read")), [(third_post.id, True)])
+
+        self.post.mark_as_read(self.user)
+        second_post.mark_as_read(self.user)
+        self.user_feed.refresh_from_db()
+        self.assertEqual(self.user_feed.read_up_to, third_post.id)
+        self.assertFalse(self.user_feed.read_marks.exists())
+
+        second_post.mark_as_unread(self.user)
+        self.user_feed.refresh_from_db()
+        self.assertEqual(list(self.user_feed.read_marks.values_list("post_id", "is_read")), [(second_post.id, False)])
+        self.assertEqual(set(self.user_feed.get_read_posts()), {self.post, third_post})
+        self.assertEqual(set(Post.objects.unread_by(self.user)), {second_post})
+
+    def test_read_state_is_per_user(self):
+        other_user = UserFactory.create()
+        self.feed.follow(other_user)
+        self.post.mark_as_read(other_user)
+        self.assertFalse(Post.objects.read_by(self.user).exists())
+        self.assertEqual(list(Post.objects.unread_by(self.user)), [self.post])
+        self.assertEqual(list(Post.objects.read_by(other_user)), [self.post])
@@ -0,0 +1,129 @@
+from django.test import TestCase
+
+from rss_reader.feed.exceptions import FeedException
+from rss_reader.feed.parsers import StreamingFeedParser, parse_document, prepare_feed_fields, prepare_post_fields
+
+ATOM_DOCUMENT = b"""<?xml version="1.0" encoding="utf-8"?>
+<feed xmlns="http://www.w3.org/2005/Atom">
+<title>Example Feed</title><subtitle>This is an example feed</subtitle>
+<link rel="self" href="https://example.com/feed.xml"/><link href="https://example.com"/>
+<entry><title>Post 1</title><link rel="alternate" href="https://example.com/post1"/><id>urn:post1</id>
+<updated>2022-01-01T12:00:00Z</updated><content type="xhtml"><div>Content <b>1</b></div></content></entry>
+<entry><title>Post 2</title><link href="https://example.com/post2"/><summary>Summary 2</summary>
+<published>2022-01-02T12:00:00Z</published></entry>
+</feed>
+"""
+RSS_DOCUMENT = b"""<?xml version="1.0"?>
+<rss version="2.0" xmlns:content="http://purl.org/rss/1.0/modules/content/"
+xmlns:dc="http://purl.org/dc/elements/1.1/">
+<channel><title>Example &amp; Feed</title><link>https://example.com</link>
+<description>An &lt;b&gt;example&lt;/b&gt; feed</description>
+<item><title>Post 1 &amp; more</title><link>https://example.com/post1</link>
+<description>&lt;p&gt;Summary &lt;script&gt;alert(1)&lt;/script&gt;&lt;a href="/x"
+onclick="y()"&gt;link&lt;/a&gt;&lt;/p&gt;</description>
+<pubDate>Sat, 01 Jan 2022 12:00:00 GMT</pubDate></item>
+<item><title>Post 2</title><guid>https://example.com/post2</guid>
+<content:encoded><![CDATA[<p>Full <em>content</em><script>x</script></p>]]></content:encoded>
+<dc:date>2022-01-02T12:00:00Z</dc:date></item>
+<item><title>Post &lt;b&gt;3&lt;/b&gt;</title><link>/post3</link><description>plain text</description></item>
+</channel></rss>
+"""
+SANITIZED_ATOM_DOCUMENT = b"""<?xml version="1.0" encoding="utf-8"?>
+<feed xmlns="http://www.w3.org/2005/Atom" xml:base="https://example.org/blog/">
+<title>Atom Feed</title><subtitle>Sub</subtitle><link href="/"/>
+<entry><title>Entry 1</title><link href="1"/><id>urn:1</id><updated>2022-01-03T12:00:00Z</updated>
+<summary type="html">&lt;p&gt;Hi&lt;script&gt;bad()&lt;/script&gt; &lt;img src="a.png"&gt;&lt;/p&gt;</summary></entry>
+<entry xml:base="https://example.net/"><title type="html">Entry &lt;b&gt;2&lt;/b&gt;</title>
+<link rel="alternate" href="2"/><link rel="self" href="2.xml"/><id>urn:2</id>
+<published>2022-01-04T12:00:00+02:00</published><content type="xhtml"><div xmlns="http://www.w3.org/1999/xhtml">
+<p>XHTML <b>content</b> <a href="more">more</a></p><script>evil()</script></div></content></entry>
+<entry><title>Entry 3</title><link href="https://example.org/3"/><id>urn:3</id>
+<published>2022-01-05T12:00:00Z</published><content type="text">Plain &lt;text&gt;</content></entry>
+</feed>
+"""
+RSS1_DOCUMENT = b"""<?xml version="1.0"?>
+<rdf:RDF xmlns:rdf="http://www.w3.org/1999/02/22-rdf-syntax-ns#" xmlns="http://purl.org/rss/1.0/"
+xmlns:dc="http://purl.org/dc/elements/1.1/" xmlns:content="http://purl.org/rss/1.0/modules/content/">
+<channel rdf:about="https://example.com/"><title>RSS 1.0 Feed</title><link>https://example.com/</link>
+<description>An &lt;i&gt;RDF&lt;/i&gt; feed</description></channel>
+<item rdf:about="https://example.com/1"><title>Item 1</title><link>https://example.com/1</link>
+<description>&lt;p onmouseover="x()"&gt;One &lt;a href="/more"&gt;more&lt;/a&gt;&lt;/p&gt;</description>
+<dc:date>2022-01-06T12:00:00Z</dc:date></item>
+<item rdf:about="https://example.com/2"><title>Item &amp; 2</title><link>https://example.com/2</link>
+<content:encoded><![CDATA[<p>Two<script>bad()</script></p>]]></content:encoded>
+<dc:date>2022-01-07T12:00:00+01:00</dc:date></item>
+</rdf:RDF>
+"""
+
+
+class StreamingFeedParserTestCase(TestCase):
+    def _parse(self, document, chunk_size=16):
+        parser = StreamingFeedParser()
+        entries = []
+        for start in range(0, len(document), chunk_size):
+            entries += parser.feed(document[start : start + chunk_size])
+        return parser, entries + parser.close()
+
+    def test_parse_atom(self):
+        parser, entries = self._parse(ATOM_DOCUMENT)
+
+        self.assertEqual(
+            parser.feed_fields,
+            {"title": "Example Feed", "subtitle": "This is an example feed", "link": "https://example.com"},
+        )
+        self.assertEqual(
+            [entry["link"] for entry in entries], ["https://example.com/post1", "https://example.com/post2"]
+        )
+        self.assertEqual(entries[0]["updated"], "2022-01-01T12:00:00Z")
+        self.assertEqual(entries[0]["summary"], "Content <b>1</b>")
+        self.assertEqual(entries[1]["summary"], "Summary 2")
+
+    def test_parse_rss_permalink_guid(self):
+        document = b"""<rss version="2.0"><channel><title>Example Feed</title>
+<item><title>Post 1</title><guid>https://example.com/post1</guid><description>&lt;p&gt;Summary&lt;/p&gt;</description>
+<pubDate>Sat, 01 Jan 2022 12:00:00 GMT</pubDate></item></channel></rss>"""
+        parser, entries = self._parse(document)
+
+        self.assertEqual(
+            entries,
+            [
+                {
+                    "title": "Post 1",
+                    "id": "https://example.com/post1",
+                    "link": "https://example.com/post1",
+                    "summary": "<p>Summary</p>",
+                    "published": "Sat, 01 Jan 2022 12:00:00 GMT",
+                }
+            ],
+        )
+
+    def test_entries_are_dropped_once_read(self):
+        parser = StreamingFeedParser()
+        parser.feed(b"<rss><channel><title>Example Feed</title>")
+        parser.feed(b"<item><title>Post 1</title></item>" * 100)
+        channel = parser._stack[-1]
+        self.assertEqual(len(channel), 0)
+
+    def test_malformed_feed(self):
+        with self.assertRaises(FeedException):
+            self._parse(b"<rss><channel><item><title>Post &nbsp;1</title></item></channel></rss>")
+
+    def test_unsupported_document(self):
+        with self.assertRaises(FeedException):
+            self._parse(b"<html><body></body></html>")
+
+    def test_same_posts_as_feedparser(self):
+        headers = {"content-location": "https://example.com/feed.xml", "content-type": "application/xml"}
+        for document in (RSS_DOCUMENT, RSS1_DOCUMENT, SANITIZED_ATOM_DOCUMENT, ATOM_DOCUMENT):
+            with self.subTest(document=document[:60]):
+                feed_fields, posts_fields = parse_document("https://example.com/feed.xml", document, headers)
+                parser = StreamingFeedParser(headers["content-location"])
+                entries = []
+                for start in range(0, len(document), 16):
+                    entries += parser.feed(document[start : start + 16])
+                entries += parser.close()
+
+                self.assertEqual(prepare_feed_fields(parser.feed_fields), feed_fields)
+                self.assertEqual([prepare_post_fields(entry) for entry in entries], posts_fields)
+                self.assertTrue(all(post["published_time"] for post in posts_fields[:2]))
+                self.assertFalse(any("script" in (post["description"] or "") for post in posts_fields))
@@ -0,0 +1,112 @@
+import threading
+import time
+from unittest.mock import patch
+
+import httpx
+from django.test import TestCase
+
+from rss_reader.feed.exceptions import FeedException
+from rss_reader.feed.fetchers import AsyncFeedFetcher
+from rss_reader.feed.models import Post
+from rss_reader.feed.pipeline import FeedRefreshPipeline
+from rss_reader.feed.services import FeedService
+from rss_reader.feed.tests.factories import FeedFactory
+
+RSS_DOCUMENT = b"""<?xml version="1.0"?>
+<rss version="2.0"><channel>
+<title>Example Feed</title><link>https://example.com</link><description>This is an example feed</description>
+<item><title>Post 1</title><link>https://example.com/post1</link><description>Summary 1</description>
+<pubDate>Sat, 01 Jan 2022 12:00:00 GMT</pubDate></item>
+</channel></rss>
+"""
+
+
+class FeedRefreshPipelineTestCase(TestCase):
+    def setUp(self):
+        self.feed = FeedFactory.create(xml_url="https://example.com/feed.xml")
+        self.not_modified_feed = FeedFactory.create(xml_url="https://example.com/cached.xml", etag='"abc"')
+        self.broken_feed = FeedFactory.create(xml_url="https://broken.example.com/feed.xml")
+        self.malformed_feed = FeedFactory.create(xml_url="https://example.com/malformed.xml")
+        self.error_feed = FeedFactory.create(xml_url="https://example.com/error.xml")
+
+    def _handler(self, request):
+        if request.url.host == "broken.example.com":
+            raise httpx.ConnectError("Connection refused", request=request)
+        if request.headers.get("If-None-Match") == '"abc"':
+            return httpx.Response(304)
+        if request.url.path == "/malformed.xml":
+            return httpx.Response(200, content=b"<rss><channel><title>Broken")
+        if request.url.path == "/error.xml":
+            return httpx.Response(500)
+        return httpx.Response(
+            200, content=RSS_DOCUMENT, headers={"Content-Type": "application/rss+xml", "ETag": '"new"'}
+        )
+
+    def test_run(self):
+        fetcher = AsyncFeedFetcher(concurrency=2, transport=httpx.MockTransport(self._handler))
+        feeds = [self.feed, self.not_modified_feed, self.broken_feed, self.malformed_feed, self.error_feed]
+        results = {result.feed_id: result for result in FeedRefreshPipeline(fetcher, queue_size=1).run(feeds)}
+
+        self.assertEqual(set(results), {feed.id for feed in feeds})
+        self.assertEqual((results[self.feed.id].created, results[self.feed.id].error), (1, None))
+        self.assertIsNone(results[self.not_modified_feed.id].error)
+        for feed in (self.broken_feed, self.malformed_feed, self.error_feed):
+            self.assertIsInstance(results[feed.id].error, FeedException)
+
+        self.feed.refresh_from_db()
+        self.assertEqual((self.feed.title, self.feed.etag), ("Example Feed", '"new"'))
+        self.assertEqual(Post.objects.get(feed=self.feed).title, "Post 1")
+        self.not_modified_feed.refresh_from_db()
+        self.assertIsNotNone(self.not_modified_feed.last_refresh_at)
+
+    def test_run_without_feeds(self):
+        self.assertEqual(FeedRefreshPipeline().run([]), [])
+
+    def test_run_isolates_unexpected_errors(self):
+        other_feed = FeedFactory.create(xml_url="https://example.com/other.xml")
+        save_prepared_data = FeedService.save_prepared_data
+
+        def save(service, *args):
+            if service.feed.id == self.feed.id:
+                raise ValueError("value too long")
+            return save_prepared_data(service, *args)
+
+        fetcher = AsyncFeedFetcher(transport=httpx.MockTransport(self._handler))
+        with patch.object(FeedService, "save_prepared_data", autospec=True, side_effect=save):
+            with self.assertLogs("rss_reader.feed.pipeline", "ERROR"):
+                results = {
+                    result.feed_id: result for result in FeedRefreshPipeline(fetcher).run([self.feed, other_feed])
+                }
+
+        self.assertIsInstance(results[self.feed.id].error, ValueError)
+        self.assertEqual((results[other_feed.id].created, results[other_feed.id].error), (1, None))
+
+    def test_run_defers_busy_hosts(self):
+        def handler(request):
+            raise httpx.PoolTimeout("Timed out waiting for the limits", request=request)
+
+        fetcher = AsyncFeedFetcher(transport=httpx.MockTransport(handler))
+        (result,) = FeedRefreshPipeline(fetcher).run([self.feed])
+
+        self.assertTrue(result.deferred)
+        self.assertIsInstance(result.error, httpx.PoolTimeout)
+
+    def test_run_stops_fetching_when_persisting_fails(self):
+        feeds = [FeedFactory.create(xml_url=f"https://example.com/{index}.xml") for index in range(10)]
+        requests = []
+
+        def handler(request):
+            requests.append(request)
+            time.sleep(0.05)
+            return self._handler(request)
+
+        fetcher = AsyncFeedFetcher(concurrency=1, transport=httpx.MockTransport(handler))
+        with patch.object(FeedRefreshPipeline, "_persist", side_effect=RuntimeError("persist failed")):
+            with self.assertRaises(RuntimeError):
+                FeedRefreshPipeline(fetcher, queue_size=1).run(feeds)
+
+        self.assertNotIn("feed-pipeline-fetch", [thread.name for thread in threading.enumerate()])
+        made_requests = len(requests)
+        time.sleep(0.3)
+        self.assertEqual(len(requests), made_requests)
+        self.assertLess(made_requests, len(feeds))
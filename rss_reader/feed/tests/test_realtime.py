@@ -0,0 +1,106 @@
+import asyncio
+import json
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from asgiref.sync import async_to_sync
+from django.test import TestCase
+from rest_framework.authtoken.models import Token
+
+from config.websocket import websocket_application
+from rss_reader.feed.realtime import Broadcaster, feed_channel, publish, user_channel
+from rss_reader.feed.tests.factories import FeedFactory
+from rss_reader.users.tests.factories import UserFactory
+
+
+def _broadcaster():
+    broadcaster = Broadcaster(url="redis://localhost:6379/0", queue_size=1)
+    broadcaster._pubsub = MagicMock(subscribed=False, subscribe=AsyncMock(), unsubscribe=AsyncMock())
+    return broadcaster
+
+
+def _message(channel, data):
+    return {"type": "message", "channel": channel.encode(), "data": json.dumps(data).encode()}
+
+
+class TestPublish(TestCase):
+    def test_publish_after_commit(self):
+        with patch("rss_reader.feed.realtime._get_client") as mock_get_client:
+            with self.captureOnCommitCallbacks(execute=True):
+                publish(feed_channel(1), {"type": "posts", "feed": 1, "posts": [2], "unread_delta": 1})
+                mock_get_client.return_value.publish.assert_not_called()
+
+        mock_get_client.return_value.publish.assert_called_once_with(
+            "feed:1", '{"type": "posts", "feed": 1, "posts": [2], "unread_delta": 1}'
+        )
+
+    def test_follow_publishes_to_user_channel(self):
+        user = UserFactory()
+        feed = FeedFactory()
+        with patch("rss_reader.feed.models.publish") as mock_publish:
+            feed.follow(user)
+        mock_publish.assert_called_once_with(user_channel(user.pk), {"type": "follow", "feed": feed.pk})
+
+
+class TestBroadcaster(TestCase):
+    @async_to_sync
+    async def test_subscribe_once_per_channel(self):
+        broadcaster = _broadcaster()
+        first_queue, second_queue = broadcaster.queue(), broadcaster.queue()
+
+        await broadcaster.subscribe(first_queue, ["feed:1", "user:1"])
+        await broadcaster.subscribe(second_queue, ["feed:1"])
+        broadcaster._pubsub.subscribe.assert_awaited_once_with("feed:1", "user:1")
+
+        broadcaster._dispatch(_message("feed:1", {"type": "posts"}))
+        broadcaster._dispatch(_message("feed:1", {"type": "posts"}))
+        self.assertEqual(first_queue.get_nowait(), ("feed:1", '{"type": "posts"}'))
+        self.assertEqual(second_queue.qsize(), 1)
+
+        await broadcaster.unsubscribe(first_queue)
+        broadcaster._pubsub.unsubscribe.assert_awaited_once_with("user:1")
+        await broadcaster.unsubscribe(second_queue)
+        broadcaster._pubsub.unsubscribe.assert_awaited_with("feed:1")
+
+
+class TestWebsocketApplication(TestCase):
+    def setUp(self):
+        self.user = UserFactory()
+        self.feed = FeedFactory()
+        self.feed.follow(self.user)
+        self.token = Token.objects.create(user=self.user)
+
+    def _scope(self, query_string=b""):
+        return {"type": "websocket", "path": "/ws/", "headers": [], "query_string": query_string}
+
+    @async_to_sync
+    async def test_push_messages(self):
+        broadcaster = _broadcaster()
+        events, sent = asyncio.Queue(), asyncio.Queue()
+        await events.put({"type": "websocket.connect"})
+        with patch("config.websocket.broadcaster", broadcaster):
+            application = asyncio.create_task(
+                websocket_application(self._scope(f"token={self.token.key}".encode()), events.get, sent.put)
+            )
+            self.assertEqual(await sent.get(), {"type": "websocket.accept"})
+            while not broadcaster._queues:
+                await asyncio.sleep(0.01)
+            self.assertEqual(set(broadcaster._queues), {user_channel(self.user.pk), feed_channel(self.feed.pk)})
+
+            message = {"type": "posts", "feed": self.feed.pk, "posts": [1], "unread_delta": 1}
+            broadcaster._dispatch(_message(feed_channel(self.feed.pk), message))
+            self.assertEqual(json.loads((await sent.get())["text"]), message)
+
+            broadcaster._dispatch(_message(user_channel(self.user.pk), {"type": "unfollow", "feed": self.feed.pk}))
+            await sent.get()
+            self.assertEqual(set(broadcaster._queues), {user_channel(self.user.pk)})
+
+            await events.put({"type": "websocket.disconnect"})
+            await application
+        self.assertFalse(broadcaster._queues)
+
+    @async_to_sync
+    async def test_reject_unauthenticated(self):
+        events, sent = asyncio.Queue(), asyncio.Queue()
+        await events.put({"type": "websocket.connect"})
+        await websocket_application(self._scope(b"token=invalid"), events.get, sent.put)
+        self.assertEqual(await sent.get(), {"type": "websocket.close", "code": 4401})
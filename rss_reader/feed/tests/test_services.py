@@ -1,16 +1,33 @@
+from datetime import datetime, timedelta
+from datetime import timezone as dt_timezone
 from unittest.mock import patch
 
-from django.test import TestCase
+import httpx
+from django.conf import settings
+from django.db import connections
+from django.test import TestCase, override_settings
 from django.utils import timezone
 
+from rss_reader.feed.exceptions import FeedException
 from rss_reader.feed.models import Post
-from rss_reader.feed.services import FeedService
-from rss_reader.feed.tests.factories import FeedFactory
+from rss_reader.feed.parsers import prepare_post_fields
+from rss_reader.feed.services import FeedService, SyncService
+from rss_reader.feed.tests.factories import FeedFactory, PostFactory
+from rss_reader.feed.utils import content_hash
+from rss_reader.users.tests.factories import UserFactory
 
 
 class FeedServiceTestCase(TestCase):
     def setUp(self):
         self.feed = FeedFactory.create(xml_url="https://example.com/feed.xml")
+        self.requests = []
+
+    def _transport(self, status=200, headers=None):
+        def handler(request):
+            self.requests.append(request)
+            return httpx.Response(status, content=b"<rss/>", headers=headers)
+
+        return httpx.MockTransport(handler)
 
     def test_parse_rss_link(self):
         # Mock the feedparser.parse method to return a sample parsed data
@@ -37,7 +54,7 @@ class FeedServiceTestCase(TestCase):
                 ],
             }
 
-            feed_service = FeedService(self.feed)
+            feed_service = FeedService(self.feed, transport=self._transport())
             parsed_data = feed_service.parse_rss_link()
 
             self.assertEqual(parsed_data["feed"]["title"], "Example Feed")
@@ -70,6 +87,10 @@ class FeedServiceTestCase(TestCase):
         self.assertEqual(fields["link"], "https://example.com/post1")
         self.assertEqual(fields["published_time"], timezone.datetime(2022, 1, 1, 12, 0, 0, tzinfo=timezone.utc))
 
+    def test_prepare_post_fields_without_date(self):
+        fields = FeedService(self.feed)._prepare_post_fields({"title": "Post 1", "link": "https://example.com/post1"})
+        self.assertIsNone(fields["published_time"])
+
     def test_update_feed(self):
         # Mock the feedparser.parse method to return a sample parsed data
         with patch("rss_reader.feed.services.feedparser.parse") as mock_parse:
@@ -95,7 +116,7 @@ class FeedServiceTestCase(TestCase):
                 ],
             }
 
-            feed_service = FeedService(self.feed)
+            feed_service = FeedService(self.feed, transport=self._transport())
             count = feed_service.update_feed()
 
             # Check if the feed object is updated
@@ -120,3 +141,264 @@ class FeedServiceTestCase(TestCase):
 
             # Check if the count of newly created posts is correct
             self.assertEqual(count, 2)
+
+    def test_parse_rss_link_sends_stored_validators(self):
+        self.feed.etag = '"abc"'
+        self.feed.last_modified = "Sat, 01 Jan 2022 12:00:00 GMT"
+        with patch("rss_reader.feed.services.feedparser.parse") as mock_parse:
+            mock_parse.return_value = {"feed": {}, "entries": []}
+            FeedService(self.feed, transport=self._transport()).parse_rss_link()
+
+        (request,) = self.requests
+        self.assertEqual(str(request.url), "https://example.com/feed.xml")
+        self.assertEqual(request.headers["If-None-Match"], '"abc"')
+        self.assertEqual(request.headers["If-Modified-Since"], "Sat, 01 Jan 2022 12:00:00 GMT")
+
+    def test_update_feed_stores_validators(self):
+        with patch("rss_reader.feed.services.feedparser.parse") as mock_parse:
+            mock_parse.return_value = {
+                "feed": {"title": "Example Feed", "subtitle": "This is an example feed"},
+                "entries": [],
+            }
+            headers = {"ETag": '"abc"', "Last-Modified": "Sat, 01 Jan 2022 12:00:00 GMT"}
+            FeedService(self.feed, transport=self._transport(headers=headers)).update_feed()
+
+        self.feed.refresh_from_db()
+        self.assertEqual(self.feed.etag, '"abc"')
+        self.assertEqual(self.feed.last_modified, "Sat, 01 Jan 2022 12:00:00 GMT")
+
+    def test_update_feed_not_modified_skips_parsing(self):
+        self.feed.etag = '"abc"'
+        self.feed.save()
+        with patch("rss_reader.feed.services.feedparser.parse") as mock_parse:
+            count = FeedService(self.feed, transport=self._transport(status=304)).update_feed()
+
+        mock_parse.assert_not_called()
+        self.feed.refresh_from_db()
+        self.assertEqual(count, 0)
+        self.assertEqual(self.feed.etag, '"abc"')
+        self.assertFalse(Post.objects.filter(feed=self.feed).exists())
+
+    def test_update_feed_updates_existing_posts(self):
+        PostFactory.create(feed=self.feed, title="Old title", link="https://example.com/post1")
+        user_feed = self.feed.follow(UserFactory.create())
+        with patch("rss_reader.feed.services.feedparser.parse") as mock_parse:
+            mock_parse.return_value = {
+                "feed": {"title": "Example Feed", "subtitle": "This is an example feed"},
+                "entries": [
+                    {
+                        "title": "Post 1",
+                        "summary": "This is the summary of post 1",
+                        "link": "https://example.com/post1",
+                        "published": "2022-01-01T12:00:00Z",
+                    },
+                    {
+                        "title": "Post 2",
+                        "summary": "This is the summary of post 2",
+                        "link": "https://example.com/post2",
+                        "published": "2022-01-02T12:00:00Z",
+                    },
+                    {
+                        "title": "Post 2 (edited)",
+                        "summary": "This is the summary of post 2",
+                        "link": "https://example.com/post2",
+                        "published": "2022-01-02T12:00:00Z",
+                    },
+                ],
+            }
+            count = FeedService(self.feed, transport=self._transport()).update_feed()
+
+        self.assertEqual(count, 1)
+        self.assertEqual(Post.objects.filter(feed=self.feed).count(), 2)
+        user_feed.refresh_from_db()
+        self.assertEqual((user_feed.unread_count, user_feed.total_count), (2, 2))
+        self.assertEqual(user_feed.timeline_entries.count(), 2)
+        self.assertEqual(
+            list(Post.objects.search("edited").values_list("link", flat=True)), ["https://example.com/post2"]
+        )
+        self.assertEqual(Post.objects.get(link="https://example.com/post1").title, "Post 1")
+        self.assertEqual(Post.objects.get(link="https://example.com/post2").title, "Post 2 (edited)")
+
+    def test_update_feed_from_response(self):
+        content = b"""<?xml version="1.0"?>
+<rss version="2.0"><channel>
+<title>Example Feed</title><link>https://example.com</link><description>This is an example feed</description>
+<item><title>Post 1</title><link>https://example.com/post1</link><description>Summary 1</description>
+<pubDate>Sat, 01 Jan 2022 12:00:00 GMT</pubDate></item>
+</channel></rss>
+"""
+        count = FeedService(self.feed).update_feed_from_response(
+            200, content, {"content-type": "application/rss+xml", "etag": '"abc"'}
+        )
+
+        self.feed.refresh_from_db()
+        self.assertEqual(count, 1)
+        self.assertEqual(self.feed.title, "Example Feed")
+        self.assertEqual(self.feed.etag, '"abc"')
+        self.assertEqual(Post.objects.get(feed=self.feed).title, "Post 1")
+
+    def test_parse_rss_link_error_status(self):
+        with self.assertRaises(FeedException):
+            FeedService(self.feed, transport=self._transport(status=404)).parse_rss_link()
+
+    def test_update_feed_from_response_not_modified(self):
+        count = FeedService(self.feed).update_feed_from_response(304, b"", {})
+        self.assertEqual(count, 0)
+        self.assertFalse(Post.objects.filter(feed=self.feed).exists())
+
+    def test_update_feed_from_response_error_status(self):
+        with self.assertRaises(FeedException):
+            FeedService(self.feed).update_feed_from_response(500, b"", {})
+
+    def _stream_transport(self, items, status=200):
+        def handler(request):
+            self.assertEqual(request.headers.get("If-None-Match"), self.feed.etag or None)
+            items_content = "".join(
+                f"<item><title>Post {index}</title><link>https://example.com/post{index}</link>"
+                f"<description>Summary {index}</description><pubDate>Sat, 01 Jan 2022 12:00:00 GMT</pubDate></item>"
+                for index in items
+            )
+            content = f"<rss><channel><title>Example Feed</title><description>Example</description>{items_content}"
+            content += "</channel></rss>"
+            return httpx.Response(status, content=content.encode(), headers={"ETag": '"new"'})
+
+        return httpx.MockTransport(handler)
+
+    @override_settings(FEED_STREAM_KNOWN_RUN=2)
+    def test_update_feed_streaming_stops_at_known_entries(self):
+        published_time = datetime(2022, 1, 1, 12, tzinfo=dt_timezone.utc)
+        for index in (3, 2):
+            fields = {
+                "title": f"Post {index}",
+                "description": f"Summary {index}",
+                "link": f"https://example.com/post{index}",
+                "published_time": published_time,
+            }
+            PostFactory.create(feed=self.feed, content_hash=content_hash(**fields), **fields)
+
+        with patch.object(FeedService, "save_prepared_data", return_value=0) as mock_save_prepared_data:
+            FeedService(self.feed, transport=self._stream_transport(range(5, 0, -1))).update_feed(streaming=True)
+
+        feed_fields, posts_fields, response = mock_save_prepared_data.call_args.args
+        self.assertEqual(feed_fields["title"], "Example Feed")
+        links = [fields["link"] for fields in posts_fields]
+        self.assertEqual(links, [f"https://example.com/post{index}" for index in (5, 4, 3, 2)])
+        self.assertEqual(response["etag"], '"new"')
+
+    def test_update_feed_streaming(self):
+        count = FeedService(self.feed, transport=self._stream_transport([2, 1])).update_feed(streaming=True)
+
+        self.assertEqual(count, 2)
+        post = Post.objects.get(link="https://example.com/post1")
+        self.assertEqual(
+            post.content_hash,
+            content_hash("Post 1", "Summary 1", post.link, datetime(2022, 1, 1, 12, tzinfo=dt_timezone.utc)),
+        )
+
+    def test_update_feed_streaming_prepares_entries_once(self):
+        transport = self._stream_transport([3, 2, 1])
+        with patch.object(FeedService, "_prepare_post_fields", wraps=prepare_post_fields) as mock_prepare:
+            count = FeedService(self.feed, transport=transport).update_feed(streaming=True)
+
+        self.assertEqual(count, 3)
+        self.assertEqual(mock_prepare.call_count, 3)
+
+    def test_update_feed_skips_unchanged_posts(self):
+        FeedService(self.feed, transport=self._stream_transport([2, 1])).update_feed(streaming=True)
+        unchanged = Post.objects.get(link="https://example.com/post1")
+        Post.objects.filter(link="https://example.com/post2").update(title="Old title", content_hash="")
+
+        with patch.object(self.feed, "invalidate_responses") as mock_invalidate_responses:
+            count = FeedService(self.feed, transport=self._stream_transport([2, 1])).update_feed(streaming=True)
+        self.assertEqual(count, 0)
+        mock_invalidate_responses.assert_called_once_with()
+        post = Post.objects.get(link="https://example.com/post1")
+        self.assertEqual((post.last_update, post.change_seq), (unchanged.last_update, unchanged.change_seq))
+        self.assertEqual(Post.objects.get(link="https://example.com/post2").title, "Post 2")
+
+        with patch.object(self.feed, "invalidate_responses") as mock_invalidate_responses:
+            FeedService(self.feed, transport=self._stream_transport([2, 1])).update_feed(streaming=True)
+        mock_invalidate_responses.assert_not_called()
+
+    def test_update_feed_saves_posts_atomically(self):
+        with patch("rss_reader.feed.services.TimelineEntry.objects.fan_out", side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                FeedService(self.feed, transport=self._stream_transport([2, 1])).update_feed(streaming=True)
+
+        self.assertFalse(Post.objects.filter(feed=self.feed).exists())
+        self.feed.refresh_from_db()
+        self.assertNotEqual(self.feed.etag, '"new"')
+
+    def test_update_feed_streaming_not_modified(self):
+        count = FeedService(self.feed, transport=self._stream_transport([1], status=304)).update_feed(streaming=True)
+        self.assertEqual(count, 0)
+        self.assertFalse(Post.objects.filter(feed=self.feed).exists())
+
+    def test_update_feed_streaming_error_status(self):
+        with self.assertRaises(FeedException):
+            FeedService(self.feed, transport=self._stream_transport([], status=500)).update_feed(streaming=True)
+
+    def test_schedule_next_refresh_follows_posting_rate(self):
+        now = timezone.now()
+        for hours in range(0, 6, 2):
+            PostFactory.create(feed=self.feed, published_time=now - timedelta(hours=hours))
+        self.feed.last_refresh_at = now
+
+        FeedService(self.feed)._schedule_next_refresh({})
+
+        self.assertEqual(self.feed.next_refresh_at, now + timedelta(hours=2))
+
+    def test_schedule_next_refresh_respects_cache_headers(self):
+        now = timezone.now()
+        self.feed.last_refresh_at = now
+
+        FeedService(self.feed)._schedule_next_refresh({"Cache-Control": "public, max-age=7200"})
+
+        self.assertEqual(self.feed.next_refresh_at, now + timedelta(hours=2))
+
+    def test_schedule_next_refresh_is_bounded(self):
+        now = timezone.now()
+        self.feed.last_refresh_at = now
+
+        FeedService(self.feed)._schedule_next_refresh({"Cache-Control": "max-age=31536000"})
+
+        self.assertEqual(self.feed.next_refresh_at, now + timedelta(seconds=settings.FEED_REFRESH_MAX_INTERVAL))
+
+
+class SyncServiceTestCase(TestCase):
+    def setUp(self):
+        self.user = UserFactory.create()
+        self.feed = FeedFactory.create()
+        self.feed.follow(self.user)
+
+    def test_changes_since_stops_before_uncommitted_changes(self):
+        writer = connections.create_connection("default")
+        self.addCleanup(writer.close)
+        writer.set_autocommit(False)
+        with writer.cursor() as cursor:
+            # Takes a change sequence value in a transaction that isn't committed yet.
+            cursor.execute("SELECT feed_next_change_seq()")
+            (uncommitted,) = cursor.fetchone()
+        post = PostFactory.create(feed=self.feed)
+        self.assertGreater(post.change_seq, uncommitted)
+
+        changes = SyncService(self.user).changes_since()
+        self.assertLess(changes["position"], uncommitted)
+        self.assertNotIn(post, changes["posts"])
+
+        writer.rollback()
+        changes = SyncService(self.user).changes_since(changes["position"])
+        self.assertGreaterEqual(changes["position"], post.change_seq)
+        self.assertIn(post, changes["posts"])
+
+    def test_changes_since_ignores_other_advisory_locks(self):
+        other = connections.create_connection("default")
+        self.addCleanup(other.close)
+        with other.cursor() as cursor:
+            # Advisory locks of another application, including the two keys form with a key of the same size.
+            cursor.execute("SELECT pg_advisory_lock(1), pg_advisory_lock(0, 1)")
+        post = PostFactory.create(feed=self.feed)
+
+        changes = SyncService(self.user).changes_since()
+        self.assertGreaterEqual(changes["position"], post.change_seq)
+        self.assertIn(post, changes["posts"])
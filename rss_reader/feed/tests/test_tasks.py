@@ -0,0 +1,209 @@
+import json
+from datetime import timedelta
+from unittest.mock import patch
+
+import httpx
+from celery.exceptions import SoftTimeLimitExceeded
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from rss_reader.feed.leases import _get_client, claim_refresh, refresh_lease_key, release_refresh
+from rss_reader.feed.models import Feed
+from rss_reader.feed.pipeline import RefreshResult
+from rss_reader.feed.tasks import periodic_update_feeds_task, refresh_feed, refresh_feeds_batch, request_refresh
+from rss_reader.feed.tests.factories import FeedFactory, UserFeedFactory
+
+
+class PeriodicUpdateFeedsTaskTestCase(TestCase):
+    def setUp(self):
+        self.now = timezone.now()
+        self.due_feed = FeedFactory.create(next_refresh_at=self.now - timedelta(minutes=1))
+        self.later_feed = FeedFactory.create(next_refresh_at=self.now + timedelta(hours=1))
+        self.unfollowed_feed = FeedFactory.create(next_refresh_at=self.now - timedelta(minutes=1))
+        UserFeedFactory.create(feed=self.due_feed)
+        UserFeedFactory.create(feed=self.later_feed)
+
+    @override_settings(FEED_REFRESH_BATCH_SIZE=0)
+    @patch.object(periodic_update_feeds_task, "send_event")
+    @patch("rss_reader.feed.tasks.refresh_feed.s")
+    @patch("rss_reader.feed.tasks.group")
+    def test_enqueues_due_feeds_only(self, mock_group, mock_signature, mock_send_event):
+        UserFeedFactory.create_batch(3, feed=self.due_feed)
+
+        periodic_update_feeds_task()
+
+        list(mock_group.call_args.args[0])  # consume the signatures generator
+        mock_signature.assert_called_once_with(self.due_feed.id)
+        mock_send_event.assert_called_once_with("feeds-enqueued", count=1)
+        self.due_feed.refresh_from_db()
+        self.assertGreater(self.due_feed.next_refresh_at, self.now)
+
+    @patch.object(periodic_update_feeds_task, "send_event")
+    @patch("rss_reader.feed.tasks.refresh_feeds_batch.delay")
+    def test_enqueues_batches(self, mock_delay, mock_send_event):
+        other_feed = FeedFactory.create(next_refresh_at=self.now - timedelta(minutes=2))
+        UserFeedFactory.create(feed=other_feed)
+
+        with self.settings(FEED_REFRESH_BATCH_SIZE=1):
+            periodic_update_feeds_task()
+
+        self.assertEqual(mock_delay.call_count, 2)
+        mock_delay.assert_any_call([other_feed.id])
+        mock_delay.assert_any_call([self.due_feed.id])
+        mock_send_event.assert_called_once_with("feeds-enqueued", count=2)
+
+    @patch.object(periodic_update_feeds_task, "send_event")
+    @patch("rss_reader.feed.tasks.group")
+    def test_nothing_due(self, mock_group, mock_send_event):
+        self.due_feed.next_refresh_at = self.now + timedelta(hours=1)
+        self.due_feed.save()
+
+        self.assertEqual(periodic_update_feeds_task(), "No Feeds to update")
+        mock_group.assert_not_called()
+        mock_send_event.assert_called_once_with("feeds-enqueued", count=0)
+
+
+class RefreshFeedTaskTestCase(TestCase):
+    def setUp(self):
+        self.feed = FeedFactory.create()
+        # Feed ids are reused from one test database to the next.
+        _get_client().delete(refresh_lease_key(self.feed.id))
+        self.addCleanup(_get_client().delete, refresh_lease_key(self.feed.id))
+
+    @patch("rss_reader.feed.tasks.FeedService.update_feed")
+    def test_refresh_releases_lease(self, mock_update_feed):
+        refresh_feed(self.feed.id)
+
+        mock_update_feed.assert_called_once()
+        self.assertEqual(claim_refresh(self.feed.id, "next"), "next")
+
+    @patch("rss_reader.feed.tasks.FeedService.update_feed")
+    def test_refresh_coalesced_into_running_one(self, mock_update_feed):
+        claim_refresh(self.feed.id, "running")
+
+        result = refresh_feed(self.feed.id)
+
+        mock_update_feed.assert_not_called()
+        self.assertEqual(json.loads(result), {"detail": "Coalesced into task: running"})
+        self.assertEqual(claim_refresh(self.feed.id, "next"), "running")
+
+    @patch("rss_reader.feed.tasks.refresh_feed.apply_async")
+    def test_request_refresh_coalesces(self, mock_apply_async):
+        with self.captureOnCommitCallbacks(execute=True):
+            task_id, refresh_status = request_refresh(self.feed.id)
+            self.assertEqual(refresh_status, "queued")
+            # Enqueued once the transaction is committed.
+            mock_apply_async.assert_not_called()
+
+        self.assertEqual(request_refresh(self.feed.id), (task_id, "coalesced"))
+        mock_apply_async.assert_called_once_with((self.feed.id,), task_id=task_id)
+
+        release_refresh(self.feed.id, task_id)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertNotEqual(request_refresh(self.feed.id)[0], task_id)
+        self.assertEqual(mock_apply_async.call_count, 2)
+
+    @patch("rss_reader.feed.tasks.refresh_feed.apply_async")
+    def test_request_refresh_batched(self, mock_apply_async):
+        claim_refresh(self.feed.id, "batch:running")
+
+        self.assertEqual(request_refresh(self.feed.id), (None, "batched"))
+        mock_apply_async.assert_not_called()
+
+
+class RefreshFeedsBatchTaskTestCase(TestCase):
+    def setUp(self):
+        self.feeds = FeedFactory.create_batch(3)
+        for feed in self.feeds:
+            _get_client().delete(refresh_lease_key(feed.id))
+            self.addCleanup(_get_client().delete, refresh_lease_key(feed.id))
+
+    @patch("rss_reader.feed.tasks.request_refresh")
+    @patch("rss_reader.feed.tasks.FeedRefreshPipeline.run")
+    def test_refresh_batch(self, mock_run, mock_request_refresh):
+        updated_feed, failed_feed, leased_feed = self.feeds
+        claim_refresh(leased_feed.id, "running")
+        mock_run.return_value = [
+            RefreshResult(feed_id=updated_feed.id, created=2),
+            RefreshResult(feed_id=failed_feed.id, error=ValueError("value too long")),
+        ]
+
+        result = refresh_feeds_batch([feed.id for feed in self.feeds])
+
+        self.assertEqual(
+            json.loads(result), {"updated": 1, "failed": 1, "deferred": 0, "skipped": 1, "created_posts": 2}
+        )
+        self.assertEqual(set(mock_run.call_args.args[0]), {updated_feed, failed_feed})
+        mock_request_refresh.assert_called_once_with(failed_feed.id)
+        # Only the lease of the other task is left.
+        self.assertEqual(claim_refresh(updated_feed.id, "next"), "next")
+        self.assertEqual(claim_refresh(leased_feed.id, "next"), "running")
+
+    @patch("rss_reader.feed.tasks.request_refresh")
+    @patch("rss_reader.feed.tasks.FeedRefreshPipeline.run")
+    def test_refresh_batch_defers_busy_hosts(self, mock_run, mock_request_refresh):
+        updated_feed, deferred_feed, _ = self.feeds
+        mock_run.return_value = [
+            RefreshResult(feed_id=updated_feed.id),
+            RefreshResult(feed_id=deferred_feed.id, error=httpx.PoolTimeout("busy"), deferred=True),
+        ]
+
+        result = refresh_feeds_batch([updated_feed.id, deferred_feed.id])
+
+        self.assertEqual(json.loads(result)["deferred"], 1)
+        mock_request_refresh.assert_not_called()
+        deferred_feed.refresh_from_db()
+        self.assertGreater(deferred_feed.next_refresh_at, timezone.now() + timedelta(minutes=4))
+        self.assertEqual(claim_refresh(deferred_feed.id, "next"), "next")
+
+    @patch("rss_reader.feed.tasks.FeedRefreshPipeline.run", side_effect=SoftTimeLimitExceeded)
+    def test_refresh_batch_soft_time_limit(self, mock_run):
+        refreshed_feed, *pending_feeds = self.feeds
+        Feed.objects.filter(id=refreshed_feed.id).update(last_refresh_at=timezone.now() + timedelta(seconds=1))
+
+        with self.assertLogs("rss_reader.feed.tasks", "WARNING"):
+            result = refresh_feeds_batch([feed.id for feed in self.feeds])
+
+        self.assertEqual(json.loads(result)["deferred"], 2)
+        later = timezone.now() + timedelta(minutes=4)
+        self.assertEqual(
+            set(Feed.objects.filter(next_refresh_at__gt=later).values_list("id", flat=True)),
+            {feed.id for feed in pending_feeds},
+        )
+        self.assertEqual(claim_refresh(refreshed_feed.id, "next"), "next")
+
+    @patch("rss_reader.feed.tasks.request_refresh")
+    @patch("rss_reader.feed.tasks.FeedRefreshPipeline.run")
+    def test_refresh_batch_soft_time_limit_after_results(self, mock_run, mock_request_refresh):
+        failed_feed, deferred_feed, pending_feed = self.feeds
+
+        def run(feeds):
+            yield RefreshResult(feed_id=failed_feed.id, error=ValueError("value too long"))
+            yield RefreshResult(feed_id=deferred_feed.id, error=httpx.PoolTimeout("busy"), deferred=True)
+            raise SoftTimeLimitExceeded
+
+        mock_run.side_effect = run
+        with self.assertLogs("rss_reader.feed.tasks", "WARNING"):
+            result = refresh_feeds_batch([feed.id for feed in self.feeds])
+
+        self.assertEqual(
+            json.loads(result), {"updated": 0, "failed": 1, "deferred": 2, "skipped": 0, "created_posts": 0}
+        )
+        mock_request_refresh.assert_called_once_with(failed_feed.id)
+        later = timezone.now() + timedelta(minutes=4)
+        self.assertEqual(
+            set(Feed.objects.filter(next_refresh_at__gt=later).values_list("id", flat=True)),
+            {deferred_feed.id, pending_feed.id},
+        )
+
+    @patch("rss_reader.feed.tasks.FeedRefreshPipeline.run")
+    def test_refresh_requested_during_batch(self, mock_run):
+        feed = self.feeds[0]
+
+        def run(feeds):
+            self.assertEqual(request_refresh(feed.id), (None, "batched"))
+            return [RefreshResult(feed_id=feed.id)]
+
+        mock_run.side_effect = run
+        refresh_feeds_batch([feed.id])
+        mock_run.assert_called_once()
@@ -1,11 +1,36 @@
+from datetime import timedelta
+from unittest.mock import patch
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils import timezone
 from rest_framework import status
 from rest_framework.test import APITestCase
 
-from rss_reader.feed.models import UserFeed
+from rss_reader.feed.api.serializers import PostOutputSerializer
+from rss_reader.feed.leases import _get_client, refresh_lease_key
+from rss_reader.feed.models import Feed, NextChangeSeq, Post, UserFeed
 from rss_reader.feed.tests.factories import FeedFactory, PostFactory, UserFactory
 
 
+def _page_query_plan(client, url, params=None):
+    """
+    Plan of the page query of a keyset paginated listing. Sorts and sequential scans are disabled, so the
+    plan only sorts when no index provides the order.
+    """
+    with CaptureQueriesContext(connection) as queries:
+        client.get(url, params)
+    sql = next(query["sql"] for query in queries if "ORDER BY" in query["sql"] and "LIMIT" in query["sql"])
+    with connection.cursor() as cursor:
+        cursor.execute("SET LOCAL enable_seqscan = off")
+        cursor.execute("SET LOCAL enable_sort = off")
+        cursor.execute(f"EXPLAIN {sql}")
+        return "\n".join(row for (row,) in cursor.fetchall())
+
+
 class TestFeedViewSet(APITestCase):
     def setUp(self):
         # Create a test user and authenticate
@@ -20,6 +45,40 @@ class TestFeedViewSet(APITestCase):
         response = self.client.get(url)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
 
+    def test_list_feeds_etag(self):
+        url = reverse("feeds:feed-list")
+        response = self.client.get(url)
+        etag = response["ETag"]
+
+        # Only the savepoint of ATOMIC_REQUESTS is left.
+        with self.assertNumQueries(2):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        with self.assertNumQueries(2):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            FeedFactory().follow(self.user)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_list_feeds_etag_follows_content(self):
+        url = reverse("feeds:feed-list")
+        etag = self.client.get(url)["ETag"]
+
+        # Recomputed after the cache entry expired, without a new version of the responses.
+        Feed.objects.filter(pk=self.feed.pk).update(title="Renamed")
+        cache.clear()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response["ETag"], etag)
+
+        cache.clear()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
     def test_retrieve_feed(self):
         url = reverse("feeds:feed-detail", args=[self.feed.pk])
         response = self.client.get(url)
@@ -34,6 +93,32 @@ class TestFeedViewSet(APITestCase):
         response = self.client.post(url, new_feed_data)
         self.assertEqual(response.status_code, status.HTTP_201_CREATED)
 
+    @patch("rss_reader.feed.tasks.refresh_feed.apply_async")
+    def test_create_feed_refreshes_on_commit(self, mock_apply_async):
+        url = reverse("feeds:feed-list")
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.client.post(url, {"xml_url": "https://example.com/new-feed.xml"})
+        mock_apply_async.assert_not_called()
+
+        feed = Feed.objects.get(xml_url="https://example.com/new-feed.xml")
+        self.addCleanup(_get_client().delete, refresh_lease_key(feed.pk))
+        for callback in callbacks:
+            callback()
+        mock_apply_async.assert_called_once()
+        self.assertEqual(mock_apply_async.call_args.args, ((feed.pk,),))
+
+    def test_create_existing_feed_subscribes_user(self):
+        other_user = UserFactory()
+        self.client.force_authenticate(other_user)
+        url = reverse("feeds:feed-list")
+        response = self.client.post(url, {"xml_url": self.feed.xml_url})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Feed.objects.filter(normalized_url=self.feed.normalized_url).count(), 1)
+        self.assertTrue(UserFeed.objects.filter(user=other_user, feed=self.feed).exists())
+
+        response = self.client.get(url)
+        self.assertEqual([feed["id"] for feed in response.json()["results"]], [self.feed.pk])
+
     def test_update_feed(self):
         url = reverse("feeds:feed-detail", args=[self.feed.pk])
         updated_data = {"title": "Updated Feed", "description": "Updated Description"}
@@ -62,16 +147,115 @@ class TestFeedViewSet(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
         self.assertEqual(response.json()["non_field_errors"], "You're not following this feed.")
 
+    def test_retrieve_feed_posts_keyset_pagination(self):
+        now = timezone.now()
+        posts = [
+            PostFactory(feed=self.feed, last_update=now),
+            PostFactory(feed=self.feed, last_update=now),
+            PostFactory(feed=self.feed, last_update=now - timedelta(hours=1)),
+            PostFactory(feed=self.feed, last_update=None),
+        ]
+        expected = [posts[1].pk, posts[0].pk, posts[2].pk, posts[3].pk]
+
+        url = reverse("feeds:feed-posts", args=[self.feed.pk])
+        received = []
+        while url:
+            response = self.client.get(url, {"page_size": 1} if not received else None)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            received += [post["id"] for post in response.json()["results"]]
+            url = response.json()["next"]
+        self.assertEqual(received, expected)
+
+    def test_retrieve_feed_posts_page_uses_index(self):
+        plan = _page_query_plan(self.client, reverse("feeds:feed-posts", args=[self.feed.pk]))
+        self.assertIn("post_feed_last_update_id_idx", plan)
+        self.assertNotIn("Sort", plan)
+
+    def test_retrieve_feed_posts_invalid_cursor(self):
+        url = reverse("feeds:feed-posts", args=[self.feed.pk])
+        response = self.client.get(url, {"cursor": "invalid"})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_unread_counts(self):
+        PostFactory.create_batch(2, feed=self.feed)
+        self.feed.follow(self.user)
+        self.feed.posts.first().mark_as_read(self.user)
+
+        url = reverse("feeds:feed-unread-counts")
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json(), [{"feed": self.feed.pk, "unread_count": 1, "total_count": 2}])
+
+    def test_mark_all_read(self):
+        self.feed.follow(self.user)
+        post = PostFactory(feed=self.feed)
+        url = reverse("feeds:feed-mark-all-read", args=[self.feed.pk])
+        response = self.client.post(url, {"older_than": "2000-01-01T00:00:00Z"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertFalse(Post.objects.read_by(self.user).exists())
+
+        response = self.client.post(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(list(Post.objects.read_by(self.user)), [post])
+
+    def test_mark_all_read_not_followed_feed_raises_error(self):
+        url = reverse("feeds:feed-mark-all-read", args=[self.feed.pk])
+        response = self.client.post(url)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
     def test_force_update_feed(self):
         url = reverse("feeds:feed-force-update", args=[self.feed.pk])
         response = self.client.put(url)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
 
+    @patch("rss_reader.feed.tasks.refresh_feed.apply_async")
+    def test_force_update_feed_coalesces(self, mock_apply_async):
+        _get_client().delete(refresh_lease_key(self.feed.pk))
+        self.addCleanup(_get_client().delete, refresh_lease_key(self.feed.pk))
+        url = reverse("feeds:feed-force-update", args=[self.feed.pk])
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            response = self.client.put(url)
+        task_id = response.json()["refresh_task_id"]
+        self.assertEqual(response.json()["refresh_status"], "queued")
+        self.assertEqual(len(callbacks), 1)
+
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            response = self.client.put(url)
+        self.assertEqual(response.json()["refresh_task_id"], task_id)
+        self.assertEqual(response.json()["refresh_status"], "coalesced")
+        self.assertEqual(callbacks, [])
+        mock_apply_async.assert_called_once_with((self.feed.pk,), task_id=task_id)
+
     def test_retrieve_feed_posts(self):
         url = reverse("feeds:feed-posts", args=[self.feed.pk])
         response = self.client.get(url)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
 
+    def test_retrieve_feed_posts_matches_model_serializer(self):
+        PostFactory(feed=self.feed, published_time=timezone.now(), last_update=None)
+        url = reverse("feeds:feed-posts", args=[self.feed.pk])
+        response = self.client.get(url)
+        self.assertEqual(response.json()["results"], PostOutputSerializer(self.feed.posts.all(), many=True).data)
+
+    def test_retrieve_feed_posts_sparse_fields(self):
+        post = PostFactory(feed=self.feed)
+        url = reverse("feeds:feed-posts", args=[self.feed.pk])
+        response = self.client.get(url, {"fields": "title,id,unknown"})
+        self.assertEqual(response.json()["results"], [{"id": post.pk, "title": post.title}])
+
+    def test_retrieve_feed_posts_excerpt(self):
+        PostFactory(feed=self.feed, description="<p>Lorem  <b>ipsum</b>\n dolor</p>" * 100)
+        url = reverse("feeds:feed-posts", args=[self.feed.pk])
+
+        with override_settings(POST_EXCERPT_LENGTH=20):
+            response = self.client.get(url, {"fields": "description", "excerpt": "true"})
+        self.assertEqual(response.json()["results"], [{"description": "Lorem ipsum dolorLo…"}])
+
+    def test_retrieve_feed_sparse_fields(self):
+        url = reverse("feeds:feed-detail", args=[self.feed.pk])
+        response = self.client.get(url, {"fields": "id,title"})
+        self.assertEqual(response.json(), {"id": self.feed.pk, "title": self.feed.title})
+
 
 class TestPostViewSet(APITestCase):
     def setUp(self):
@@ -85,8 +269,8 @@ class TestPostViewSet(APITestCase):
         url = reverse("feeds:posts-mark-as-read", args=[self.post.pk])
         response = self.client.post(url)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        user_feed = UserFeed.objects.filter(user=self.user, feed=self.feed, read_posts__in=[self.post])
-        self.assertTrue(user_feed.exists())
+        user_feed = UserFeed.objects.get(user=self.user, feed=self.feed)
+        self.assertTrue(user_feed.is_read(self.post))
 
     def test_mark_read_posts_as_read(self):
         self.post.mark_as_read(self.user)
@@ -100,7 +284,7 @@ class TestPostViewSet(APITestCase):
         url = reverse("feeds:posts-mark-as-unread", args=[self.post.pk])
         response = self.client.post(url)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertFalse(self.post.read_posts.filter(pk=self.post.pk).exists())
+        self.assertFalse(Post.objects.read_by(self.user).filter(pk=self.post.pk).exists())
 
     def test_mark_unread_posts_as_unread(self):
         self.post.mark_as_read(self.user)
@@ -109,3 +293,134 @@ class TestPostViewSet(APITestCase):
         response = self.client.post(url)
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
         self.assertEqual(response.json()["non_field_errors"], "You've already marked this feed post as unread.")
+
+    def test_mark_as_read_unfollowed_feed(self):
+        # The creator still sees the posts of the feed after unfollowing it.
+        self.feed.unfollow(self.user)
+        for action in ("mark-as-read", "mark-as-unread"):
+            response = self.client.post(reverse(f"feeds:posts-{action}", args=[self.post.pk]))
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertEqual(response.json()["non_field_errors"], "You're not following this feed.")
+
+    def test_list_posts_matches_model_serializer(self):
+        PostFactory(feed=self.feed, published_time=timezone.now(), last_update=None)
+        PostFactory(title="Not followed")
+        response = self.client.get(reverse("feeds:posts-list"))
+        self.assertEqual(
+            response.json()["results"],
+            PostOutputSerializer(Post.objects.filter(feed=self.feed).order_by("-last_update", "-id"), many=True).data,
+        )
+
+    def test_search(self):
+        title_match = PostFactory.create(title="Postgres search", description="Ranking", feed=self.feed)
+        description_match = PostFactory.create(
+            title="Databases", description="Searching with Postgres", feed=self.feed
+        )
+        PostFactory.create(title="Postgres search", description="Not followed")
+        Post.objects.update_search_vector()
+
+        url = reverse("feeds:posts-search")
+        received = []
+        while url:
+            response = self.client.get(url, {"q": "postgres searches", "page_size": 1} if not received else None)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            received += [post["id"] for post in response.json()["results"]]
+            url = response.json()["next"]
+        self.assertEqual(received, [title_match.pk, description_match.pk])
+
+        response = self.client.get(reverse("feeds:posts-search"), {"q": "postgres -ranking"})
+        self.assertEqual([post["id"] for post in response.json()["results"]], [description_match.pk])
+
+    def test_search_without_query(self):
+        response = self.client.get(reverse("feeds:posts-search"))
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class TestTimelineViewSet(APITestCase):
+    def setUp(self):
+        self.user = UserFactory()
+        self.client.force_authenticate(self.user)
+        self.feed, self.other_feed = FeedFactory.create_batch(2)
+
+    def test_list_timeline(self):
+        now = timezone.now()
+        older_post = PostFactory(feed=self.feed, published_time=now - timedelta(days=1))
+        newer_post = PostFactory(feed=self.other_feed, published_time=now)
+        self.feed.follow(self.user)
+        self.other_feed.follow(self.user)
+        PostFactory(feed=FeedFactory(), published_time=now)
+
+        url = reverse("feeds:timeline-list")
+        received = []
+        while url:
+            response = self.client.get(url, {"page_size": 1} if not received else None)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            received += [entry["post"]["id"] for entry in response.json()["results"]]
+            url = response.json()["next"]
+        self.assertEqual(received, [newer_post.pk, older_post.pk])
+
+        newer_post.mark_as_read(self.user)
+        response = self.client.get(reverse("feeds:timeline-list"), {"read": False})
+        self.assertEqual([entry["post"]["id"] for entry in response.json()["results"]], [older_post.pk])
+
+        self.other_feed.unfollow(self.user)
+        response = self.client.get(reverse("feeds:timeline-list"))
+        self.assertEqual([entry["post"]["id"] for entry in response.json()["results"]], [older_post.pk])
+
+    def test_list_timeline_page_uses_index(self):
+        self.feed.follow(self.user)
+        plan = _page_query_plan(self.client, reverse("feeds:timeline-list"))
+        self.assertIn("timeline_user_sort_idx", plan)
+        self.assertNotIn("Sort", plan)
+
+
+class TestSyncViewSet(APITestCase):
+    def setUp(self):
+        self.user = UserFactory()
+        self.client.force_authenticate(self.user)
+        self.feed = FeedFactory()
+        self.post, self.other_post = PostFactory.create_batch(2, feed=self.feed)
+        self.feed.follow(self.user)
+
+    def _sync(self, token=None):
+        response = self.client.get(reverse("feeds:sync-list"), {"token": token} if token else None)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.json()
+
+    @override_settings(SYNC_PAGE_SIZE=1)
+    def test_sync(self):
+        changes = self._sync()
+        self.assertEqual(([post["id"] for post in changes["posts"]], changes["more"]), ([self.post.pk], True))
+        self.assertEqual(changes["subscriptions"], [])
+        changes = self._sync(changes["token"])
+        self.assertEqual(([post["id"] for post in changes["posts"]], changes["more"]), ([self.other_post.pk], False))
+        self.assertEqual([subscription["feed"] for subscription in changes["subscriptions"]], [self.feed.pk])
+
+        changes = self._sync(changes["token"])
+        self.assertEqual((changes["posts"], changes["subscriptions"], changes["unsubscriptions"]), ([], [], []))
+
+        self.other_post.mark_as_read(self.user)
+        Post.objects.filter(pk=self.post.pk).update(change_seq=NextChangeSeq())
+        changes = self._sync(changes["token"])
+        self.assertEqual([post["id"] for post in changes["posts"]], [self.post.pk])
+        self.assertEqual(
+            changes["subscriptions"],
+            [
+                {
+                    "feed": self.feed.pk,
+                    "unread_count": 1,
+                    "total_count": 2,
+                    "read_up_to": self.post.pk - 1,
+                    "read": [self.other_post.pk],
+                    "unread": [],
+                }
+            ],
+        )
+
+        self.feed.unfollow(self.user)
+        changes = self._sync(changes["token"])
+        self.assertEqual((changes["subscriptions"], changes["unsubscriptions"]), ([], [self.feed.pk]))
+
+    def test_sync_invalid_token(self):
+        response = self.client.get(reverse("feeds:sync-list"), {"token": "invalid"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
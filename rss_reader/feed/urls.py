@@ -1,11 +1,13 @@
 from rest_framework.routers import SimpleRouter
 
-from rss_reader.feed.api.views import FeedViewSet, PostViewSet
+from rss_reader.feed.api.views import FeedViewSet, PostViewSet, SyncViewSet, TimelineViewSet
 
 app_name = "feeds"
 
 router = SimpleRouter()
 router.register("posts", PostViewSet, basename="posts")
+router.register("timeline", TimelineViewSet, basename="timeline")
+router.register("sync", SyncViewSet, basename="sync")
 router.register("", FeedViewSet, basename="feed")
 
 urlpatterns = [] + router.urls
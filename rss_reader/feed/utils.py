@@ -0,0 +1,47 @@
+import hashlib
+from urllib.parse import urlsplit, urlunsplit
+
+DEFAULT_PORTS = {"http": 80, "https": 443}
+
+
+def normalize_feed_url(url):
+    """
+    Normalize a feed URL so that different spellings of the same feed share one key.
+
+    The scheme and host are lower-cased, default ports and fragments are dropped,
+    and an empty path becomes "/".
+
+    Parameters:
+        url (str): Feed URL as provided by the user
+
+    Returns:
+        normalized_url (str): Canonical form of the URL
+    """
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    netloc = (parts.hostname or "").lower()
+    if parts.port and parts.port != DEFAULT_PORTS.get(scheme):
+        netloc = f"{netloc}:{parts.port}"
+    if parts.username:
+        userinfo = parts.username if parts.password is None else f"{parts.username}:{parts.password}"
+        netloc = f"{userinfo}@{netloc}"
+    return urlunsplit((scheme, netloc, parts.path or "/", parts.query, ""))
+
+
+def content_hash(title, description, link, published_time):
+    """
+    Fingerprint of the content of a post, telling whether a fetched entry differs from the stored post.
+
+    The `0028_populate_post_content_hash_link_published_time` migration computes the same hash in SQL.
+
+    Parameters:
+        title (str): Post title
+        description (str): Post description
+        link (str): Post link
+        published_time (datetime): Post publication time, compared to the second
+
+    Returns:
+        hash (str): Hex SHA-256 of the fields separated by NUL bytes
+    """
+    published = str(int(published_time.timestamp())) if published_time else ""
+    return hashlib.sha256("\0".join((title or "", description or "", link or "", published)).encode()).hexdigest()